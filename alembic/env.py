@@ -17,6 +17,9 @@ from database import Base
 from models.account import Account
 from models.transaction import Transaction
 from models.ledger_entry import LedgerEntry
+from models.balance_snapshot import BalanceSnapshot
+from models.idempotency_key import IdempotencyKey
+from models.view_refresh import ViewRefresh
 
 # This is the Alembic Config object
 config = context.config
@@ -33,6 +36,12 @@ if config.config_file_name is not None:
 # Set target metadata for autogeneration
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave database-only tables such as ledger partitions out of autogenerate"""
+    if type_ == "table" and reflected and compare_to is None:
+        return False
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -43,6 +52,7 @@ def run_migrations_offline() -> None:
         dialect_opts={"paramstyle": "named"},
         compare_type=True,
         compare_server_default=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -62,6 +72,7 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             compare_type=True,
             compare_server_default=True,
+            include_object=include_object,
             # Add PostgreSQL specific options
             include_schemas=True,
             version_table_schema='public',
@@ -0,0 +1,45 @@
+"""Add balance snapshots
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create balance_snapshots table
+    op.create_table('balance_snapshots',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False, server_default=sa.text('uuid_generate_v4()')),
+        sa.Column('account_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('as_of_entry_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('as_of_created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('balance', sa.Numeric(precision=19, scale=4), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], name='balance_snapshots_account_id_fkey', ondelete='RESTRICT'),
+        comment='Checkpointed account balances for incremental balance calculation'
+    )
+
+    # Add index for latest snapshot lookups
+    op.create_index(
+        'idx_balance_snapshots_account_position',
+        'balance_snapshots',
+        ['account_id', 'as_of_created_at', 'as_of_entry_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_balance_snapshots_account_position', table_name='balance_snapshots')
+    op.drop_table('balance_snapshots')
@@ -0,0 +1,42 @@
+"""Add idempotency keys
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create idempotency_keys table
+    op.create_table('idempotency_keys',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False, server_default=sa.text('uuid_generate_v4()')),
+        sa.Column('scope', sa.String(length=50), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_body', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scope', 'key', name='unique_idempotency_scope_key'),
+        comment='Stored responses for client retries with an Idempotency-Key header'
+    )
+    
+    # Add index for TTL cleanup
+    op.create_index('idx_idempotency_keys_expires_at', 'idempotency_keys', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_idempotency_keys_expires_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
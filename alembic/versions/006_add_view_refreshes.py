@@ -0,0 +1,38 @@
+"""Add view refresh tracking
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-01-06 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create view_refreshes table
+    op.create_table('view_refreshes',
+        sa.Column('view_name', sa.String(length=100), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('view_name'),
+        comment='Last refresh time of each materialized view'
+    )
+    
+    # Index for per-account range scans of the daily rollups; the existing
+    # unique index leads with balance_date
+    op.execute("""
+        CREATE INDEX idx_daily_balances_account_date
+        ON daily_account_balances(account_id, balance_date);
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_daily_balances_account_date;")
+    op.drop_table('view_refreshes')
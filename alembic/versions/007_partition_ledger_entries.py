@@ -0,0 +1,186 @@
+"""Partition ledger entries by month
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-01-07 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+# Months of empty partitions kept ahead of the current month
+MONTHS_AHEAD = 3
+
+# Views over ledger_entries from migrations 003 and 006, rebuilt on the new table
+VIEWS = """
+    CREATE OR REPLACE VIEW account_balances AS
+    SELECT 
+        a.id as account_id,
+        a.user_id,
+        a.account_type,
+        a.currency,
+        a.status,
+        COALESCE(SUM(
+            CASE 
+                WHEN le.entry_type = 'credit' THEN le.amount
+                WHEN le.entry_type = 'debit' THEN -le.amount
+            END
+        ), 0) as current_balance,
+        COUNT(le.id) as total_entries,
+        MAX(le.created_at) as last_transaction_date
+    FROM accounts a
+    LEFT JOIN ledger_entries le ON a.id = le.account_id
+    GROUP BY a.id, a.user_id, a.account_type, a.currency, a.status;
+    
+    CREATE MATERIALIZED VIEW daily_account_balances AS
+    SELECT 
+        DATE(le.created_at) as balance_date,
+        le.account_id,
+        COALESCE(SUM(
+            CASE 
+                WHEN le.entry_type = 'credit' THEN le.amount
+                WHEN le.entry_type = 'debit' THEN -le.amount
+            END
+        ), 0) as daily_balance
+    FROM ledger_entries le
+    GROUP BY DATE(le.created_at), le.account_id
+    ORDER BY balance_date DESC;
+    
+    CREATE UNIQUE INDEX idx_daily_balances_date_account 
+    ON daily_account_balances(balance_date, account_id);
+    
+    CREATE INDEX idx_daily_balances_account_date
+    ON daily_account_balances(account_id, balance_date);
+"""
+
+DROP_VIEWS = """
+    DROP MATERIALIZED VIEW IF EXISTS daily_account_balances;
+    DROP VIEW IF EXISTS account_balances;
+"""
+
+DOUBLE_ENTRY_TRIGGER = """
+    CREATE CONSTRAINT TRIGGER enforce_double_entry_balance
+    AFTER INSERT ON ledger_entries
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION check_double_entry_balance();
+"""
+
+
+def create_ledger_constraints_and_indexes(unique_columns) -> None:
+    op.create_foreign_key('ledger_entries_account_id_fkey', 'ledger_entries', 'accounts', ['account_id'], ['id'], ondelete='RESTRICT')
+    op.create_foreign_key('ledger_entries_transaction_id_fkey', 'ledger_entries', 'transactions', ['transaction_id'], ['id'], ondelete='RESTRICT')
+    op.create_unique_constraint('unique_transaction_account_entry', 'ledger_entries', unique_columns)
+    op.create_index(op.f('ix_ledger_entries_account_id'), 'ledger_entries', ['account_id'], unique=False)
+    op.create_index(op.f('ix_ledger_entries_transaction_id'), 'ledger_entries', ['transaction_id'], unique=False)
+    op.create_index(op.f('ix_ledger_entries_created_at'), 'ledger_entries', ['created_at'], unique=False)
+    op.create_index('idx_ledger_account_date', 'ledger_entries', ['account_id', 'created_at'], unique=False)
+
+
+def upgrade() -> None:
+    op.execute(DROP_VIEWS)
+    op.execute("ALTER TABLE ledger_entries RENAME TO ledger_entries_legacy;")
+    
+    # Same columns, defaults and checks, partitioned by month of created_at
+    op.execute("""
+        CREATE TABLE ledger_entries (
+            LIKE ledger_entries_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE (created_at);
+    """)
+    op.execute("ALTER TABLE ledger_entries ALTER COLUMN created_at SET NOT NULL;")
+    op.execute("COMMENT ON TABLE ledger_entries IS 'Double-entry ledger entries, partitioned by month';")
+    
+    # Create monthly partitions, in UTC, from from_month through months_ahead months from now
+    op.execute("""
+        CREATE OR REPLACE FUNCTION ensure_ledger_partitions(months_ahead integer, from_month date DEFAULT NULL)
+        RETURNS integer AS $$
+        DECLARE
+            month_start date := date_trunc('month', COALESCE(from_month, (now() AT TIME ZONE 'UTC')::date));
+            last_month date := date_trunc('month', (now() AT TIME ZONE 'UTC')::date + make_interval(months => months_ahead));
+            partition_name text;
+            created integer := 0;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                partition_name := format('ledger_entries_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+                
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF ledger_entries FOR VALUES FROM (%L) TO (%L)',
+                        partition_name,
+                        month_start::timestamp AT TIME ZONE 'UTC',
+                        (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                    );
+                    created := created + 1;
+                END IF;
+                
+                month_start := month_start + interval '1 month';
+            END LOOP;
+            
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute(f"""
+        SELECT ensure_ledger_partitions(
+            {MONTHS_AHEAD},
+            (SELECT MIN(created_at) AT TIME ZONE 'UTC' FROM ledger_entries_legacy)::date
+        );
+    """)
+    
+    # No DEFAULT partition: every new monthly partition would scan it under an
+    # ACCESS EXCLUSIVE lock. The ensure_ledger_partitions job keeps partitions
+    # ahead of now(), and an entry outside them fails to insert instead.
+    
+    op.execute("INSERT INTO ledger_entries SELECT * FROM ledger_entries_legacy;")
+    op.execute("DROP TABLE ledger_entries_legacy;")
+    
+    # Unique constraints on a partitioned table must include the partition key.
+    # Both legs of a transaction share created_at (the inserting transaction's
+    # start time), so a leg duplicated within one database transaction is
+    # still rejected. Uniqueness is weaker than before, though: the same
+    # (transaction_id, account_id, entry_type) inserted again from another
+    # database transaction gets a different created_at and is accepted.
+    # The transactions primary key still rejects a transaction posted twice,
+    # so this only affects code adding entries to an existing transaction,
+    # such as LedgerService.create_ledger_entries. A repeat of both legs
+    # still balances, so neither the double-entry trigger nor
+    # verify_double_entry would catch it; such callers must not retry.
+    op.create_primary_key('ledger_entries_pkey', 'ledger_entries', ['id', 'created_at'])
+    create_ledger_constraints_and_indexes(['transaction_id', 'account_id', 'entry_type', 'created_at'])
+    
+    # Row triggers on the parent are cloned onto every partition
+    op.execute(DOUBLE_ENTRY_TRIGGER)
+    
+    # The rebuilt view is not in UTC days until the next refresh
+    op.execute(VIEWS)
+    op.execute("DELETE FROM view_refreshes WHERE view_name = 'daily_account_balances';")
+
+
+def downgrade() -> None:
+    op.execute(DROP_VIEWS)
+    op.execute("ALTER TABLE ledger_entries RENAME TO ledger_entries_partitioned;")
+    
+    op.execute("""
+        CREATE TABLE ledger_entries (
+            LIKE ledger_entries_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        );
+    """)
+    op.execute("ALTER TABLE ledger_entries ALTER COLUMN created_at DROP NOT NULL;")
+    op.execute("COMMENT ON TABLE ledger_entries IS 'Double-entry ledger entries';")
+    op.execute("INSERT INTO ledger_entries SELECT * FROM ledger_entries_partitioned;")
+    op.execute("DROP TABLE ledger_entries_partitioned;")
+    op.execute("DROP FUNCTION IF EXISTS ensure_ledger_partitions;")
+    
+    op.create_primary_key('ledger_entries_pkey', 'ledger_entries', ['id'])
+    create_ledger_constraints_and_indexes(['transaction_id', 'account_id', 'entry_type'])
+    
+    op.execute(DOUBLE_ENTRY_TRIGGER)
+    op.execute(VIEWS)
+    op.execute("DELETE FROM view_refreshes WHERE view_name = 'daily_account_balances';")
@@ -0,0 +1,105 @@
+"""Check double-entry balance once per transaction
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS enforce_double_entry_balance ON ledger_entries;")
+    
+    # Transactions with entries inserted in the current database transaction.
+    # Rows only live until the deferred check at commit, so the table is
+    # unlogged and always empty between transactions.
+    op.execute("""
+        CREATE UNLOGGED TABLE pending_double_entry_checks (
+            transaction_id UUID PRIMARY KEY
+        );
+    """)
+    
+    # Queue each affected transaction once per statement, however many rows it inserted
+    op.execute("""
+        CREATE OR REPLACE FUNCTION queue_double_entry_checks()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO pending_double_entry_checks (transaction_id)
+            SELECT DISTINCT transaction_id FROM new_entries
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    op.execute("""
+        CREATE TRIGGER queue_double_entry_checks
+        AFTER INSERT ON ledger_entries
+        REFERENCING NEW TABLE AS new_entries
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION queue_double_entry_checks();
+    """)
+    
+    # Check each queued transaction once at commit. Deposits and withdrawals
+    # post a single leg against an external party, so they are exempt.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION check_pending_double_entry()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            total_balance NUMERIC(19,4);
+        BEGIN
+            SELECT COALESCE(SUM(
+                CASE 
+                    WHEN entry_type = 'credit' THEN amount
+                    WHEN entry_type = 'debit' THEN -amount
+                END
+            ), 0) INTO total_balance
+            FROM ledger_entries
+            WHERE transaction_id = NEW.transaction_id;
+            
+            IF total_balance != 0 AND NOT EXISTS (
+                SELECT 1 FROM transactions
+                WHERE id = NEW.transaction_id AND type IN ('deposit', 'withdrawal')
+            ) THEN
+                RAISE EXCEPTION 'Double-entry balance violation: Total balance must be 0, got % for transaction %',
+                    total_balance, NEW.transaction_id;
+            END IF;
+            
+            DELETE FROM pending_double_entry_checks WHERE transaction_id = NEW.transaction_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    op.execute("""
+        CREATE CONSTRAINT TRIGGER enforce_double_entry_balance
+        AFTER INSERT ON pending_double_entry_checks
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW
+        EXECUTE FUNCTION check_pending_double_entry();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS enforce_double_entry_balance ON pending_double_entry_checks;")
+    op.execute("DROP TRIGGER IF EXISTS queue_double_entry_checks ON ledger_entries;")
+    op.execute("DROP FUNCTION IF EXISTS check_pending_double_entry;")
+    op.execute("DROP FUNCTION IF EXISTS queue_double_entry_checks;")
+    op.execute("DROP TABLE IF EXISTS pending_double_entry_checks;")
+    
+    op.execute("""
+        CREATE CONSTRAINT TRIGGER enforce_double_entry_balance
+        AFTER INSERT ON ledger_entries
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW
+        EXECUTE FUNCTION check_double_entry_balance();
+    """)
@@ -0,0 +1,46 @@
+"""Notify listeners when an account's status changes
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-01-09 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # API workers cache account attributes and LISTEN on account_changes.
+    # The notification is only delivered if the transaction commits.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_account_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('account_changes', NEW.id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    
+    op.execute("""
+        CREATE TRIGGER notify_account_change
+        AFTER UPDATE ON accounts
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.currency IS DISTINCT FROM NEW.currency
+              OR OLD.account_type IS DISTINCT FROM NEW.account_type
+              OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+        EXECUTE FUNCTION notify_account_change();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS notify_account_change ON accounts;")
+    op.execute("DROP FUNCTION IF EXISTS notify_account_change();")
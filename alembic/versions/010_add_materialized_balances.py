@@ -0,0 +1,38 @@
+"""Add materialized balance columns to accounts
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-01-10 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('accounts', sa.Column('balance', sa.Numeric(precision=19, scale=4), nullable=False, server_default=sa.text('0')))
+    op.add_column('accounts', sa.Column('entry_count', sa.BigInteger(), nullable=False, server_default=sa.text('0')))
+    
+    # Backfill from the ledger. Accounts are locked so no posting lands
+    # between the sums and the update; BALANCE_MODE=materialized keeps
+    # them current from here on.
+    op.execute("LOCK TABLE accounts IN EXCLUSIVE MODE;")
+    op.execute("""
+        UPDATE accounts a
+        SET balance = ab.current_balance,
+            entry_count = ab.total_entries
+        FROM account_balances ab
+        WHERE ab.account_id = a.id;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('accounts', 'entry_count')
+    op.drop_column('accounts', 'balance')
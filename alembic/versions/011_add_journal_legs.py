@@ -0,0 +1,60 @@
+"""Number ledger entry legs so a transaction can post any number of them
+
+Revision ID: 011
+Revises: 010
+Create Date: 2024-01-11 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # New values cannot be used in the transaction that adds them, which
+    # is fine here since nothing below inserts a journal transaction
+    op.execute("ALTER TYPE transaction_type_enum ADD VALUE IF NOT EXISTS 'journal';")
+    
+    op.add_column('ledger_entries', sa.Column('leg_number', sa.SmallInteger(), nullable=True))
+    
+    # Existing transactions have one or two legs; debits are numbered first
+    op.execute("""
+        UPDATE ledger_entries le
+        SET leg_number = legs.leg_number
+        FROM (
+            SELECT id, created_at,
+                   row_number() OVER (PARTITION BY transaction_id ORDER BY entry_type DESC, id) AS leg_number
+            FROM ledger_entries
+        ) legs
+        WHERE le.id = legs.id AND le.created_at = legs.created_at;
+    """)
+    
+    op.execute("ALTER TABLE ledger_entries ALTER COLUMN leg_number SET DEFAULT 1;")
+    op.execute("ALTER TABLE ledger_entries ALTER COLUMN leg_number SET NOT NULL;")
+    op.create_check_constraint('positive_leg_number', 'ledger_entries', 'leg_number > 0')
+    
+    # One account may now appear in several legs of a transaction, e.g. two
+    # fee credits; legs are told apart by number instead. created_at stays
+    # in the key because unique constraints on a partitioned table must
+    # include the partition key, so as in 007 a leg number is only unique
+    # among entries written by the same database transaction.
+    op.drop_constraint('unique_transaction_account_entry', 'ledger_entries', type_='unique')
+    op.create_unique_constraint('unique_transaction_leg', 'ledger_entries', ['transaction_id', 'leg_number', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('unique_transaction_leg', 'ledger_entries', type_='unique')
+    op.create_unique_constraint(
+        'unique_transaction_account_entry',
+        'ledger_entries',
+        ['transaction_id', 'account_id', 'entry_type', 'created_at']
+    )
+    op.drop_constraint('positive_leg_number', 'ledger_entries', type_='check')
+    op.drop_column('ledger_entries', 'leg_number')
+    # PostgreSQL cannot drop an enum value; 'journal' stays in transaction_type_enum
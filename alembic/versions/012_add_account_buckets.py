@@ -0,0 +1,59 @@
+"""Add bucket sub-accounts for hot accounts
+
+Revision ID: 012
+Revises: 011
+Create Date: 2024-01-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('accounts', sa.Column('parent_account_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('accounts', sa.Column('bucket_count', sa.SmallInteger(), nullable=False, server_default=sa.text('0')))
+    op.create_foreign_key('fk_accounts_parent_account_id', 'accounts', 'accounts', ['parent_account_id'], ['id'])
+    op.create_index('ix_accounts_parent_account_id', 'accounts', ['parent_account_id'])
+    op.create_check_constraint('non_negative_bucket_count', 'accounts', 'bucket_count >= 0')
+    
+    # Workers cache bucket_count to route credits, so splitting an account notifies them too
+    op.execute("DROP TRIGGER IF EXISTS notify_account_change ON accounts;")
+    op.execute("""
+        CREATE TRIGGER notify_account_change
+        AFTER UPDATE ON accounts
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.currency IS DISTINCT FROM NEW.currency
+              OR OLD.account_type IS DISTINCT FROM NEW.account_type
+              OR OLD.user_id IS DISTINCT FROM NEW.user_id
+              OR OLD.bucket_count IS DISTINCT FROM NEW.bucket_count)
+        EXECUTE FUNCTION notify_account_change();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS notify_account_change ON accounts;")
+    op.execute("""
+        CREATE TRIGGER notify_account_change
+        AFTER UPDATE ON accounts
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.currency IS DISTINCT FROM NEW.currency
+              OR OLD.account_type IS DISTINCT FROM NEW.account_type
+              OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+        EXECUTE FUNCTION notify_account_change();
+    """)
+    
+    op.drop_constraint('non_negative_bucket_count', 'accounts', type_='check')
+    op.drop_index('ix_accounts_parent_account_id', table_name='accounts')
+    op.drop_constraint('fk_accounts_parent_account_id', 'accounts', type_='foreignkey')
+    op.drop_column('accounts', 'bucket_count')
+    op.drop_column('accounts', 'parent_account_id')
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Requests per second and latency of a running API under many concurrent clients.
+
+Start the server once with DB_MODE=sync and once with DB_MODE=async, then run
+this script against each to compare the two modes.
+"""
+import argparse
+import asyncio
+import random
+import time
+from decimal import Decimal
+
+import httpx
+
+from common import create_funded_accounts, report, summarize_latencies
+
+from database import SessionLocal
+
+
+async def client_loop(client, account_ids, requests_per_client, write_ratio, latencies, errors):
+    for _ in range(requests_per_client):
+        if random.random() < write_ratio:
+            source, destination = random.sample(account_ids, 2)
+            request = client.post('/api/v1/transfers/', json={
+                'source_account_id': source,
+                'destination_account_id': destination,
+                'amount': 1.00,
+                'currency': 'USD'
+            })
+        else:
+            request = client.get(f'/api/v1/accounts/{random.choice(account_ids)}')
+        
+        started = time.perf_counter()
+        try:
+            response = await request
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args, account_ids):
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    latencies = []
+    errors = []
+    
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, account_ids, args.requests, args.write_ratio, latencies, errors)
+            for _ in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+    
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API concurrency benchmark")
+    parser.add_argument('--base-url', default='http://localhost:8000', help='Running API server')
+    parser.add_argument('--clients', type=int, default=500, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client')
+    parser.add_argument('--accounts', type=int, default=200, help='Number of funded accounts')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='Share of requests that are transfers')
+    parser.add_argument('--label', default='', help='Label for the run, e.g. the DB_MODE of the server')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        account_ids = [str(account_id) for account_id in create_funded_accounts(
+            db, args.accounts, Decimal('1000000'), user_prefix='concurrency_bench'
+        )]
+    finally:
+        db.close()
+    
+    latencies, errors, elapsed = asyncio.run(run(args, account_ids))
+    
+    report('api_concurrency', {
+        'label': args.label,
+        'clients': args.clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        **summarize_latencies(latencies),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Time month-end as-of balances for every account, with and without the daily rollups
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from common import report
+
+from database import SessionLocal
+from models.account import Account
+from models.transaction import Transaction
+from models.ledger_entry import LedgerEntry
+from models.view_refresh import ViewRefresh
+from services.ledger_service import LedgerService
+
+
+def seed_accounts(db, accounts: int, entries_per_account: int, days: int, chunk_size: int = 5000):
+    """Create accounts with balanced entries against a treasury account spread over the last days"""
+    treasury_id = uuid.uuid4()
+    db.execute(insert(Account), [{'id': treasury_id, 'user_id': 'as_of_bench_treasury', 'account_type': 'business'}])
+    
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    for offset in range(0, accounts, chunk_size):
+        account_rows = [
+            {'id': uuid.uuid4(), 'user_id': f"as_of_bench_{i}", 'account_type': 'checking'}
+            for i in range(offset, min(offset + chunk_size, accounts))
+        ]
+        db.execute(insert(Account), account_rows)
+        
+        transactions = []
+        ledger_entries = []
+        for account in account_rows:
+            for n in range(entries_per_account):
+                transaction_id = uuid.uuid4()
+                created_at = start + timedelta(days=days * n / entries_per_account, seconds=n)
+                transactions.append({
+                    'id': transaction_id, 'type': 'deposit', 'amount': Decimal('1.00'),
+                    'currency': 'USD', 'status': 'completed'
+                })
+                ledger_entries.append({
+                    'account_id': treasury_id, 'transaction_id': transaction_id,
+                    'entry_type': 'debit', 'leg_number': 1, 'amount': Decimal('1.00'), 'created_at': created_at
+                })
+                ledger_entries.append({
+                    'account_id': account['id'], 'transaction_id': transaction_id,
+                    'entry_type': 'credit', 'leg_number': 2, 'amount': Decimal('1.00'), 'created_at': created_at
+                })
+        db.execute(insert(Transaction), transactions)
+        db.execute(insert(LedgerEntry), ledger_entries)
+        db.commit()
+
+
+def timed(operation):
+    started = time.perf_counter()
+    result = operation()
+    return result, round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="As-of balance benchmark")
+    parser.add_argument('--accounts', type=int, default=50000, help='Accounts to report on')
+    parser.add_argument('--entries-per-account', type=int, default=40, help='Ledger entries per account')
+    parser.add_argument('--days', type=int, default=60, help='Days of history')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        seed_accounts(db, args.accounts, args.entries_per_account, args.days)
+        
+        month_end = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
+        
+        # Ledger-only baseline: no refresh recorded, so every entry up to as_of is scanned
+        db.query(ViewRefresh).delete()
+        db.commit()
+        scanned, scan_seconds = timed(lambda: LedgerService.calculate_balances_as_of(db, None, month_end))
+        db.rollback()
+        
+        _, refresh_seconds = timed(lambda: LedgerService.refresh_daily_balances(db))
+        db.commit()
+        
+        rolled_up, rollup_seconds = timed(lambda: LedgerService.calculate_balances_as_of(db, None, month_end))
+        db.rollback()
+        
+        report('balance_as_of', {
+            'accounts': len(rolled_up),
+            'as_of': month_end,
+            'ledger_scan_seconds': scan_seconds,
+            'refresh_seconds': refresh_seconds,
+            'rollup_seconds': rollup_seconds,
+            'results_match': scanned == rolled_up,
+        })
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
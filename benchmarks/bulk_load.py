@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Throughput and peak memory of scripts/bulk_load.py across input sizes.
+
+Synthetic transfers between a set of funded accounts are streamed to a CSV
+file for each size, then loaded by the script in a child process, whose
+peak RSS is read from os.wait4. Memory should stay flat as the input
+grows, since the loader holds one batch at a time.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from common import create_funded_accounts, report
+
+from database import SessionLocal
+
+SCRIPT = Path(__file__).parent.parent / 'scripts' / 'bulk_load.py'
+
+COLUMNS = ('transaction_id', 'type', 'currency', 'description', 'created_at', 'account_id', 'entry_type', 'amount')
+
+
+def write_input(path: Path, account_ids, transactions: int, seed: int) -> None:
+    """Stream balanced two-leg transfers spread over the past year to a CSV file"""
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / transactions
+    
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        for i in range(transactions):
+            transaction_id = uuid.uuid4()
+            source, destination = rng.sample(account_ids, 2)
+            amount = Decimal(rng.randint(1, 10000)) / 100
+            created_at = (start + step * i).isoformat()
+            writer.writerow((transaction_id, 'transfer', 'USD', '', created_at, source, 'debit', amount))
+            writer.writerow((transaction_id, 'transfer', 'USD', '', created_at, destination, 'credit', amount))
+
+
+def load(path: Path, batch_size: int, from_month: str, extra_args) -> dict:
+    """Run the loader in a child process and return its report plus its peak RSS"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(SCRIPT), str(path), '--json', '--batch-size', str(batch_size), '--from-month', from_month, *extra_args],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    output = process.stdout.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"bulk_load.py failed:\n{output}")
+    
+    result = json.loads(output.strip().splitlines()[-1])
+    # ru_maxrss is in kilobytes on Linux
+    result['child_peak_rss_mb'] = round(usage.ru_maxrss / 1024, 1)
+    result['wall_seconds'] = round(elapsed, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk loader throughput and memory benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Transactions per run')
+    parser.add_argument('--accounts', type=int, default=100, help='Accounts the transfers move between')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Ledger entries per COPY batch')
+    parser.add_argument('--max-growth', type=float, default=1.25, help='Largest allowed peak RSS ratio between the largest and smallest run')
+    parser.add_argument('--keep-triggers', action='store_true', help='Pass --keep-triggers to the loader')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        account_ids = create_funded_accounts(db, args.accounts, Decimal('1000'), user_prefix='bulk_load_bench')
+    finally:
+        db.close()
+    
+    from_month = (datetime.now(timezone.utc) - timedelta(days=366)).strftime('%Y-%m')
+    extra_args = ['--keep-triggers'] if args.keep_triggers else []
+    
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = Path(directory) / f'ledger_{size}.csv'
+            write_input(path, account_ids, size, seed=size)
+            result = load(path, args.batch_size, from_month, extra_args)
+            path.unlink()
+            runs.append({'transactions': size, **result})
+    
+    growth = runs[-1]['child_peak_rss_mb'] / runs[0]['child_peak_rss_mb']
+    
+    report('bulk_load', {
+        'batch_size': args.batch_size,
+        'runs': runs,
+        'peak_rss_growth': round(growth, 3),
+    })
+    
+    if growth > args.max_growth:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
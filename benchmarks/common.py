@@ -0,0 +1,115 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against the database in DATABASE_URL (a local PostgreSQL
+instance with migrations applied) and print their results as JSON.
+"""
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, text
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from models.transaction import Transaction
+from models.ledger_entry import LedgerEntry
+from services.account_service import AccountService
+from services.ledger_service import LedgerService
+from services.transaction_service import TransactionService
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def report(name: str, results: Dict[str, Any]) -> None:
+    """Print benchmark results as JSON"""
+    print(json.dumps({'benchmark': name, **results}, indent=2, default=str))
+
+
+def create_funded_accounts(db, count: int, amount: Decimal, user_prefix: str = 'bench') -> List[Any]:
+    """Create active USD accounts funded from a treasury account with balanced entries"""
+    treasury = AccountService.create_account(db, f"{user_prefix}_treasury", 'business', 'USD')
+    
+    account_ids = []
+    for i in range(count):
+        account = AccountService.create_account(db, f"{user_prefix}_{i}", 'checking', 'USD')
+        
+        funding = TransactionService.create_transaction(
+            db=db,
+            transaction_type='deposit',
+            amount=amount,
+            currency='USD',
+            description='Benchmark funding'
+        )
+        LedgerService.create_ledger_entries(
+            db=db,
+            transaction_id=funding.id,
+            debit_account_id=treasury.id,
+            credit_account_id=account.id,
+            amount=amount
+        )
+        funding.status = 'completed'
+        account_ids.append(account.id)
+    
+    db.commit()
+    return account_ids
+
+
+def seed_account_history(db, entries: int, user_prefix: str = 'bench', chunk_size: int = 10000) -> Any:
+    """Create an account with a long history of balanced entries against a treasury account"""
+    account = AccountService.create_account(db, user_prefix, 'checking', 'USD')
+    treasury = AccountService.create_account(db, f"{user_prefix}_treasury", 'business', 'USD')
+    db.commit()
+    
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    for offset in range(0, entries, chunk_size):
+        transactions = []
+        ledger_entries = []
+        for i in range(offset, min(offset + chunk_size, entries)):
+            transaction_id = uuid.uuid4()
+            # Pairs of entries share a timestamp, as concurrent postings do
+            created_at = start + timedelta(milliseconds=(i // 2) * 10)
+            transactions.append({
+                'id': transaction_id,
+                'type': 'deposit',
+                'amount': Decimal('1.00'),
+                'currency': 'USD',
+                'status': 'completed'
+            })
+            ledger_entries.append({
+                'id': uuid.uuid4(), 'account_id': treasury.id, 'transaction_id': transaction_id,
+                'entry_type': 'debit', 'leg_number': 1, 'amount': Decimal('1.00'), 'created_at': created_at
+            })
+            ledger_entries.append({
+                'id': uuid.uuid4(), 'account_id': account.id, 'transaction_id': transaction_id,
+                'entry_type': 'credit', 'leg_number': 2, 'amount': Decimal('1.00'), 'created_at': created_at
+            })
+        db.execute(insert(Transaction), transactions)
+        db.execute(insert(LedgerEntry), ledger_entries)
+        db.commit()
+    
+    db.execute(text("ANALYZE ledger_entries"))
+    db.commit()
+    return account.id
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare the per-row and per-transaction double-entry triggers on a bulk load
+"""
+import argparse
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import insert, text
+
+from common import report
+
+from database import engine, SessionLocal
+from models.transaction import Transaction
+from models.ledger_entry import LedgerEntry
+from services.account_service import AccountService
+
+# Swap back to the migration 003 trigger for the duration of one transaction
+ROW_TRIGGER = """
+    DROP TRIGGER queue_double_entry_checks ON ledger_entries;
+    CREATE CONSTRAINT TRIGGER enforce_double_entry_balance_row
+    AFTER INSERT ON ledger_entries
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION check_double_entry_balance();
+"""
+
+
+def load(mode: str, debit_account_id, credit_account_id, entries: int) -> float:
+    """Insert balanced transfers and fire the deferred checks, then roll everything back"""
+    transactions = []
+    ledger_entries = []
+    for _ in range(entries // 2):
+        transaction_id = uuid.uuid4()
+        transactions.append({
+            'id': transaction_id, 'type': 'transfer', 'amount': Decimal('1.00'), 'currency': 'USD',
+            'status': 'completed', 'metadata': {
+                'source_account_id': str(debit_account_id),
+                'destination_account_id': str(credit_account_id)
+            }
+        })
+        ledger_entries.append({
+            'id': uuid.uuid4(), 'account_id': debit_account_id, 'transaction_id': transaction_id,
+            'entry_type': 'debit', 'leg_number': 1, 'amount': Decimal('1.00')
+        })
+        ledger_entries.append({
+            'id': uuid.uuid4(), 'account_id': credit_account_id, 'transaction_id': transaction_id,
+            'entry_type': 'credit', 'leg_number': 2, 'amount': Decimal('1.00')
+        })
+    
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            if mode == 'row':
+                connection.execute(text(ROW_TRIGGER))
+            connection.execute(insert(Transaction), transactions)
+            
+            started = time.perf_counter()
+            connection.execute(insert(LedgerEntry), ledger_entries)
+            # Run the deferred constraint triggers now instead of at commit
+            connection.execute(text("SET CONSTRAINTS ALL IMMEDIATE"))
+            return time.perf_counter() - started
+        finally:
+            transaction.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Double-entry trigger benchmark")
+    parser.add_argument('--entries', type=int, default=100000, help='Ledger entries per bulk load')
+    parser.add_argument('--repeats', type=int, default=3, help='Loads per trigger')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        debit_account = AccountService.create_account(db, 'trigger_bench_debit', 'business', 'USD')
+        credit_account = AccountService.create_account(db, 'trigger_bench_credit', 'business', 'USD')
+        db.commit()
+    finally:
+        db.close()
+    
+    results = {}
+    for mode in ('row', 'statement'):
+        runs = [load(mode, debit_account.id, credit_account.id, args.entries) for _ in range(args.repeats)]
+        results[f"{mode}_trigger_seconds"] = round(min(runs), 3)
+    
+    report('double_entry_trigger', {
+        'entries': args.entries,
+        **results,
+        'speedup': round(results['row_trigger_seconds'] / results['statement_trigger_seconds'], 2),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Credit throughput into one hot account as it is split into more buckets.
+
+For each bucket count a fresh destination is split, then every thread
+transfers from its own funded source into it, so the only shared row is
+the destination's. Throughput should scale with the bucket count until
+something other than the destination lock becomes the bottleneck. Each
+run checks that the destination's balance, summed over its buckets,
+equals the transfers that completed.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common import create_funded_accounts, report, summarize_latencies
+
+from database import SessionLocal, run_with_retry
+from services.account_service import AccountService
+from services.ledger_service import LedgerService
+from services.transaction_service import TransactionService
+
+
+def run(bucket_count: int, threads: int, transfers: int) -> dict:
+    amount = Decimal('1')
+    
+    db = SessionLocal()
+    try:
+        source_ids = create_funded_accounts(db, threads, amount * transfers, user_prefix=f'hot_bench_{bucket_count}')
+        destination = AccountService.create_account(db, f'hot_bench_{bucket_count}_destination', 'business', 'USD')
+        if bucket_count:
+            AccountService.split_account(db, destination.id, bucket_count)
+        db.commit()
+        destination_id = destination.id
+    finally:
+        db.close()
+    
+    lock = threading.Lock()
+    latencies = []
+    counters = defaultdict(int)
+    
+    def worker(source_id):
+        session = SessionLocal()
+        try:
+            for _ in range(transfers):
+                attempts = []
+                
+                def transfer():
+                    attempts.append(1)
+                    return TransactionService.execute_transfer(
+                        db=session,
+                        source_account_id=source_id,
+                        destination_account_id=destination_id,
+                        amount=amount,
+                        currency='USD'
+                    )
+                
+                started = time.perf_counter()
+                try:
+                    run_with_retry(session, transfer)
+                    outcome = 'completed'
+                except ValueError:
+                    session.rollback()
+                    outcome = 'rejected'
+                elapsed = time.perf_counter() - started
+                
+                with lock:
+                    counters[outcome] += 1
+                    counters['retries'] += len(attempts) - 1
+                    latencies.append(elapsed)
+        finally:
+            session.close()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, source_ids))
+    elapsed = time.perf_counter() - started
+    
+    db = SessionLocal()
+    try:
+        balance = LedgerService.calculate_balance(db, destination_id)
+    finally:
+        db.close()
+    
+    return {
+        'buckets': bucket_count,
+        'completed': counters['completed'],
+        'rejected': counters['rejected'],
+        'retries': counters['retries'],
+        'transfers_per_second': round(counters['completed'] / elapsed, 1),
+        **summarize_latencies(latencies),
+        'balance_matches': balance == amount * counters['completed'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot account bucket scaling benchmark")
+    parser.add_argument('--buckets', type=int, nargs='+', default=[0, 2, 4, 8, 16], help='Bucket counts to compare; 0 leaves the account unsplit')
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent workers, each with its own source account')
+    parser.add_argument('--transfers', type=int, default=200, help='Transfers per worker')
+    args = parser.parse_args()
+    
+    runs = [run(bucket_count, args.threads, args.transfers) for bucket_count in args.buckets]
+    baseline = runs[0]['transfers_per_second'] or 1
+    for result in runs:
+        result['speedup'] = round(result['transfers_per_second'] / baseline, 2)
+    
+    report('hot_account_buckets', {
+        'threads': args.threads,
+        'transfers_per_worker': args.transfers,
+        'runs': runs,
+    })
+    
+    if not all(result['balance_matches'] and not result['rejected'] for result in runs):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
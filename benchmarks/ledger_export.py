@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Check that streaming a ledger export keeps peak RSS bounded as the history grows
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+from common import report, seed_account_history
+
+from database import engine, SessionLocal
+from services.ledger_service import LedgerService
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(entries: int):
+    """Seed in a child process so the parent's peak RSS only reflects the export"""
+    db = SessionLocal()
+    try:
+        return seed_account_history(db, entries, user_prefix='export_bench')
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming ledger export benchmark")
+    parser.add_argument('--entries', type=int, default=1000000, help='Ledger entries on the exported account')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='ndjson', help='Export format')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched per server-side cursor batch')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=64, help='Fail if peak RSS grows by more than this')
+    args = parser.parse_args()
+    
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        account_id = pool.apply(seed, (args.entries,))
+    
+    baseline_mb = peak_rss_mb()
+    
+    rows = 0
+    exported_bytes = 0
+    started = time.perf_counter()
+    for chunk in LedgerService.stream_ledger_export(engine, account_id, args.format, batch_size=args.batch_size):
+        exported_bytes += len(chunk)
+        rows += chunk.count('\n')
+    elapsed = time.perf_counter() - started
+    
+    if args.format == 'csv':
+        rows -= 1
+    
+    rss_growth_mb = peak_rss_mb() - baseline_mb
+    
+    report('ledger_export', {
+        'format': args.format,
+        'rows': rows,
+        'exported_mb': round(exported_bytes / 1024 / 1024, 1),
+        'rows_per_second': round(rows / elapsed, 1),
+        'baseline_rss_mb': round(baseline_mb, 1),
+        'peak_rss_growth_mb': round(rss_growth_mb, 1),
+    })
+    
+    if rows != args.entries or rss_growth_mb > args.max_rss_growth_mb:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Rows per second for one ledger page under each loading strategy.
+
+    joined     LedgerEntry objects with account and transaction joined in,
+               which every page paid for while both relationships were
+               declared lazy="joined"
+    columns    plain rows of the entry's columns, the default page now
+    selectin   LedgerEntry objects with transactions loaded in one more
+               query, as ?include=transaction does
+"""
+import argparse
+import time
+
+from sqlalchemy.orm import joinedload
+
+from common import report, seed_account_history, summarize_latencies
+
+from database import SessionLocal
+from models.ledger_entry import LedgerEntry
+from services.ledger_service import LedgerService
+
+
+def joined_page(db, account_id, limit):
+    return db.query(LedgerEntry)\
+        .options(joinedload(LedgerEntry.account), joinedload(LedgerEntry.transaction))\
+        .filter(LedgerEntry.account_id == account_id)\
+        .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())\
+        .limit(limit + 1)\
+        .all()[:limit]
+
+
+def columns_page(db, account_id, limit):
+    return LedgerService.get_account_ledger_page(db, account_id, limit=limit)[0]
+
+
+def selectin_page(db, account_id, limit):
+    return LedgerService.get_account_ledger_page(db, account_id, limit=limit, include_transaction=True)[0]
+
+
+STRATEGIES = {
+    'joined': joined_page,
+    'columns': columns_page,
+    'selectin': selectin_page,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger page loading strategy benchmark")
+    parser.add_argument('--page-size', type=int, default=1000, help='Entries per page')
+    parser.add_argument('--entries', type=int, default=10000, help='Entries in the account history')
+    parser.add_argument('--repeats', type=int, default=50, help='Timed pages per strategy')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        account_id = seed_account_history(db, args.entries, user_prefix='ledger_loading_bench')
+        
+        results = {}
+        for name, page in STRATEGIES.items():
+            samples = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                rows = len(page(db, account_id, args.page_size))
+                samples.append(time.perf_counter() - started)
+                # A fresh session state each time, so the identity map does not serve later pages
+                db.rollback()
+                db.expunge_all()
+            
+            latencies = summarize_latencies(samples)
+            results[name] = {
+                'rows_per_second': round(rows / (latencies['p50_ms'] / 1000)),
+                **latencies,
+            }
+    finally:
+        db.close()
+    
+    report('ledger_loading', {
+        'page_size': args.page_size,
+        'entries': args.entries,
+        **results,
+        'columns_vs_joined': round(results['columns']['rows_per_second'] / results['joined']['rows_per_second'], 2),
+    })
+
+
+if __name__ == '__main__':
+    main()
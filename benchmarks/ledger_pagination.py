@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Compare deep-page latency of offset and cursor pagination on GET /accounts/{id}/ledger
+"""
+import argparse
+import time
+
+from common import report, seed_account_history, summarize_latencies
+
+from database import SessionLocal
+from models.ledger_entry import LedgerEntry
+from services.ledger_service import LedgerService
+
+
+def time_page(db, repeats, **kwargs):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        LedgerService.get_account_ledger_page(db, **kwargs)
+        samples.append(time.perf_counter() - started)
+        db.rollback()
+    return summarize_latencies(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger pagination benchmark")
+    parser.add_argument('--page-size', type=int, default=50, help='Entries per page')
+    parser.add_argument('--deep-page', type=int, default=10000, help='Page number to compare with page 1')
+    parser.add_argument('--repeats', type=int, default=50, help='Timed requests per case')
+    args = parser.parse_args()
+    
+    entries = args.page_size * args.deep_page
+    
+    db = SessionLocal()
+    try:
+        account_id = seed_account_history(db, entries, user_prefix='pagination_bench')
+        
+        # Cursor for the start of the deep page, taken from the entry that ends the page before it
+        boundary = db.query(LedgerEntry)\
+            .filter(LedgerEntry.account_id == account_id)\
+            .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())\
+            .offset(args.page_size * (args.deep_page - 1) - 1)\
+            .limit(1)\
+            .one()
+        deep_cursor = LedgerService.encode_ledger_cursor(boundary)
+        db.rollback()
+        
+        common = {'account_id': account_id, 'limit': args.page_size}
+        deep_offset = args.page_size * (args.deep_page - 1)
+        
+        report('ledger_pagination', {
+            'account_entries': entries,
+            'page_size': args.page_size,
+            'deep_page': args.deep_page,
+            'offset_page_1': time_page(db, args.repeats, **common),
+            'offset_deep_page': time_page(db, args.repeats, offset=deep_offset, **common),
+            'cursor_deep_page': time_page(db, args.repeats, cursor=deep_cursor, **common),
+        })
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
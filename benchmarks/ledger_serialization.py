@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of one ledger page, without the database.
+
+Compares the path GET /accounts/{id}/ledger used to take, building
+LedgerEntryResponse models that FastAPI validates again through
+response_model before JSONResponse encodes them, with the direct path of
+plain rows encoded by ORJSONResponse. Both must produce the same JSON.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from common import report, summarize_latencies
+
+from api.accounts import LedgerEntryResponse, ledger_entry_row
+
+
+def make_entries(count: int) -> list:
+    """Ledger entries shaped like the ORM rows the ledger page returns"""
+    account_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            account_id=account_id,
+            transaction_id=uuid.uuid4(),
+            entry_type='debit' if i % 2 else 'credit',
+            amount=Decimal(f'{i % 997}.{i % 100:02d}00'),
+            created_at=now - timedelta(seconds=i, microseconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger page serialization benchmark")
+    parser.add_argument('--entries', type=int, default=1000, help='Entries per page')
+    parser.add_argument('--repeats', type=int, default=200, help='Timed pages per path')
+    args = parser.parse_args()
+    
+    entries = make_entries(args.entries)
+    field = create_response_field(name='Response_get_account_ledger', type_=List[LedgerEntryResponse])
+    loop = asyncio.new_event_loop()
+    
+    def model_path() -> bytes:
+        content = [
+            LedgerEntryResponse(
+                id=str(entry.id),
+                account_id=str(entry.account_id),
+                transaction_id=str(entry.transaction_id),
+                entry_type=entry.entry_type,
+                amount=float(entry.amount),
+                created_at=entry.created_at.isoformat() if entry.created_at else None
+            )
+            for entry in entries
+        ]
+        # Without ?include=transaction the direct rows have no transaction key at all
+        value = loop.run_until_complete(serialize_response(field=field, response_content=content, exclude_none=True))
+        return JSONResponse(content=value).body
+    
+    def direct_path() -> bytes:
+        return ORJSONResponse(content=[ledger_entry_row(entry) for entry in entries]).body
+    
+    if json.loads(model_path()) != json.loads(direct_path()):
+        print("Direct and model paths produce different JSON", file=sys.stderr)
+        sys.exit(1)
+    
+    results = {}
+    for name, path in (('response_model', model_path), ('direct_orjson', direct_path)):
+        samples = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            path()
+            samples.append(time.perf_counter() - started)
+        results[name] = summarize_latencies(samples)
+    
+    report('ledger_serialization', {
+        'entries': args.entries,
+        'repeats': args.repeats,
+        **results,
+        'p50_speedup': round(results['response_model']['p50_ms'] / results['direct_orjson']['p50_ms'], 2),
+    })
+
+
+if __name__ == '__main__':
+    main()
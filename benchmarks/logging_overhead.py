@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Transfer throughput with logging off, written synchronously, and queued.
+
+Each mode runs in a fresh process, since logging is configured once per
+process:
+
+    off     LOG_LEVEL=WARNING, so the INFO records on the transfer path are skipped
+    sync    a StreamHandler on the root logger formatting and writing in the
+            calling thread, as logging.basicConfig set up before
+    queued  logs.configure_logging, formatting and writing on a listener thread
+
+Records go to --log-file, /dev/null by default, so terminal speed does not
+decide the result.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+MODES = ('off', 'sync', 'queued')
+
+
+def measure(mode: str, threads: int, transfers: int, log_file: str) -> dict:
+    """Transfers per second and latencies for one logging mode"""
+    os.environ['LOG_LEVEL'] = 'WARNING' if mode == 'off' else 'INFO'
+    
+    import logging
+    from common import create_funded_accounts, summarize_latencies
+    from database import SessionLocal
+    from logs import TextFormatter, configure_logging, stop_logging
+    from services.transaction_service import TransactionService
+    
+    stream = open(log_file, 'w')
+    if mode == 'sync':
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(TextFormatter())
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+    else:
+        configure_logging(stream)
+    
+    db = SessionLocal()
+    try:
+        # One pair of accounts per thread, so threads never wait on each other's row locks
+        account_ids = create_funded_accounts(
+            db, threads * 2, Decimal('1000000'), user_prefix=f'logging_bench_{mode}_{os.getpid()}'
+        )
+    finally:
+        db.close()
+    
+    latencies = []
+    lock = threading.Lock()
+    
+    def worker(source, destination):
+        session = SessionLocal()
+        samples = []
+        try:
+            for _ in range(transfers // threads):
+                started = time.perf_counter()
+                TransactionService.execute_transfer(session, source, destination, Decimal('1.00'))
+                session.commit()
+                samples.append(time.perf_counter() - started)
+        finally:
+            session.close()
+        with lock:
+            latencies.extend(samples)
+    
+    workers = [
+        threading.Thread(target=worker, args=(account_ids[2 * i], account_ids[2 * i + 1]))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    stop_logging()
+    stream.close()
+    
+    return {
+        'transfers_per_second': round(len(latencies) / elapsed, 1),
+        **summarize_latencies(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead on transfer throughput")
+    parser.add_argument('--transfers', type=int, default=5000, help='Transfers per mode')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent transferring threads')
+    parser.add_argument('--log-file', default=os.devnull, help='Where log records are written')
+    parser.add_argument('--max-overhead-pct', type=float, default=5.0, help='Fail if queued logging costs more throughput than this')
+    args = parser.parse_args()
+    
+    from common import report
+    
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for mode in MODES:
+        with context.Pool(1) as pool:
+            results[mode] = pool.apply(measure, (mode, args.threads, args.transfers, args.log_file))
+    
+    baseline = results['off']['transfers_per_second']
+    overhead_pct = {
+        mode: round((baseline - results[mode]['transfers_per_second']) / baseline * 100, 2)
+        for mode in ('sync', 'queued')
+    }
+    
+    report('logging_overhead', {
+        'transfers': args.transfers,
+        'threads': args.threads,
+        **{f'logging_{mode}': results[mode] for mode in MODES},
+        'throughput_overhead_pct': overhead_pct,
+    })
+    
+    if overhead_pct['queued'] > args.max_overhead_pct:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Latency overhead of the /metrics instrumentation on a DB-backed read route.
+
+The app is driven in-process over ASGI, once with METRICS_ENABLED=true and
+once with METRICS_ENABLED=false, each in a fresh process because the
+setting is read when the engine and app are created.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from decimal import Decimal
+
+
+def measure(metrics_enabled: bool, requests: int, warmup: int):
+    """Per-request latencies for GET /accounts/{id} in a process with the given setting"""
+    os.environ['METRICS_ENABLED'] = 'true' if metrics_enabled else 'false'
+    
+    import httpx
+    from common import create_funded_accounts
+    from database import SessionLocal
+    from main import app
+    
+    db = SessionLocal()
+    try:
+        account_id = str(create_funded_accounts(
+            db, 1, Decimal('100'), user_prefix=f"metrics_bench_{os.getpid()}"
+        )[0])
+    finally:
+        db.close()
+    
+    async def run():
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            for i in range(warmup + requests):
+                started = time.perf_counter()
+                response = await client.get(f'/api/v1/accounts/{account_id}')
+                elapsed = time.perf_counter() - started
+                response.raise_for_status()
+                if i >= warmup:
+                    latencies.append(elapsed)
+        return latencies
+    
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead benchmark")
+    parser.add_argument('--requests', type=int, default=5000, help='Measured requests per run')
+    parser.add_argument('--warmup', type=int, default=500, help='Unmeasured requests before each run')
+    parser.add_argument('--max-overhead-pct', type=float, default=2.0, help='Fail if p50 latency grows by more than this')
+    args = parser.parse_args()
+    
+    from common import report, summarize_latencies
+    
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for enabled in (False, True):
+        with context.Pool(1) as pool:
+            results[enabled] = pool.apply(measure, (enabled, args.requests, args.warmup))
+    
+    baseline = summarize_latencies(results[False])
+    instrumented = summarize_latencies(results[True])
+    overhead_pct = (instrumented['p50_ms'] - baseline['p50_ms']) / baseline['p50_ms'] * 100
+    
+    report('metrics_overhead', {
+        'requests': args.requests,
+        'metrics_disabled': baseline,
+        'metrics_enabled': instrumented,
+        'p50_overhead_pct': round(overhead_pct, 2),
+    })
+    
+    if overhead_pct > args.max_overhead_pct:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
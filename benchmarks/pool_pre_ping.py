@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Throughput of short read transactions with and without pool pre-ping.
+
+Pre-ping issues a round-trip on every pool checkout. Each setting runs in
+a fresh process because the engine is built from the settings at import.
+Run once against PostgreSQL directly and once through PgBouncer
+(DB_POOL_MODE=pgbouncer) to compare the pooling modes as well.
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from decimal import Decimal
+
+
+def measure(pre_ping: bool, threads: int, duration: float):
+    """Account reads per second and their latencies with the given pre-ping setting"""
+    os.environ['DB_POOL_PRE_PING'] = 'true' if pre_ping else 'false'
+    
+    from common import create_funded_accounts
+    from database import SessionLocal
+    from services.account_service import AccountService
+    
+    db = SessionLocal()
+    try:
+        account_id = str(create_funded_accounts(
+            db, 1, Decimal('100'), user_prefix=f"pre_ping_bench_{os.getpid()}"
+        )[0])
+    finally:
+        db.close()
+    
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def worker():
+        samples = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                AccountService.get_account(db, account_id)
+                db.commit()
+            finally:
+                db.close()
+            samples.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(samples)
+    
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool pre-ping throughput benchmark")
+    parser.add_argument('--threads', type=int, default=10, help='Concurrent sessions, at most DB_POOL_SIZE to avoid overflow')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per run')
+    parser.add_argument('--label', default='', help='Label for the run, e.g. direct or pgbouncer')
+    args = parser.parse_args()
+    
+    from common import report, summarize_latencies
+    
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for pre_ping in (True, False):
+        with context.Pool(1) as pool:
+            latencies, elapsed = pool.apply(measure, (pre_ping, args.threads, args.duration))
+        results['pre_ping' if pre_ping else 'no_pre_ping'] = {
+            'transactions': len(latencies),
+            'transactions_per_second': round(len(latencies) / elapsed, 1),
+            **summarize_latencies(latencies),
+        }
+    
+    report('pool_pre_ping', {
+        'label': args.label,
+        'pool_mode': os.getenv('DB_POOL_MODE', 'queue'),
+        'threads': args.threads,
+        **results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite driving the ledger with synthetic workloads.
+
+Each workload from workloads.py runs against freshly funded accounts
+through one or both drivers:
+
+    service  TransactionService and LedgerService called directly, one
+             session per worker thread, through run_with_retry
+    api      the FastAPI app in-process over httpx.ASGITransport, one
+             client task per worker, without a network hop
+
+Results carry throughput, p50/p95/p99 latency overall and per operation
+kind, and SQL statements per operation, along with the commit and the
+settings they ran under. Runs with the same --seed and sizes issue the
+same operations, so results saved with --output on one commit can be
+passed as --baseline on another to get ratios.
+"""
+import os
+
+# Statements are counted by the engine instrumentation, which this enables
+os.environ.setdefault('METRICS_ENABLED', 'true')
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from common import create_funded_accounts, report, summarize_latencies
+from workloads import WORKLOADS
+
+from config import settings
+from database import SessionLocal, run_with_retry
+from metrics import REQUEST_SQL_STATEMENTS, SQLStats, request_sql_stats
+from services.ledger_service import LedgerService
+from services.transaction_service import TransactionService
+
+DRIVERS = ('service', 'api')
+
+
+class Results:
+    """Outcomes, latencies and statement counts collected by a driver's workers"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(int)
+        self.statements = 0
+    
+    def record(self, kind: str, outcome: str, elapsed: float, statements: int = 0) -> None:
+        with self.lock:
+            self.latencies[kind].append(elapsed)
+            self.outcomes[outcome] += 1
+            self.statements += statements
+    
+    def summary(self, elapsed: float, statements=None) -> dict:
+        latencies = [latency for samples in self.latencies.values() for latency in samples]
+        statements = self.statements if statements is None else statements
+        return {
+            'operations': len(latencies),
+            'completed': self.outcomes['completed'],
+            'rejected': self.outcomes['rejected'],
+            'errors': self.outcomes['error'],
+            'operations_per_second': round(len(latencies) / elapsed, 1),
+            **summarize_latencies(latencies),
+            'statements_per_operation': round(statements / len(latencies), 2) if latencies else 0.0,
+            'by_operation': {
+                kind: {'operations': len(samples), **summarize_latencies(samples)}
+                for kind, samples in sorted(self.latencies.items())
+            },
+        }
+
+
+def run_service_operation(session, operation) -> str:
+    """Run one operation through the services and commit it"""
+    kind = operation[0]
+    
+    if kind == 'transfer':
+        _, source, destination, amount = operation
+        run_with_retry(session, lambda: TransactionService.execute_transfer(session, source, destination, amount))
+    elif kind == 'deposit':
+        _, account, amount = operation
+        run_with_retry(session, lambda: TransactionService.execute_deposit(session, account, amount))
+    elif kind == 'withdrawal':
+        _, account, amount = operation
+        run_with_retry(session, lambda: TransactionService.execute_withdrawal(session, account, amount))
+    elif kind == 'balance':
+        _, account = operation
+        run_with_retry(session, lambda: LedgerService.calculate_balance(session, account))
+    elif kind == 'payroll':
+        _, employer, salaries = operation
+        transfers = [
+            {'source_account_id': employer, 'destination_account_id': employee, 'amount': amount}
+            for employee, amount in salaries
+        ]
+        results = run_with_retry(session, lambda: TransactionService.execute_transfers_batch(session, transfers))
+        if any(result['status'] != 'completed' for result in results):
+            return 'rejected'
+    else:
+        raise ValueError(f"Unknown operation {kind}")
+    
+    return 'completed'
+
+
+def drive_service(operations, concurrency: int) -> dict:
+    results = Results()
+    
+    def worker(share):
+        session = SessionLocal()
+        try:
+            for operation in share:
+                stats = SQLStats()
+                token = request_sql_stats.set(stats)
+                started = time.perf_counter()
+                try:
+                    outcome = run_service_operation(session, operation)
+                except ValueError:
+                    session.rollback()
+                    outcome = 'rejected'
+                except Exception:
+                    session.rollback()
+                    outcome = 'error'
+                finally:
+                    request_sql_stats.reset(token)
+                elapsed = time.perf_counter() - started
+                
+                # Includes the statements of attempts rolled back and retried by run_with_retry
+                results.record(operation[0], outcome, elapsed, stats.statements)
+        finally:
+            session.close()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, [operations[index::concurrency] for index in range(concurrency)]))
+    
+    return results.summary(time.perf_counter() - started)
+
+
+def api_request(client, operation):
+    """The HTTP request for one operation"""
+    kind = operation[0]
+    prefix = settings.API_PREFIX
+    
+    if kind == 'transfer':
+        _, source, destination, amount = operation
+        return client.post(f'{prefix}/transfers/', json={
+            'source_account_id': str(source),
+            'destination_account_id': str(destination),
+            'amount': float(amount),
+            'currency': 'USD'
+        })
+    if kind in ('deposit', 'withdrawal'):
+        _, account, amount = operation
+        return client.post(f'{prefix}/{kind}s', json={'account_id': str(account), 'amount': float(amount), 'currency': 'USD'})
+    if kind == 'balance':
+        _, account = operation
+        return client.get(f'{prefix}/accounts/{account}/balance')
+    if kind == 'payroll':
+        _, employer, salaries = operation
+        return client.post(f'{prefix}/transfers/batch', json={'transfers': [
+            {'source_account_id': str(employer), 'destination_account_id': str(employee), 'amount': float(amount), 'currency': 'USD'}
+            for employee, amount in salaries
+        ]})
+    raise ValueError(f"Unknown operation {kind}")
+
+
+def total_request_statements() -> float:
+    """Statements counted by MetricsMiddleware so far, over all routes"""
+    return sum(
+        sample.value
+        for metric in REQUEST_SQL_STATEMENTS.collect()
+        for sample in metric.samples
+        if sample.name.endswith('_sum')
+    )
+
+
+def drive_api(operations, concurrency: int) -> dict:
+    import httpx
+    from main import app
+    
+    results = Results()
+    
+    async def client_loop(client, share):
+        for operation in share:
+            started = time.perf_counter()
+            try:
+                response = await api_request(client, operation)
+                if response.status_code < 300:
+                    outcome = 'completed'
+                elif response.status_code < 500:
+                    outcome = 'rejected'
+                else:
+                    outcome = 'error'
+            except httpx.HTTPError:
+                outcome = 'error'
+            results.record(operation[0], outcome, time.perf_counter() - started)
+    
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+            await asyncio.gather(*(
+                client_loop(client, operations[index::concurrency]) for index in range(concurrency)
+            ))
+    
+    statements_before = total_request_statements()
+    started = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    
+    return results.summary(elapsed, statements=total_request_statements() - statements_before)
+
+
+def current_commit() -> dict:
+    """The commit under test and whether the tree has local changes"""
+    root = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], cwd=root, capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+def compare(runs, baseline_path: str) -> None:
+    """Add ratios against the matching runs of an earlier --output file"""
+    with open(baseline_path) as baseline_file:
+        baseline = {(run['workload'], run['driver']): run for run in json.load(baseline_file)['runs']}
+    
+    for run in runs:
+        previous = baseline.get((run['workload'], run['driver']))
+        if not previous:
+            continue
+        run['vs_baseline'] = {
+            key: round(run[key] / previous[key], 3) if previous[key] else None
+            for key in ('operations_per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'statements_per_operation')
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger benchmark suite")
+    parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=sorted(WORKLOADS), help='Workloads to run')
+    parser.add_argument('--drivers', nargs='+', choices=DRIVERS, default=list(DRIVERS), help='Drivers to run each workload through')
+    parser.add_argument('--accounts', type=int, default=200, help='Funded accounts per run')
+    parser.add_argument('--operations', type=int, default=5000, help='Operations per run')
+    parser.add_argument('--concurrency', type=int, default=16, help='Worker threads or client tasks')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated operations')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--baseline', help='Results file from an earlier run to compare against')
+    args = parser.parse_args()
+    
+    runs = []
+    for name in args.workloads:
+        workload = WORKLOADS[name]
+        for driver in args.drivers:
+            db = SessionLocal()
+            try:
+                account_ids = create_funded_accounts(
+                    db, args.accounts, workload.funding, user_prefix=f'suite_{name}_{driver}_{int(time.time())}'
+                )
+            finally:
+                db.close()
+            
+            # Accounts are new each run; the operations only depend on their order
+            operations = workload.generate(account_ids, args.operations, random.Random(args.seed))
+            
+            drive = drive_service if driver == 'service' else drive_api
+            runs.append({'workload': name, 'driver': driver, **drive(operations, args.concurrency)})
+            print(f"{name} via {driver}: {runs[-1]['operations_per_second']} operations/s", file=sys.stderr)
+    
+    if args.baseline:
+        compare(runs, args.baseline)
+    
+    results = {
+        **current_commit(),
+        'seed': args.seed,
+        'accounts': args.accounts,
+        'operations': args.operations,
+        'concurrency': args.concurrency,
+        'settings': {
+            'DB_MODE': settings.DB_MODE,
+            'BALANCE_MODE': settings.BALANCE_MODE,
+            'DB_POOL_MODE': settings.DB_POOL_MODE,
+            'DB_POOL_SIZE': settings.DB_POOL_SIZE,
+            'DB_ISOLATION_LEVEL': settings.DB_ISOLATION_LEVEL,
+        },
+        'runs': runs,
+    }
+    
+    report('suite', results)
+    
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'benchmark': 'suite', **results}, output, indent=2, default=str)
+    
+    if any(run['errors'] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare single-transfer throughput with TransactionService.execute_transfers_batch
+
+The batch path is meant to move at least 10x the transfers per second of
+single transfers on PostgreSQL. That target has not been measured on
+PostgreSQL yet. On a SQLite file database, where row locks are no-ops and
+each commit is an fsync, 2000 transfers across 100 accounts gave 12.6x
+with --batch-size 50 and 38.7x with --batch-size 500.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from common import create_funded_accounts, report
+
+from database import SessionLocal
+from services.transaction_service import TransactionService
+
+
+def run_single(account_ids, transfers):
+    """One transaction and commit per transfer, like POST /transfers/"""
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for source, destination, amount in transfers:
+            TransactionService.execute_transfer(
+                db=db,
+                source_account_id=source,
+                destination_account_id=destination,
+                amount=amount,
+                currency='USD'
+            )
+            db.commit()
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def run_batched(account_ids, transfers, batch_size):
+    """One transaction and commit per batch, like POST /transfers/batch"""
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for offset in range(0, len(transfers), batch_size):
+            TransactionService.execute_transfers_batch(
+                db=db,
+                transfers=[
+                    {
+                        'source_account_id': source,
+                        'destination_account_id': destination,
+                        'amount': amount,
+                        'currency': 'USD'
+                    }
+                    for source, destination, amount in transfers[offset:offset + batch_size]
+                ],
+                atomic=True
+            )
+            db.commit()
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch transfer throughput benchmark")
+    parser.add_argument('--accounts', type=int, default=100, help='Number of funded accounts')
+    parser.add_argument('--transfers', type=int, default=2000, help='Transfers per mode')
+    parser.add_argument('--batch-size', type=int, default=500, help='Transfers per batch')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        account_ids = create_funded_accounts(db, args.accounts, Decimal('1000000'), user_prefix='batch_bench')
+    finally:
+        db.close()
+    
+    def workload():
+        transfers = []
+        for _ in range(args.transfers):
+            source, destination = random.sample(account_ids, 2)
+            transfers.append((source, destination, Decimal('1.00')))
+        return transfers
+    
+    single_seconds = run_single(account_ids, workload())
+    batched_seconds = run_batched(account_ids, workload(), args.batch_size)
+    
+    single_tps = args.transfers / single_seconds
+    batched_tps = args.transfers / batched_seconds
+    
+    report('transfer_batch', {
+        'transfers': args.transfers,
+        'batch_size': args.batch_size,
+        'single_transfers_per_second': round(single_tps, 1),
+        'batched_transfers_per_second': round(batched_tps, 1),
+        'speedup': round(batched_tps / single_tps, 2),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Multi-threaded transfer stress test on a small set of hot accounts.
+
+Every thread runs transfers through run_with_retry on its own session. At
+the end the ledger is checked for lost updates: each account balance must
+equal its funding plus the transfers the threads saw succeed, no balance may
+be negative, and the total must be unchanged.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common import create_funded_accounts, report, summarize_latencies
+
+from database import SessionLocal, run_with_retry
+from services.ledger_service import LedgerService
+from services.transaction_service import TransactionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transfer contention stress test")
+    parser.add_argument('--accounts', type=int, default=4, help='Number of hot accounts')
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent workers')
+    parser.add_argument('--transfers', type=int, default=200, help='Transfers per worker')
+    parser.add_argument('--funding', type=Decimal, default=Decimal('500'), help='Initial balance per account')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        account_ids = create_funded_accounts(db, args.accounts, args.funding, user_prefix='contention_bench')
+    finally:
+        db.close()
+    
+    lock = threading.Lock()
+    deltas = defaultdict(Decimal)
+    latencies = []
+    counters = defaultdict(int)
+    
+    def worker(seed):
+        rng = random.Random(seed)
+        session = SessionLocal()
+        try:
+            for _ in range(args.transfers):
+                source, destination = rng.sample(account_ids, 2)
+                amount = Decimal(rng.randint(1, 100))
+                attempts = []
+                
+                def transfer():
+                    attempts.append(1)
+                    return TransactionService.execute_transfer(
+                        db=session,
+                        source_account_id=source,
+                        destination_account_id=destination,
+                        amount=amount,
+                        currency='USD'
+                    )
+                
+                started = time.perf_counter()
+                try:
+                    run_with_retry(session, transfer)
+                    outcome = 'completed'
+                except ValueError:
+                    session.rollback()
+                    outcome = 'rejected'
+                elapsed = time.perf_counter() - started
+                
+                with lock:
+                    counters[outcome] += 1
+                    counters['retries'] += len(attempts) - 1
+                    latencies.append(elapsed)
+                    if outcome == 'completed':
+                        deltas[source] -= amount
+                        deltas[destination] += amount
+        finally:
+            session.close()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+    
+    db = SessionLocal()
+    try:
+        balances = LedgerService.calculate_balances(db, account_ids)
+    finally:
+        db.close()
+    
+    lost_updates = [
+        str(account_id) for account_id in account_ids
+        if balances.get(account_id, Decimal(0)) != args.funding + deltas[account_id]
+    ]
+    negative = [str(account_id) for account_id, balance in balances.items() if balance < 0]
+    conserved = sum(balances.values()) == args.funding * args.accounts
+    
+    report('transfer_contention', {
+        'threads': args.threads,
+        'accounts': args.accounts,
+        'completed': counters['completed'],
+        'rejected': counters['rejected'],
+        'retries': counters['retries'],
+        'transfers_per_second': round((counters['completed'] + counters['rejected']) / elapsed, 1),
+        **summarize_latencies(latencies),
+        'lost_updates': lost_updates,
+        'negative_balances': negative,
+        'total_conserved': conserved,
+    })
+    
+    if lost_updates or negative or not conserved:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
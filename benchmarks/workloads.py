@@ -0,0 +1,122 @@
+"""
+Synthetic workloads for the benchmark suite.
+
+Each workload turns a list of funded account ids and a seeded random
+generator into a deterministic list of operations, so two runs with the
+same seed and account count issue the same sequence of requests. An
+operation is a tuple whose first item is its kind:
+
+    ('transfer', source, destination, amount)
+    ('deposit', account, amount)
+    ('withdrawal', account, amount)
+    ('balance', account)
+    ('payroll', employer, [(employee, amount), ...])
+"""
+import bisect
+import itertools
+import random
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+Operation = Tuple[Any, ...]
+
+
+class ZipfianSampler:
+    """Picks items with probability proportional to 1 / rank ** skew, so a few items are hot"""
+    
+    def __init__(self, items: Sequence[Any], skew: float, rng: random.Random):
+        self.items = list(items)
+        # Hot ranks go to random accounts rather than the first ones created
+        rng.shuffle(self.items)
+        self.cumulative = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+    
+    def sample(self) -> Any:
+        return self.items[bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])]
+    
+    def sample_pair(self) -> Tuple[Any, Any]:
+        """Two distinct items, each drawn from the same skewed distribution"""
+        first = self.sample()
+        second = self.sample()
+        while second == first:
+            second = self.sample()
+        return first, second
+
+
+def payment_amount(rng: random.Random) -> Decimal:
+    """Log-normally distributed card-payment sized amount, mostly tens of dollars"""
+    return max(Decimal('0.01'), round(Decimal(rng.lognormvariate(3, 1)), 2))
+
+
+def zipfian_transfers(account_ids: List[Any], operations: int, rng: random.Random) -> List[Operation]:
+    """Transfers between Zipf-distributed accounts with one balance read in ten"""
+    sampler = ZipfianSampler(account_ids, skew=1.1, rng=rng)
+    
+    result = []
+    for _ in range(operations):
+        if rng.random() < 0.1:
+            result.append(('balance', sampler.sample()))
+        else:
+            source, destination = sampler.sample_pair()
+            result.append(('transfer', source, destination, payment_amount(rng)))
+    return result
+
+
+def payroll_bursts(account_ids: List[Any], operations: int, rng: random.Random) -> List[Operation]:
+    """Background Zipfian spending, interrupted by payroll runs crediting many employees at once"""
+    employers = account_ids[:max(1, len(account_ids) // 20)]
+    employees = account_ids[len(employers):]
+    sampler = ZipfianSampler(employees, skew=0.9, rng=rng)
+    burst_every = 50
+    
+    result = []
+    for index in range(operations):
+        if index % burst_every == 0:
+            payees = rng.sample(employees, min(len(employees), 100))
+            salaries = [(employee, Decimal(rng.randint(1500, 6000))) for employee in payees]
+            result.append(('payroll', rng.choice(employers), salaries))
+        else:
+            source, destination = sampler.sample_pair()
+            result.append(('transfer', source, destination, payment_amount(rng)))
+    return result
+
+
+def deposits_and_withdrawals(account_ids: List[Any], operations: int, rng: random.Random) -> List[Operation]:
+    """Uniform deposits, withdrawals that sometimes overdraw, and balance reads"""
+    result = []
+    for _ in range(operations):
+        account = rng.choice(account_ids)
+        draw = rng.random()
+        if draw < 0.45:
+            result.append(('deposit', account, payment_amount(rng)))
+        elif draw < 0.9:
+            result.append(('withdrawal', account, payment_amount(rng) * 2))
+        else:
+            result.append(('balance', account))
+    return result
+
+
+class Workload(NamedTuple):
+    description: str
+    # Opening balance of every account
+    funding: Decimal
+    generate: Callable[[List[Any], int, random.Random], List[Operation]]
+
+
+WORKLOADS: Dict[str, Workload] = {
+    'zipfian_transfers': Workload(
+        "Transfers concentrated on a few hot accounts",
+        Decimal('100000'),
+        zipfian_transfers
+    ),
+    'payroll_bursts': Workload(
+        "Zipfian spending with periodic 100-employee payroll batches",
+        Decimal('10000000'),
+        payroll_bursts
+    ),
+    'deposits_and_withdrawals': Workload(
+        "Deposits, withdrawals and reads on uniformly chosen accounts",
+        Decimal('500'),
+        deposits_and_withdrawals
+    ),
+}
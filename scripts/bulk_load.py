@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Bulk load historical transactions and their ledger entries with COPY.
+
+Input is CSV with a header row, or NDJSON, with one record per ledger entry:
+
+    transaction_id, type, currency, description, created_at,
+    account_id, entry_type, amount[, leg_number]
+
+The entries of a transaction must be adjacent. They are grouped one
+transaction at a time and checked to balance (deposits and withdrawals post
+a single leg, as the double-entry trigger allows), then buffered as CSV and
+sent with COPY FROM STDIN once per batch. Memory therefore depends on the
+batch size, never on the input size.
+
+Each batch commits on its own, with synchronous_commit off, so after a
+database crash check which transactions arrived before resuming the load.
+By default the load runs with session_replication_role = replica, which
+skips the double-entry and foreign key triggers for this session only; the
+loader does both checks itself, once per batch. That needs a superuser; pass --keep-triggers
+otherwise. With --rebuild-indexes the secondary indexes on transactions
+and ledger_entries are dropped for the load and rebuilt at the end. That
+blocks other users of those tables, so only use it in an onboarding window.
+
+Pass --from-month with the month of the oldest entry so that the monthly
+partitions exist before the load. There is no default partition, so a row
+outside every partition fails the load.
+"""
+import csv
+import io
+import json
+import sys
+import time
+import uuid
+import argparse
+import resource
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from config import settings
+from database import SessionLocal, engine
+from models.balance_snapshot import BalanceSnapshot
+from services.ledger_service import LedgerService
+
+TRANSACTIONS_COPY = (
+    "COPY transactions (id, type, status, amount, currency, description, metadata, created_at, completed_at) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+LEDGER_ENTRIES_COPY = (
+    "COPY ledger_entries (id, account_id, transaction_id, entry_type, amount, leg_number, created_at) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+MISSING_ACCOUNTS_QUERY = """
+    SELECT requested.id
+    FROM unnest(%s::uuid[]) AS requested(id)
+    WHERE NOT EXISTS (SELECT 1 FROM accounts WHERE accounts.id = requested.id)
+"""
+
+# Primary keys and unique constraints stay; they are what reject duplicate rows
+SECONDARY_INDEXES_QUERY = """
+    SELECT index_class.relname, pg_get_indexdef(index_class.oid)
+    FROM pg_index
+    JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+    WHERE pg_index.indrelid = %s::regclass
+      AND NOT pg_index.indisunique
+      AND NOT pg_index.indisprimary
+"""
+
+LOADED_TABLES = ('transactions', 'ledger_entries')
+
+# Transactions with one leg against an external party, exempt from balancing
+SINGLE_LEG_TYPES = ('deposit', 'withdrawal')
+
+def read_records(source, input_format):
+    """Yield one dict per input line without reading ahead"""
+    if input_format == 'csv':
+        yield from csv.DictReader(source)
+        return
+    
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+def group_transactions(records):
+    """Yield (transaction_id, entries) for each run of adjacent records of one transaction"""
+    transaction_id = None
+    entries = []
+    
+    for record in records:
+        if record['transaction_id'] != transaction_id and entries:
+            yield transaction_id, entries
+            entries = []
+        transaction_id = record['transaction_id']
+        entries.append(record)
+    
+    if entries:
+        yield transaction_id, entries
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp, treating one without an offset as UTC"""
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def validate_transaction(transaction_id, records):
+    """Check one transaction's entries and return its transaction and entry rows for COPY.
+    
+    Raises ValueError naming the transaction if anything is malformed or the
+    entries do not balance.
+    """
+    try:
+        first = records[0]
+        transaction_type = first['type']
+        created_at = parse_timestamp(first['created_at'])
+        
+        total = Decimal(0)
+        debits = Decimal(0)
+        credits = Decimal(0)
+        entry_rows = []
+        for position, record in enumerate(records, start=1):
+            if record['type'] != transaction_type:
+                raise ValueError("entries disagree on the transaction type")
+            
+            entry_type = record['entry_type']
+            if entry_type not in ('debit', 'credit'):
+                raise ValueError(f"entry type must be debit or credit, got {entry_type!r}")
+            
+            amount = Decimal(str(record['amount']))
+            if amount <= 0:
+                raise ValueError("entry amounts must be positive")
+            
+            if entry_type == 'credit':
+                credits += amount
+                total += amount
+            else:
+                debits += amount
+                total -= amount
+            
+            entry_rows.append((
+                uuid.uuid4(),
+                uuid.UUID(str(record['account_id'])),
+                uuid.UUID(str(transaction_id)),
+                entry_type,
+                amount,
+                int(record.get('leg_number') or position),
+                created_at.isoformat()
+            ))
+    except (KeyError, ValueError, InvalidOperation) as e:
+        raise ValueError(f"Transaction {transaction_id}: {e}")
+    
+    if total != 0 and not (transaction_type in SINGLE_LEG_TYPES and len(records) == 1):
+        raise ValueError(f"Transaction {transaction_id}: entries do not balance, net {total}")
+    
+    metadata = {'source': 'bulk_load'}
+    if transaction_type == 'transfer':
+        # transfer_currency_check is enforced even with triggers off; a balanced
+        # transfer has at least one leg of each kind to name its two sides
+        metadata['source_account_id'] = str(next(row[1] for row in entry_rows if row[3] == 'debit'))
+        metadata['destination_account_id'] = str(next(row[1] for row in entry_rows if row[3] == 'credit'))
+    
+    transaction_row = (
+        uuid.UUID(str(transaction_id)),
+        transaction_type,
+        'completed',
+        max(debits, credits),
+        first.get('currency') or 'USD',
+        first.get('description') or None,
+        json.dumps(metadata),
+        created_at.isoformat(),
+        created_at.isoformat()
+    )
+    
+    return transaction_row, entry_rows
+
+def copy_batch(connection, transactions, entries, account_ids):
+    """Check that every account exists, COPY one batch of both tables and commit it"""
+    with connection.cursor() as cursor:
+        cursor.execute(MISSING_ACCOUNTS_QUERY, ([str(account_id) for account_id in account_ids],))
+        missing = [str(account_id) for (account_id,) in cursor.fetchall()]
+        if missing:
+            raise ValueError(f"Unknown accounts: {', '.join(missing[:10])}")
+        
+        # Transactions first, for the entries' foreign key when triggers are on
+        transactions.seek(0)
+        cursor.copy_expert(TRANSACTIONS_COPY, transactions)
+        entries.seek(0)
+        cursor.copy_expert(LEDGER_ENTRIES_COPY, entries)
+    
+    connection.commit()
+
+def drop_secondary_indexes(connection):
+    """Drop the secondary indexes of the loaded tables, returning their definitions"""
+    definitions = []
+    with connection.cursor() as cursor:
+        for table in LOADED_TABLES:
+            cursor.execute(SECONDARY_INDEXES_QUERY, (table,))
+            for name, definition in cursor.fetchall():
+                cursor.execute(f'DROP INDEX "{name}"')
+                definitions.append(definition)
+    connection.commit()
+    return definitions
+
+def create_indexes(connection, definitions):
+    with connection.cursor() as cursor:
+        for definition in definitions:
+            print(f"Rebuilding {definition}")
+            cursor.execute(definition)
+        for table in LOADED_TABLES:
+            cursor.execute(f"ANALYZE {table}")
+    connection.commit()
+
+def refresh_derived_state(earliest):
+    """Bring snapshots, rollups and materialized balances up to date with the loaded history"""
+    db = SessionLocal()
+    
+    try:
+        # A snapshot positioned after a loaded entry does not include it
+        stale = db.query(BalanceSnapshot)\
+            .filter(BalanceSnapshot.as_of_created_at >= earliest)\
+            .delete(synchronize_session=False)
+        print(f"Deleted {stale} balance snapshots taken after the earliest loaded entry")
+        
+        LedgerService.refresh_daily_balances(db)
+        
+        if settings.BALANCE_MODE == "materialized":
+            LedgerService.rebuild_materialized_balances(db)
+        
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def bulk_load(
+    source,
+    input_format='csv',
+    batch_size=50000,
+    keep_triggers=False,
+    rebuild_indexes=False,
+    from_month=None,
+    skip_invalid=False
+):
+    """Load the input in batches and return counts, throughput and peak memory"""
+    connection = engine.raw_connection()
+    
+    counts = {'transactions': 0, 'entries': 0, 'skipped': 0}
+    earliest = None
+    index_definitions = []
+    started = time.perf_counter()
+    
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET synchronous_commit TO off")
+            if not keep_triggers:
+                cursor.execute("SET session_replication_role TO replica")
+            if from_month:
+                cursor.execute(
+                    "SELECT ensure_ledger_partitions(%s, %s)",
+                    (settings.LEDGER_PARTITION_MONTHS_AHEAD, f"{from_month}-01")
+                )
+                print(f"Created {cursor.fetchone()[0]} ledger partitions")
+        connection.commit()
+        
+        if rebuild_indexes:
+            index_definitions = drop_secondary_indexes(connection)
+        
+        transactions = io.StringIO()
+        entries = io.StringIO()
+        transaction_writer = csv.writer(transactions)
+        entry_writer = csv.writer(entries)
+        account_ids = set()
+        batch_entries = 0
+        batch_transactions = 0
+        
+        for transaction_id, records in group_transactions(read_records(source, input_format)):
+            try:
+                transaction_row, entry_rows = validate_transaction(transaction_id, records)
+            except ValueError as e:
+                if not skip_invalid:
+                    raise
+                print(f"Skipping {e}")
+                counts['skipped'] += 1
+                continue
+            
+            transaction_writer.writerow(transaction_row)
+            entry_writer.writerows(entry_rows)
+            account_ids.update(row[1] for row in entry_rows)
+            batch_transactions += 1
+            batch_entries += len(entry_rows)
+            
+            created_at = parse_timestamp(transaction_row[7])
+            if earliest is None or created_at < earliest:
+                earliest = created_at
+            
+            if batch_entries >= batch_size:
+                copy_batch(connection, transactions, entries, account_ids)
+                counts['transactions'] += batch_transactions
+                counts['entries'] += batch_entries
+                print(f"Loaded {counts['entries']} entries in {counts['transactions']} transactions")
+                
+                transactions.seek(0)
+                transactions.truncate()
+                entries.seek(0)
+                entries.truncate()
+                account_ids.clear()
+                batch_entries = 0
+                batch_transactions = 0
+        
+        if batch_entries:
+            copy_batch(connection, transactions, entries, account_ids)
+            counts['transactions'] += batch_transactions
+            counts['entries'] += batch_entries
+    except Exception:
+        connection.rollback()
+        print(f"Stopped after {counts['entries']} committed entries in {counts['transactions']} transactions")
+        raise
+    finally:
+        try:
+            if index_definitions:
+                create_indexes(connection, index_definitions)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET session_replication_role")
+                cursor.execute("RESET synchronous_commit")
+            connection.commit()
+            connection.close()
+    
+    elapsed = time.perf_counter() - started
+    
+    if earliest is not None:
+        refresh_derived_state(earliest)
+    
+    return {
+        **counts,
+        'seconds': round(elapsed, 3),
+        'entries_per_second': round(counts['entries'] / elapsed, 1) if elapsed else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load historical ledger entries with COPY")
+    parser.add_argument("input", help="Input file, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv", help="Input format")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Ledger entries per COPY batch and commit")
+    parser.add_argument("--from-month", help="Create monthly partitions from this month (YYYY-MM) before loading")
+    parser.add_argument("--keep-triggers", action="store_true", help="Leave the double-entry and foreign key triggers on")
+    parser.add_argument("--rebuild-indexes", action="store_true", help="Drop secondary indexes for the load and rebuild them after")
+    parser.add_argument("--skip-invalid", action="store_true", help="Report and skip invalid transactions instead of stopping")
+    parser.add_argument("--json", action="store_true", help="Print the final report as JSON")
+    args = parser.parse_args()
+    
+    if args.input == "-":
+        source = sys.stdin
+    else:
+        source = open(args.input, newline='', encoding='utf-8')
+    
+    try:
+        result = bulk_load(
+            source,
+            input_format=args.format,
+            batch_size=args.batch_size,
+            keep_triggers=args.keep_triggers,
+            rebuild_indexes=args.rebuild_indexes,
+            from_month=args.from_month,
+            skip_invalid=args.skip_invalid
+        )
+    finally:
+        source.close()
+    
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(
+            f"Loaded {result['entries']} entries in {result['transactions']} transactions "
+            f"({result['skipped']} skipped) in {result['seconds']}s: "
+            f"{result['entries_per_second']} entries/s, peak RSS {result['peak_rss_mb']} MB"
+        )
@@ -61,6 +61,22 @@ def check_status():
     # Check for unapplied migrations
     command.current(alembic_cfg, verbose=True)
 
+def write_head(path=None):
+    """Write the head revision to src/migration_head.py for startup checks"""
+    from alembic.script import ScriptDirectory
+    
+    root = Path(__file__).parent.parent
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option("script_location", str(root / 'alembic'))
+    head = ScriptDirectory.from_config(alembic_cfg).get_current_head()
+    
+    path = Path(path) if path else root / 'src' / 'migration_head.py'
+    path.write_text(
+        '"""Written by scripts/migrate.py write-head at build time; do not edit"""\n'
+        f'HEAD_REVISION = {head!r}\n'
+    )
+    print(f"Wrote head revision {head} to {path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Database migration manager")
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
@@ -90,6 +106,10 @@ def main():
     # Current command
     subparsers.add_parser('current', help='Show current revision')
     
+    # Write-head command
+    write_head_parser = subparsers.add_parser('write-head', help='Record the head revision for startup checks')
+    write_head_parser.add_argument('--path', help='File to write (default: src/migration_head.py)')
+    
     args = parser.parse_args()
     
     if args.command == 'upgrade':
@@ -104,6 +124,8 @@ def main():
         command.history(Config("alembic.ini"), verbose=True)
     elif args.command == 'current':
         command.current(Config("alembic.ini"), verbose=True)
+    elif args.command == 'write-head':
+        write_head(args.path)
     else:
         parser.print_help()
 
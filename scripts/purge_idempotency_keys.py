@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Delete expired Idempotency-Key records in batches
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from database import SessionLocal
+from services.idempotency_service import IdempotencyService
+
+def purge_idempotency_keys(batch_size=10000):
+    """Purge expired keys one committed batch at a time"""
+    db = SessionLocal()
+    total = 0
+    
+    try:
+        while True:
+            deleted = IdempotencyService.purge_expired(db, batch_size=batch_size)
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+        
+        print(f"Purged {total} expired idempotency keys")
+        return total
+    except Exception as e:
+        db.rollback()
+        print(f"Error purging idempotency keys: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge expired idempotency keys")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows deleted per transaction")
+    args = parser.parse_args()
+    
+    purge_idempotency_keys(batch_size=args.batch_size)
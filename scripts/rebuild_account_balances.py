@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Recompute the materialized accounts.balance and entry_count from the ledger.
+
+Run this after switching every worker to BALANCE_MODE=materialized, since
+postings made in ledger mode do not update the columns, or to repair
+mismatches reported by the verification job. Postings wait on the accounts
+lock while it runs.
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from database import SessionLocal
+from services.ledger_service import LedgerService
+
+def rebuild_account_balances(verify_only=False):
+    """Rebuild the balances in one transaction, or only report mismatches"""
+    db = SessionLocal()
+    
+    try:
+        if verify_only:
+            mismatched = LedgerService.verify_materialized_balances(db)
+            print(f"{mismatched} accounts have mismatched materialized balances")
+            return mismatched
+        
+        rebuilt = LedgerService.rebuild_materialized_balances(db)
+        db.commit()
+        print(f"Rebuilt materialized balances for {rebuilt} accounts")
+        return rebuilt
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding account balances: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild materialized account balances")
+    parser.add_argument("--verify-only", action="store_true", help="Report mismatches without changing anything")
+    args = parser.parse_args()
+    
+    result = rebuild_account_balances(verify_only=args.verify_only)
+    if args.verify_only and result:
+        sys.exit(1)
@@ -145,9 +145,11 @@ def seed_database():
         
         # Show sample account balances
         print("\n=== SAMPLE ACCOUNT BALANCES ===")
-        for account in random.sample(accounts, 5):
-            from services.ledger_service import LedgerService
-            balance = LedgerService.calculate_balance(db, account.id)
+        from services.ledger_service import LedgerService
+        sample_accounts = random.sample(accounts, 5)
+        balances = LedgerService.calculate_balances(db, [account.id for account in sample_accounts])
+        for account in sample_accounts:
+            balance = balances.get(account.id, Decimal(0))
             print(f"{account.user_id} - {account.account_type}: ${balance}")
         
     except Exception as e:
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Split a high-contention account into bucket sub-accounts.
+
+Credits to the account are then spread over the buckets, so concurrent
+transfers into it lock different rows, and its balance is the sum of its
+own and its buckets'. Running it again with a larger count adds buckets;
+the count cannot be reduced.
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+from database import SessionLocal
+from services.account_service import AccountService
+
+def split_hot_account(account_id, bucket_count):
+    """Split the account in one transaction"""
+    db = SessionLocal()
+    
+    try:
+        account = AccountService.split_account(db, account_id, bucket_count)
+        db.commit()
+        print(f"Account {account.id} now has {account.bucket_count} buckets")
+        return account
+    except Exception as e:
+        db.rollback()
+        print(f"Error splitting account {account_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a hot account into bucket sub-accounts")
+    parser.add_argument("account_id", help="Account to split")
+    parser.add_argument("--buckets", type=int, default=8, help="Number of buckets")
+    args = parser.parse_args()
+    
+    split_hot_account(args.account_id, args.buckets)
@@ -1,12 +1,15 @@
 from typing import List
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field, validator
 import uuid
 
-from database import get_db
+from database import get_session
+from replicas import get_read_session
 from services.account_service import AccountService
-from services.ledger_service import LedgerService
+from services.async_services import AsyncAccountService, AsyncLedgerService, AsyncTransactionService
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
@@ -33,6 +36,24 @@ class AccountResponse(BaseModel):
         from_attributes = True
 
 
+class BalanceResponse(BaseModel):
+    account_id: str
+    as_of: str
+    balance: float
+    balance_decimal: str
+
+
+class LedgerTransactionResponse(BaseModel):
+    id: str
+    type: str
+    status: str
+    amount: float
+    currency: str
+    description: str | None
+    created_at: str
+    completed_at: str | None
+
+
 class LedgerEntryResponse(BaseModel):
     id: str
     account_id: str
@@ -40,27 +61,61 @@ class LedgerEntryResponse(BaseModel):
     entry_type: str
     amount: float
     created_at: str
+    # Only with ?include=transaction
+    transaction: LedgerTransactionResponse | None = None
     
     class Config:
         from_attributes = True
 
 
+def ledger_entry_row(entry, include_transaction: bool = False) -> dict:
+    """LedgerEntryResponse body for an entry.
+    
+    Ids and timestamps are left as UUID and datetime for orjson to encode,
+    which writes them as the same strings str() and isoformat() would.
+    """
+    row = {
+        "id": entry.id,
+        "account_id": entry.account_id,
+        "transaction_id": entry.transaction_id,
+        "entry_type": entry.entry_type,
+        "amount": float(entry.amount),
+        "created_at": entry.created_at
+    }
+    
+    if include_transaction:
+        transaction = entry.transaction
+        row["transaction"] = {
+            "id": transaction.id,
+            "type": transaction.type,
+            "status": transaction.status,
+            "amount": float(transaction.amount),
+            "currency": transaction.currency,
+            "description": transaction.description,
+            "created_at": transaction.created_at,
+            "completed_at": transaction.completed_at
+        }
+    
+    return row
+
+
 @router.post("/", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
-def create_account(
+async def create_account(
     account_data: AccountCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_session)
 ):
     """Create a new account"""
     try:
-        account = AccountService.create_account(
-            db=db,
+        # Commit before responding so the account is readable, including on replicas
+        account = await AsyncTransactionService.run_with_retry(db, lambda session: AccountService.create_account(
+            db=session,
             user_id=account_data.user_id,
             account_type=account_data.account_type,
             currency=account_data.currency
-        )
-        
-        return AccountService.get_account_with_balance(db, account.id)
+        ))
         
+        return await AsyncAccountService.get_account_with_balance(db, account.id)
+    
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,16 +129,16 @@ def create_account(
 
 
 @router.get("/{account_id}", response_model=AccountResponse)
-def get_account(
+async def get_account(
     account_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_session)
 ):
     """Get account details with balance"""
     try:
         # Validate UUID
         uuid.UUID(account_id)
         
-        account_data = AccountService.get_account_with_balance(db, account_id)
+        account_data = await AsyncAccountService.get_account_with_balance(db, account_id)
         
         if not account_data:
             raise HTTPException(
@@ -92,7 +147,7 @@ def get_account(
             )
         
         return account_data
-        
+    
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -107,46 +162,111 @@ def get_account(
         )
 
 
+@router.get("/{account_id}/balance", response_model=BalanceResponse)
+async def get_account_balance(
+    account_id: str,
+    as_of: datetime | None = Query(None, description="Point in time for the balance; defaults to now"),
+    db: Session = Depends(get_read_session)
+):
+    """Get an account's balance, optionally as of a point in time"""
+    try:
+        # Validate UUID
+        uuid.UUID(account_id)
+        
+        account = await AsyncAccountService.get_account_info(db, account_id)
+        if not account:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found"
+            )
+        
+        if as_of is None:
+            as_of = datetime.now(timezone.utc)
+            balance = await AsyncLedgerService.calculate_balance(db, account.id, bucket_count=account.bucket_count)
+        else:
+            balance = await AsyncLedgerService.calculate_balance_as_of(db, account.id, as_of, bucket_count=account.bucket_count)
+        
+        return ORJSONResponse(content={
+            "account_id": str(account.id),
+            "as_of": as_of.isoformat(),
+            "balance": float(balance),
+            "balance_decimal": str(balance)
+        })
+    
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid account ID format"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve balance: {str(e)}"
+        )
+
+
 @router.get("/{account_id}/ledger", response_model=List[LedgerEntryResponse])
-def get_account_ledger(
+async def get_account_ledger(
     account_id: str,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    start: datetime | None = Query(None, alias="from", description="Inclusive lower bound on created_at"),
+    end: datetime | None = Query(None, alias="to", description="Exclusive upper bound on created_at"),
+    include: str | None = Query(None, pattern="^transaction$", description="Embed each entry's transaction"),
+    db: Session = Depends(get_read_session)
 ):
-    """Get ledger entries for an account"""
+    """Get ledger entries for an account, newest first.
+    
+    The X-Next-Cursor response header holds the cursor for the next page;
+    it is omitted on the last page. Cursor paging cannot be combined with
+    an offset. Pass the same from/to range with every page of a cursor.
+    include=transaction adds each entry's transaction, loaded in one extra
+    query per page.
+    """
     try:
         # Validate UUID
         uuid.UUID(account_id)
         
+        if cursor and offset:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Use either cursor or offset, not both"
+            )
+        
         # Check if account exists
-        account = AccountService.get_account(db, account_id)
+        account = await AsyncAccountService.get_account_info(db, account_id)
         if not account:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Account not found"
             )
         
-        ledger_entries = LedgerService.get_account_ledger(
+        ledger_entries, next_cursor = await AsyncLedgerService.get_account_ledger_page(
             db=db,
             account_id=account_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            start=start,
+            end=end,
+            include_transaction=include == "transaction",
+            bucket_count=account.bucket_count
         )
         
-        return [
-            LedgerEntryResponse(
-                id=str(entry.id),
-                account_id=str(entry.account_id),
-                transaction_id=str(entry.transaction_id),
-                entry_type=entry.entry_type,
-                amount=float(entry.amount),
-                created_at=entry.created_at.isoformat() if entry.created_at else None
+        return ORJSONResponse(
+            content=[ledger_entry_row(entry, include_transaction=include == "transaction") for entry in ledger_entries],
+            headers={"X-Next-Cursor": next_cursor} if next_cursor else None
+        )
+    
+    except ValueError as e:
+        if "cursor" in str(e):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
             )
-            for entry in ledger_entries
-        ]
-        
-    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid account ID format"
@@ -160,16 +280,60 @@ def get_account_ledger(
         )
 
 
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+@router.get("/{account_id}/ledger/export")
+async def export_account_ledger(
+    account_id: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: datetime | None = Query(None, alias="from", description="Inclusive lower bound on created_at"),
+    end: datetime | None = Query(None, alias="to", description="Exclusive upper bound on created_at"),
+    db: Session = Depends(get_read_session)
+):
+    """Stream every ledger entry for an account, oldest first, as CSV or NDJSON"""
+    try:
+        # Validate UUID
+        uuid.UUID(account_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid account ID format"
+        )
+    
+    if start and end and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="from must be earlier than to"
+        )
+    
+    account = await AsyncAccountService.get_account_info(db, account_id)
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Account not found"
+        )
+    
+    return StreamingResponse(
+        AsyncLedgerService.stream_ledger_export(db, account.id, format, start, end, bucket_count=account.bucket_count),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ledger-{account_id}.{format}"'}
+    )
+
+
 @router.get("/user/{user_id}/accounts", response_model=List[AccountResponse])
-def get_user_accounts(
+async def get_user_accounts(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_session)
 ):
     """Get all accounts for a user"""
     try:
-        accounts = AccountService.get_user_accounts(db, user_id)
+        accounts = await AsyncAccountService.get_user_accounts(db, user_id)
         return accounts
-        
+    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 import uuid
 
-from database import get_db
+from database import get_session
 from services.transaction_service import TransactionService
+from services.async_services import AsyncTransactionService
+from api.idempotency import run_idempotent
 
 router = APIRouter(prefix="", tags=["deposits", "withdrawals"])
 
@@ -48,38 +50,59 @@ class TransactionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+def transaction_response(transaction) -> dict:
+    """TransactionResponse body for a transaction, built without validating a model"""
+    return {
+        "id": str(transaction.id),
+        "type": transaction.type,
+        "status": transaction.status,
+        "amount": float(transaction.amount),
+        "currency": transaction.currency,
+        "description": transaction.description,
+        "created_at": transaction.created_at.isoformat() if transaction.created_at else None,
+        "completed_at": transaction.completed_at.isoformat() if transaction.completed_at else None
+    }
+
 @router.post("/deposits", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
-def create_deposit(
+async def create_deposit(
     deposit_data: DepositRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_session)
 ):
     try:
         uuid.UUID(deposit_data.account_id)
         
-        transaction = TransactionService.execute_deposit(
-            db=db,
-            account_id=deposit_data.account_id,
-            amount=deposit_data.amount,
-            currency=deposit_data.currency,
-            description=deposit_data.description
-        )
+        def deposit(session: Session) -> dict:
+            transaction = TransactionService.execute_deposit(
+                db=session,
+                account_id=deposit_data.account_id,
+                amount=deposit_data.amount,
+                currency=deposit_data.currency,
+                description=deposit_data.description
+            )
+            
+            return transaction_response(transaction)
         
-        return TransactionResponse(
-            id=str(transaction.id),
-            type=transaction.type,
-            status=transaction.status,
-            amount=float(transaction.amount),
-            currency=transaction.currency,
-            description=transaction.description,
-            created_at=transaction.created_at.isoformat() if transaction.created_at else None,
-            completed_at=transaction.completed_at.isoformat() if transaction.completed_at else None
+        return await run_idempotent(
+            db,
+            scope="deposits",
+            idempotency_key=idempotency_key,
+            payload=deposit_data.dict(),
+            operation=deposit,
+            status_code=status.HTTP_201_CREATED
         )
         
     except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+        if "Idempotency-Key" in str(e):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e)
+            )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -87,34 +110,36 @@ def create_deposit(
         )
 
 @router.post("/withdrawals", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
-def create_withdrawal(
+async def create_withdrawal(
     withdrawal_data: WithdrawalRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_session)
 ):
     try:
         uuid.UUID(withdrawal_data.account_id)
         
-        transaction = TransactionService.execute_withdrawal(
-            db=db,
-            account_id=withdrawal_data.account_id,
-            amount=withdrawal_data.amount,
-            currency=withdrawal_data.currency,
-            description=withdrawal_data.description
-        )
+        def withdrawal(session: Session) -> dict:
+            transaction = TransactionService.execute_withdrawal(
+                db=session,
+                account_id=withdrawal_data.account_id,
+                amount=withdrawal_data.amount,
+                currency=withdrawal_data.currency,
+                description=withdrawal_data.description
+            )
+            
+            return transaction_response(transaction)
         
-        return TransactionResponse(
-            id=str(transaction.id),
-            type=transaction.type,
-            status=transaction.status,
-            amount=float(transaction.amount),
-            currency=transaction.currency,
-            description=transaction.description,
-            created_at=transaction.created_at.isoformat() if transaction.created_at else None,
-            completed_at=transaction.completed_at.isoformat() if transaction.completed_at else None
+        return await run_idempotent(
+            db,
+            scope="withdrawals",
+            idempotency_key=idempotency_key,
+            payload=withdrawal_data.dict(),
+            operation=withdrawal,
+            status_code=status.HTTP_201_CREATED
         )
         
     except ValueError as e:
-        if "Insufficient funds" in str(e):
+        if "Insufficient funds" in str(e) or "Idempotency-Key" in str(e):
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=str(e)
@@ -0,0 +1,47 @@
+from typing import Any, Callable, Dict, Optional
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from services.idempotency_service import IdempotencyService
+from services.async_services import AsyncTransactionService
+
+
+async def run_idempotent(
+    db: Session,
+    scope: str,
+    idempotency_key: Optional[str],
+    payload: Dict[str, Any],
+    operation: Callable[[Session], Dict[str, Any]],
+    status_code: int
+) -> ORJSONResponse:
+    """Run a write operation once per Idempotency-Key and replay its stored response.
+
+    The operation returns the response body, which is stored with the key in
+    the same database transaction. Requests without a key run as before.
+    The body is sent as it is, without another pass through response_model.
+    """
+    if idempotency_key is None:
+        body = await AsyncTransactionService.run_with_retry(db, operation)
+        return ORJSONResponse(status_code=status_code, content=body)
+    
+    request_hash = IdempotencyService.request_hash(payload)
+    
+    def run(session: Session):
+        stored = IdempotencyService.claim(session, scope, idempotency_key, request_hash)
+        if stored is not None:
+            return stored.response_status, stored.response_body, True
+        
+        body = operation(session)
+        IdempotencyService.complete(session, scope, idempotency_key, status_code, body)
+        return status_code, body, False
+    
+    response_status, body, replayed = await AsyncTransactionService.run_with_retry(db, run)
+    
+    if replayed:
+        return ORJSONResponse(
+            status_code=response_status,
+            content=body,
+            headers={"Idempotent-Replayed": "true"}
+        )
+    
+    return ORJSONResponse(status_code=response_status, content=body)
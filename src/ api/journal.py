@@ -0,0 +1,128 @@
+from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field, validator
+from decimal import Decimal
+import uuid
+
+from database import get_session
+from services.transaction_service import TransactionService
+from api.idempotency import run_idempotent
+
+router = APIRouter(prefix="/journal", tags=["journal"])
+
+
+class JournalLeg(BaseModel):
+    account_id: str = Field(..., example="123e4567-e89b-12d3-a456-426614174000")
+    entry_type: str = Field(..., pattern="^(debit|credit)$", example="debit")
+    amount: float = Field(..., gt=0, description="Leg amount must be positive", example=100.00)
+    
+    @validator('amount')
+    def validate_amount(cls, v):
+        # Convert to Decimal for precise arithmetic
+        try:
+            amount_decimal = Decimal(str(v))
+            if amount_decimal <= 0:
+                raise ValueError("Amount must be positive")
+            return amount_decimal
+        except Exception:
+            raise ValueError("Invalid amount format")
+
+
+class JournalRequest(BaseModel):
+    legs: List[JournalLeg] = Field(..., min_length=2, max_length=1000)
+    currency: str = Field(default="USD", pattern="^[A-Z]{3}$", example="USD")
+    description: str | None = Field(None, max_length=500, example="Payment with platform and processor fees")
+
+
+class JournalLegResponse(BaseModel):
+    leg_number: int
+    account_id: str
+    entry_type: str
+    amount: float
+
+
+class JournalResponse(BaseModel):
+    id: str
+    type: str
+    status: str
+    amount: float
+    currency: str
+    description: str | None
+    created_at: str
+    completed_at: str | None
+    legs: List[JournalLegResponse]
+
+
+@router.post("/", response_model=JournalResponse, status_code=status.HTTP_201_CREATED)
+async def create_journal(
+    journal_data: JournalRequest,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_session)
+):
+    """Post a balanced set of debit and credit legs as a single transaction"""
+    try:
+        # Validate UUIDs
+        for leg in journal_data.legs:
+            uuid.UUID(leg.account_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid account ID format"
+        )
+    
+    try:
+        def journal(session: Session) -> dict:
+            legs = [leg.dict() for leg in journal_data.legs]
+            transaction = TransactionService.execute_journal(
+                db=session,
+                legs=legs,
+                currency=journal_data.currency,
+                description=journal_data.description
+            )
+            
+            return {
+                "id": str(transaction.id),
+                "type": transaction.type,
+                "status": transaction.status,
+                "amount": float(transaction.amount),
+                "currency": transaction.currency,
+                "description": transaction.description,
+                "created_at": transaction.created_at.isoformat() if transaction.created_at else None,
+                "completed_at": transaction.completed_at.isoformat() if transaction.completed_at else None,
+                "legs": [
+                    {
+                        "leg_number": leg_number,
+                        "account_id": leg['account_id'],
+                        "entry_type": leg['entry_type'],
+                        "amount": float(leg['amount'])
+                    }
+                    for leg_number, leg in enumerate(legs, start=1)
+                ]
+            }
+        
+        return await run_idempotent(
+            db,
+            scope="journal",
+            idempotency_key=idempotency_key,
+            payload=journal_data.dict(),
+            operation=journal,
+            status_code=status.HTTP_201_CREATED
+        )
+    
+    except ValueError as e:
+        error_message = str(e)
+        if "Insufficient funds" in error_message or "Idempotency-Key" in error_message:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=error_message
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error_message
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Journal failed: {str(e)}"
+        )
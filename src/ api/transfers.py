@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 import uuid
 
-from database import get_db
+from database import get_session
+from replicas import get_read_session
 from services.transaction_service import TransactionService
+from services.async_services import AsyncTransactionService
+from api.idempotency import run_idempotent
 
 router = APIRouter(prefix="/transfers", tags=["transfers"])
 
@@ -44,10 +49,45 @@ class TransactionResponse(BaseModel):
         from_attributes = True
 
 
+def transaction_response(transaction) -> dict:
+    """TransactionResponse body for a transaction, built without validating a model"""
+    return {
+        "id": str(transaction.id),
+        "type": transaction.type,
+        "status": transaction.status,
+        "amount": float(transaction.amount),
+        "currency": transaction.currency,
+        "description": transaction.description,
+        "metadata": transaction.metadata or {},
+        "created_at": transaction.created_at.isoformat() if transaction.created_at else None,
+        "completed_at": transaction.completed_at.isoformat() if transaction.completed_at else None
+    }
+
+
+class BatchTransferRequest(BaseModel):
+    transfers: List[TransferRequest] = Field(..., min_length=1, max_length=10000)
+    atomic: bool = Field(default=True, description="Abort the whole batch if any transfer fails")
+
+
+class BatchTransferResult(BaseModel):
+    index: int
+    status: str
+    transaction_id: str | None = None
+    error: str | None = None
+
+
+class BatchTransferResponse(BaseModel):
+    atomic: bool
+    completed: int
+    failed: int
+    results: List[BatchTransferResult]
+
+
 @router.post("/", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
-def create_transfer(
+async def create_transfer(
     transfer_data: TransferRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_session)
 ):
     """Execute a transfer between accounts"""
     try:
@@ -55,30 +95,30 @@ def create_transfer(
         uuid.UUID(transfer_data.source_account_id)
         uuid.UUID(transfer_data.destination_account_id)
         
-        transaction = TransactionService.execute_transfer(
-            db=db,
-            source_account_id=transfer_data.source_account_id,
-            destination_account_id=transfer_data.destination_account_id,
-            amount=transfer_data.amount,
-            currency=transfer_data.currency,
-            description=transfer_data.description
-        )
+        def transfer(session: Session) -> dict:
+            transaction = TransactionService.execute_transfer(
+                db=session,
+                source_account_id=transfer_data.source_account_id,
+                destination_account_id=transfer_data.destination_account_id,
+                amount=transfer_data.amount,
+                currency=transfer_data.currency,
+                description=transfer_data.description
+            )
+            
+            return transaction_response(transaction)
         
-        return TransactionResponse(
-            id=str(transaction.id),
-            type=transaction.type,
-            status=transaction.status,
-            amount=float(transaction.amount),
-            currency=transaction.currency,
-            description=transaction.description,
-            metadata=transaction.metadata or {},
-            created_at=transaction.created_at.isoformat() if transaction.created_at else None,
-            completed_at=transaction.completed_at.isoformat() if transaction.completed_at else None
+        return await run_idempotent(
+            db,
+            scope="transfers",
+            idempotency_key=idempotency_key,
+            payload=transfer_data.dict(),
+            operation=transfer,
+            status_code=status.HTTP_201_CREATED
         )
         
     except ValueError as e:
         error_message = str(e)
-        if "Insufficient funds" in error_message:
+        if "Insufficient funds" in error_message or "Idempotency-Key" in error_message:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=error_message
@@ -100,17 +140,51 @@ def create_transfer(
         )
 
 
+@router.post("/batch", response_model=BatchTransferResponse, status_code=status.HTTP_201_CREATED)
+async def create_transfers_batch(
+    batch_data: BatchTransferRequest,
+    db: Session = Depends(get_session)
+):
+    """Execute many transfers in a single database transaction"""
+    try:
+        results = await AsyncTransactionService.run_with_retry(db, lambda session: TransactionService.execute_transfers_batch(
+            db=session,
+            transfers=[transfer.dict() for transfer in batch_data.transfers],
+            atomic=batch_data.atomic
+        ))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Transfer batch failed: {str(e)}"
+        )
+    
+    response = BatchTransferResponse(
+        atomic=batch_data.atomic,
+        completed=sum(1 for result in results if result['status'] == 'completed'),
+        failed=sum(1 for result in results if result['status'] == 'failed'),
+        results=results
+    )
+    
+    if batch_data.atomic and response.failed:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=response.dict()
+        )
+    
+    return ORJSONResponse(status_code=status.HTTP_201_CREATED, content=response.dict())
+
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
-def get_transfer(
+async def get_transfer(
     transaction_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_session)
 ):
     """Get transfer details"""
     try:
         # Validate UUID
         uuid.UUID(transaction_id)
         
-        transaction = TransactionService.get_transaction(db, transaction_id)
+        transaction = await AsyncTransactionService.get_transaction(db, transaction_id)
         
         if not transaction:
             raise HTTPException(
@@ -118,17 +192,7 @@ def get_transfer(
                 detail="Transaction not found"
             )
         
-        return TransactionResponse(
-            id=str(transaction.id),
-            type=transaction.type,
-            status=transaction.status,
-            amount=float(transaction.amount),
-            currency=transaction.currency,
-            description=transaction.description,
-            metadata=transaction.metadata or {},
-            created_at=transaction.created_at.isoformat() if transaction.created_at else None,
-            completed_at=transaction.completed_at.isoformat() if transaction.completed_at else None
-        )
+        return ORJSONResponse(content=transaction_response(transaction))
         
     except ValueError:
         raise HTTPException(
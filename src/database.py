@@ -1,32 +1,94 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
-from typing import Generator
+from sqlalchemy.pool import NullPool
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Optional, TypeVar
 import logging
 import os
+import random
+import time
+import uuid
+import zlib
 
 from config import settings
+from metrics import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, instrument_engine
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Use DATABASE_URL from environment or settings
 database_url = os.getenv('DATABASE_URL', settings.DATABASE_URL)
 
-engine = create_engine(
-    database_url,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=settings.DEBUG,
-    isolation_level="REPEATABLE_READ"
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_engine_options(url: str, async_driver: bool = False) -> Dict[str, Any]:
+    """Pool and connection options for an engine, from the DB_POOL_* settings.
+    
+    In "pgbouncer" mode PgBouncer does the pooling in transaction mode, so
+    the app holds no connections of its own (NullPool) and never prepares
+    named statements, which would outlive the transaction on a server
+    connection another client gets next.
+    
+    Dead connections are found by TCP keepalives and pool_recycle rather
+    than a ping on every checkout; pre-ping stays available as a setting.
+    """
+    options: Dict[str, Any] = {
+        'echo': settings.DEBUG,
+        'isolation_level': settings.DB_ISOLATION_LEVEL
+    }
+    connect_args: Dict[str, Any] = {}
+    
+    if settings.DB_POOL_MODE == "pgbouncer":
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncAdaptedQueuePool if async_driver else InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING
+        )
+    
+    if async_driver:
+        if settings.DB_POOL_MODE == "pgbouncer":
+            # Unnamed statements only: no asyncpg or SQLAlchemy statement caches
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__"
+            )
+    elif url.startswith(('postgresql', 'postgres://')):
+        # libpq keepalives detect a dead server without a per-checkout round-trip
+        connect_args.update(
+            keepalives=1,
+            keepalives_idle=settings.DB_KEEPALIVES_IDLE,
+            keepalives_interval=settings.DB_KEEPALIVES_INTERVAL,
+            keepalives_count=settings.DB_KEEPALIVES_COUNT
+        )
+    
+    if connect_args:
+        options['connect_args'] = connect_args
+    
+    return options
+
+engine = create_engine(database_url, **get_engine_options(database_url))
+if settings.METRICS_ENABLED:
+    instrument_engine(engine, "sync")
+
+# Routes read results after committing, which must not trigger a refresh on the event loop
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
+# Created on first use so sync deployments never load the asyncpg driver
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+# SQLSTATEs for serialization failures and deadlocks, which are safe to retry
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+T = TypeVar('T')
+
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
@@ -34,11 +96,63 @@ def get_db() -> Generator[Session, None, None]:
         db.commit()
     except Exception as e:
         db.rollback()
-        logger.error(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         raise
     finally:
         db.close()
 
+def get_async_database_url(url: str) -> str:
+    """Rewrite a PostgreSQL URL to use the asyncpg driver"""
+    for prefix in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if url.startswith(prefix):
+            return 'postgresql+asyncpg://' + url[len(prefix):]
+    return url
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Create the async engine and session factory on first use"""
+    global async_engine, AsyncSessionLocal
+    
+    if AsyncSessionLocal is None:
+        async_database_url = get_async_database_url(database_url)
+        async_engine = create_async_engine(
+            async_database_url,
+            **get_engine_options(async_database_url, async_driver=True)
+        )
+        if settings.METRICS_ENABLED:
+            instrument_engine(async_engine.sync_engine, "async")
+        # Attributes must stay loaded after commit; lazy refreshes cannot run on the event loop
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    
+    return AsyncSessionLocal
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """AsyncSession on asyncpg, committed after the request and rolled back on error.
+    
+    The services are still sync code: the async facades run them through
+    AsyncSession.run_sync, on the event loop thread in a greenlet that
+    yields only while asyncpg waits on the database. Threadpool dispatch
+    is replaced rather than removed, and the services' own Python work
+    (ORM, validation, serialization) now occupies the event loop.
+    """
+    db = get_async_sessionmaker()()
+    try:
+        yield db
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Database error: %s", e)
+        raise
+    finally:
+        await db.close()
+
+# Session dependency for the API routers, chosen by DB_MODE. Both modes run
+# the same sync service code; see get_async_db for what async mode changes.
+get_session = get_async_db if settings.DB_MODE == "async" else get_db
+
 @contextmanager
 def transaction():
     db = SessionLocal()
@@ -51,36 +165,142 @@ def transaction():
     finally:
         db.close()
 
+def require_primary(db: Session) -> None:
+    """Refuse to run writes or money-movement checks on a read replica session"""
+    if db.info.get('read_only'):
+        raise RuntimeError("This operation must run on the primary database, not a read replica")
+
+def is_retryable_error(error: Exception) -> bool:
+    """Check whether a database error is a serialization failure or deadlock"""
+    if not isinstance(error, DBAPIError):
+        return False
+    orig = getattr(error, 'orig', None)
+    sqlstate = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    return sqlstate in RETRYABLE_SQLSTATES
+
+def run_with_retry(
+    db: Session,
+    operation: Callable[[], T],
+    max_attempts: Optional[int] = None
+) -> T:
+    """Run an operation and commit it, retrying serialization failures and deadlocks.
+    
+    The session is rolled back before each retry and the operation is run
+    again from the start, with jittered exponential backoff between attempts.
+    """
+    max_attempts = max_attempts or settings.DB_RETRY_ATTEMPTS
+    
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = operation()
+            db.commit()
+            return result
+        except DBAPIError as e:
+            db.rollback()
+            delay = retry_backoff(e, attempt, max_attempts)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+def retry_backoff(error: DBAPIError, attempt: int, max_attempts: int) -> Optional[float]:
+    """Seconds to wait before retrying a failed attempt, or None to give up.
+    
+    The retry policy shared by run_with_retry and its async counterpart in
+    AsyncTransactionService: only serialization failures and deadlocks are
+    retried, up to max_attempts, with jittered exponential backoff.
+    """
+    if not is_retryable_error(error) or attempt >= max_attempts:
+        return None
+    
+    logger.warning("Retrying after %s (attempt %s of %s)", error.orig.__class__.__name__, attempt, max_attempts)
+    return retry_delay(attempt)
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait after a failed attempt: jittered exponential backoff, capped"""
+    delay_ms = min(
+        settings.DB_RETRY_MAX_DELAY_MS,
+        settings.DB_RETRY_BASE_DELAY_MS * (2 ** (attempt - 1))
+    )
+    return random.uniform(0, delay_ms) / 1000
+
+# Session-level advisory lock serializing startup migrations across workers
+MIGRATION_LOCK_ID = zlib.crc32(b"run_migrations")
+ALEMBIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'alembic')
+
+def alembic_config():
+    """Alembic config for the migrations in alembic/, against DATABASE_URL"""
+    from alembic.config import Config
+    
+    # Not read from alembic.ini, whose logging section would replace the app's handlers
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option("script_location", ALEMBIC_DIR)
+    alembic_cfg.set_main_option("sqlalchemy.url", database_url)
+    return alembic_cfg
+
+def migration_head() -> str:
+    """Head revision of the migration scripts.
+    
+    Images write it to src/migration_head.py at build time (scripts/migrate.py
+    write-head), so workers can check it without importing Alembic. Without
+    that file it is read from the scripts.
+    """
+    try:
+        from migration_head import HEAD_REVISION
+    except ImportError:
+        from alembic.script import ScriptDirectory
+        return ScriptDirectory.from_config(alembic_config()).get_current_head()
+    return HEAD_REVISION
+
+def current_revision(conn) -> Optional[str]:
+    """Revision stored in alembic_version, or None for a database never migrated"""
+    if not inspect(conn).has_table("alembic_version"):
+        return None
+    return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
 # Function to run migrations on startup
 def run_migrations():
-    """Run database migrations on application startup"""
-    from alembic.config import Config
-    from alembic import command
+    """Upgrade the database to head unless it is there already.
+    
+    Workers starting together queue on an advisory lock, so one runs the
+    upgrade and the rest find the database at head once it is released.
+    """
+    head = migration_head()
     
     try:
-        alembic_cfg = Config("alembic.ini")
-        alembic_cfg.set_main_option("sqlalchemy.url", database_url)
-        command.upgrade(alembic_cfg, "head")
-        logger.info("Database migrations completed successfully")
+        with engine.connect() as conn:
+            locking = conn.dialect.name == 'postgresql'
+            if locking:
+                conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+            try:
+                current = current_revision(conn)
+                # End the transaction so it holds no table locks during the upgrade
+                conn.commit()
+                if current == head:
+                    return
+                
+                from alembic import command
+                command.upgrade(alembic_config(), "head")
+                logger.info("Database migrations completed successfully: %s to %s", current, head)
+            finally:
+                if locking:
+                    conn.rollback()
+                    conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+                    conn.commit()
     except Exception as e:
-        logger.error(f"Failed to run migrations: {e}")
+        logger.error("Failed to run migrations: %s", e)
         raise
 
 # Function to check if migrations are needed
 def check_migrations():
-    """Check if database migrations are up-to-date"""
-    from alembic.config import Config
-    from alembic.script import ScriptDirectory
+    """Raise if the database is not at the head revision"""
+    head = migration_head()
     
     try:
-        alembic_cfg = Config("alembic.ini")
-        script = ScriptDirectory.from_config(alembic_cfg)
-        
-        # Get current head revision
-        head_revision = script.get_current_head()
-        
-        logger.info(f"Current head revision: {head_revision}")
-        return True
+        with engine.connect() as conn:
+            current = current_revision(conn)
     except Exception as e:
-        logger.error(f"Failed to check migrations: {e}")
-        return False
+        logger.error("Failed to check migrations: %s", e)
+        raise
+    
+    if current != head:
+        raise RuntimeError(f"Database is at revision {current}, expected {head}; run migrations first")
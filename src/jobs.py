@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import zlib
+from typing import Callable, List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import SessionLocal, engine
+from services.account_cache import listen_for_account_changes
+from services.idempotency_service import IdempotencyService
+from services.ledger_service import LedgerService
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_daily_balances(db: Session) -> None:
+    LedgerService.refresh_daily_balances(db)
+
+
+def purge_idempotency_keys(db: Session, batch_size: int = 10000) -> None:
+    while IdempotencyService.purge_expired(db, batch_size=batch_size) == batch_size:
+        pass
+
+
+def ensure_ledger_partitions(db: Session) -> None:
+    LedgerService.ensure_ledger_partitions(db)
+
+
+def create_balance_snapshots(db: Session) -> None:
+    if settings.BALANCE_MODE != "materialized":
+        LedgerService.create_balance_snapshots(db)
+
+
+def verify_materialized_balances(db: Session) -> None:
+    if settings.BALANCE_MODE == "materialized":
+        LedgerService.verify_materialized_balances(db)
+
+
+# (name, interval in seconds, job)
+JOBS = [
+    ("refresh_daily_balances", lambda: settings.DAILY_BALANCES_REFRESH_SECONDS, refresh_daily_balances),
+    ("purge_idempotency_keys", lambda: settings.IDEMPOTENCY_KEY_PURGE_SECONDS, purge_idempotency_keys),
+    ("ensure_ledger_partitions", lambda: settings.LEDGER_PARTITION_CHECK_SECONDS, ensure_ledger_partitions),
+    ("create_balance_snapshots", lambda: settings.BALANCE_SNAPSHOT_SECONDS, create_balance_snapshots),
+    ("verify_materialized_balances", lambda: settings.BALANCE_VERIFY_SECONDS, verify_materialized_balances),
+]
+
+
+def run_job(name: str, job: Callable[[Session], None]) -> bool:
+    """Run a job in its own transaction, skipping it if another process holds its lock.
+    
+    Every API worker schedules the jobs; a transaction-scoped advisory lock
+    keyed on the job name makes sure only one of them runs each time.
+    """
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == 'postgresql':
+            lock_id = zlib.crc32(name.encode())
+            if not db.execute(select(func.pg_try_advisory_xact_lock(lock_id))).scalar():
+                logger.info("Skipping job %s: running in another process", name)
+                db.rollback()
+                return False
+        
+        job(db)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error("Job %s failed: %s", name, e)
+        return False
+    finally:
+        db.close()
+
+
+async def run_periodically(name: str, interval: Callable[[], int], job: Callable[[Session], None]) -> None:
+    while True:
+        await asyncio.sleep(interval())
+        await run_in_threadpool(run_job, name, job)
+
+
+def start_background_jobs() -> List[asyncio.Task]:
+    """Schedule every job on the running event loop"""
+    tasks = []
+    
+    # Every worker listens for its own cache. LISTEN needs a session-level
+    # connection, which PgBouncer in transaction mode cannot provide, so
+    # there the cache TTL alone bounds staleness.
+    if (
+        settings.ACCOUNT_CACHE_LISTEN_ENABLED
+        and settings.ACCOUNT_CACHE_SIZE > 0
+        and engine.dialect.name == 'postgresql'
+        and settings.DB_POOL_MODE != "pgbouncer"
+    ):
+        tasks.append(asyncio.create_task(listen_for_account_changes(engine), name="account_cache_listener"))
+    
+    if settings.BACKGROUND_JOBS_ENABLED:
+        tasks.extend(
+            asyncio.create_task(run_periodically(name, interval, job), name=name)
+            for name, interval, job in JOBS
+        )
+    
+    return tasks
+
+
+async def stop_background_jobs(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,145 @@
+import atexit
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from config import settings
+from metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has; anything else on a record was passed in extra=
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """Structured fields passed to the logging call with extra="""
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    """One line per record, with structured fields appended as key=value"""
+    
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with structured fields as top-level keys"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return json.dumps(document, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread without formatting them.
+    
+    The message is built from its arguments on the listener thread, so
+    arguments must be values (ids, counts, exceptions) rather than objects
+    that change after the call. A full queue drops the record instead of
+    blocking the request.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Tracebacks hold the caller's frames, so render them here and let the frames go
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class SampleFilter(logging.Filter):
+    """Keeps a fraction of a logger's records below WARNING"""
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def parse_logger_settings(value: str) -> List[Tuple[str, str]]:
+    """Split a comma-separated list of logger=value pairs"""
+    pairs = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, separator, setting = item.partition("=")
+        if not separator:
+            raise ValueError(f"Expected logger=value, got {item.strip()!r}")
+        pairs.append((name.strip(), setting.strip()))
+    return pairs
+
+
+def configure_logging(stream: Optional[TextIO] = None) -> None:
+    """Send records from every logger through a queue to a background writer.
+    
+    Log calls only create the record and queue it; formatting and the write
+    to stream (stderr by default) happen on the listener thread. Calling
+    this again while logging is configured does nothing.
+    """
+    global _listener, _queue_handler
+    
+    if _listener is not None:
+        return
+    
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+    
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.addHandler(_queue_handler)
+    
+    for name, level in parse_logger_settings(settings.LOG_LEVELS):
+        logging.getLogger(name).setLevel(level.upper())
+    for name, rate in parse_logger_settings(settings.LOG_SAMPLE_RATES):
+        logging.getLogger(name).addFilter(SampleFilter(float(rate)))
+    
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out the records still queued and stop the listener thread"""
+    global _listener, _queue_handler
+    
+    if _listener is None:
+        return
+    
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
@@ -1,19 +1,21 @@
-from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import traceback
 
-from database import Base, engine, run_migrations, check_migrations
+from database import Base, engine, check_migrations, current_revision, migration_head, run_migrations
 from config import settings
+from jobs import start_background_jobs, stop_background_jobs
+from logs import configure_logging
+from metrics import MetricsMiddleware, registry
+from replicas import WriteLSNMiddleware, replica_urls
 from api.accounts import router as accounts_router
 from api.transfers import router as transfers_router
 from api.deposits_withdrawals import router as deposits_withdrawals_router
+from api.journal import router as journal_router
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -22,7 +24,10 @@ app = FastAPI(
     description="Financial Ledger API with Double-Entry Bookkeeping",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # Encodes with orjson; routes on the hot path return their responses
+    # directly, so response_model only documents them
+    default_response_class=ORJSONResponse
 )
 
 # Run migrations on startup
@@ -30,21 +35,27 @@ app = FastAPI(
 async def startup_event():
     """Run database migrations on application startup"""
     try:
-        # Check if migrations are needed
-        if check_migrations():
-            logger.info("Running database migrations...")
+        if settings.STARTUP_MIGRATIONS == "upgrade":
             run_migrations()
-            logger.info("Database migrations completed")
+        elif settings.STARTUP_MIGRATIONS == "check":
+            check_migrations()
         
         # Create tables (for development only - migrations handle production)
         if settings.DEBUG:
             Base.metadata.create_all(bind=engine)
             logger.info("Database tables created (development mode)")
+        
+        app.state.background_jobs = start_background_jobs()
             
     except Exception as e:
-        logger.error(f"Startup error: {e}")
+        logger.error("Startup error: %s", e)
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop periodic maintenance jobs"""
+    await stop_background_jobs(getattr(app.state, "background_jobs", []))
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -54,10 +65,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Read-your-writes tokens for clients reading from replicas
+if replica_urls:
+    app.add_middleware(WriteLSNMiddleware)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Internal server error"}
     )
@@ -85,21 +103,26 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for the connection pools, routes and SQL per request"""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/migrations/status")
 async def migration_status():
     """Check migration status"""
     try:
-        from alembic.config import Config
-        from alembic.script import ScriptDirectory
-        
-        alembic_cfg = Config("alembic.ini")
-        script = ScriptDirectory.from_config(alembic_cfg)
-        head_revision = script.get_current_head()
+        head_revision = migration_head()
+        with engine.connect() as conn:
+            revision = current_revision(conn)
         
         return {
-            "status": "ok",
+            "status": "ok" if revision == head_revision else "pending",
             "head_revision": head_revision,
-            "message": "Migrations are up-to-date"
+            "current_revision": revision,
+            "message": "Migrations are up-to-date" if revision == head_revision else "Migrations have not been applied"
         }
     except Exception as e:
         return {
@@ -111,6 +134,7 @@ async def migration_status():
 app.include_router(accounts_router, prefix=settings.API_PREFIX)
 app.include_router(transfers_router, prefix=settings.API_PREFIX)
 app.include_router(deposits_withdrawals_router, prefix=settings.API_PREFIX)
+app.include_router(journal_router, prefix=settings.API_PREFIX)
 
 if __name__ == "__main__":
     import uvicorn
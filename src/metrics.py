@@ -0,0 +1,199 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+registry = CollectorRegistry()
+
+# Buckets shared by the latency histograms, from 1ms to 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    ["pool"],
+    registry=registry
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections open beyond pool_size (negative while the pool is still filling)",
+    ["pool"],
+    registry=registry
+)
+POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool size",
+    ["pool"],
+    registry=registry
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after pool_timeout because the pool was exhausted",
+    ["pool"],
+    registry=registry
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 12, 20, 50, 100),
+    registry=registry
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Total SQL execution time per request",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    registry=registry
+)
+
+
+class SQLStats:
+    """Statement count and execution time for one request"""
+    __slots__ = ("statements", "duration")
+    
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+
+
+# Set for the duration of a request. Threadpool workers and run_sync greenlets
+# run in a copy of the request's context, so they update the same object.
+request_sql_stats: ContextVar[Optional[SQLStats]] = ContextVar("request_sql_stats", default=None)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection"""
+    metrics_name = "default"
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool, InstrumentedQueuePool):
+    """Async variant of InstrumentedQueuePool for asyncpg engines"""
+
+
+# The start time lives on the statement's execution context, so a statement
+# that fails before after_cursor_execute leaves nothing behind on the connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_sql_stats.get() is not None and context is not None:
+        context._metrics_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_sql_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        started = getattr(context, "_metrics_query_start", None)
+        if started is not None:
+            stats.duration += time.perf_counter() - started
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Publish pool gauges for an engine and count its statements per request"""
+    engine.pool.metrics_name = name
+    
+    # Export the checkout series at zero before the first checkout
+    POOL_CHECKOUT_WAIT.labels(name)
+    POOL_CHECKOUT_TIMEOUTS.labels(name)
+    
+    # Read through the engine so a disposed and recreated pool is still reported
+    if isinstance(engine.pool, QueuePool):
+        POOL_CHECKED_OUT.labels(name).set_function(lambda: engine.pool.checkedout())
+        POOL_OVERFLOW.labels(name).set_function(lambda: engine.pool.overflow())
+        POOL_SIZE.labels(name).set_function(lambda: engine.pool.size())
+    
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route.
+    
+    Routes are labelled by their path template, so /accounts/{account_id}
+    is one series however many accounts are requested.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.route_paths: Dict[Callable[..., Any], str] = {}
+    
+    def route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        
+        path = self.route_paths.get(endpoint)
+        if path is None:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = self.route_paths[endpoint] = route.path
+                    break
+            else:
+                return "unmatched"
+        
+        return path
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        stats = SQLStats()
+        token = request_sql_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_sql_stats.reset(token)
+            
+            route = self.route_label(scope)
+            REQUEST_LATENCY.labels(scope["method"], route, str(status_code)).observe(elapsed)
+            REQUEST_SQL_STATEMENTS.labels(route).observe(stats.statements)
+            REQUEST_SQL_DURATION.labels(route).observe(stats.duration)
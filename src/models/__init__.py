@@ -1,5 +1,10 @@
 from .account import Account
 from .transaction import Transaction
 from .ledger_entry import LedgerEntry
+from .balance_snapshot import BalanceSnapshot
+from .idempotency_key import IdempotencyKey
+from .view_refresh import ViewRefresh
+from .daily_account_balance import daily_account_balances
+from .account_balance import account_balances
 
-__all__ = ["Account", "Transaction", "LedgerEntry"]
+__all__ = ["Account", "Transaction", "LedgerEntry", "BalanceSnapshot", "IdempotencyKey", "ViewRefresh", "daily_account_balances", "account_balances"]
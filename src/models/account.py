@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Enum, DateTime, text
+from sqlalchemy import Column, String, Enum, DateTime, Numeric, BigInteger, SmallInteger, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -18,6 +18,13 @@ class Account(Base):
     )
     currency = Column(String(3), nullable=False, default='USD')
     status = Column(String(20), nullable=False, default='active')
+    # Maintained with every posting when BALANCE_MODE is "materialized"
+    balance = Column(Numeric(precision=19, scale=4), nullable=False, default=0, server_default=text('0'))
+    entry_count = Column(BigInteger, nullable=False, default=0, server_default=text('0'))
+    # Hot accounts spread their postings over bucket_count bucket sub-accounts,
+    # which point back at them through parent_account_id
+    parent_account_id = Column(UUID(as_uuid=True), ForeignKey('accounts.id'), nullable=True, index=True)
+    bucket_count = Column(SmallInteger, nullable=False, default=0, server_default=text('0'))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True),
@@ -27,3 +34,8 @@ class Account(Base):
     
     def __repr__(self):
         return f"<Account(id={self.id}, user_id={self.user_id}, type={self.account_type})>"
+
+
+def bucket_account_id(account_id, bucket: int) -> uuid.UUID:
+    """Id of a hot account's bucket sub-account, derived so that finding it needs no query"""
+    return uuid.uuid5(uuid.UUID(str(account_id)), f"bucket-{bucket}")
@@ -0,0 +1,18 @@
+from sqlalchemy import Table, Column, String, Numeric, BigInteger, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+
+from models.daily_account_balance import view_metadata
+
+# Live per-account sums over ledger_entries, defined by migrations
+account_balances = Table(
+    "account_balances",
+    view_metadata,
+    Column("account_id", UUID(as_uuid=True), primary_key=True),
+    Column("user_id", String(255)),
+    Column("account_type", String(50)),
+    Column("currency", String(3)),
+    Column("status", String(20)),
+    Column("current_balance", Numeric(19, 4), nullable=False),
+    Column("total_entries", BigInteger, nullable=False),
+    Column("last_transaction_date", DateTime(timezone=True)),
+)
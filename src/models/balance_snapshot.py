@@ -0,0 +1,36 @@
+from sqlalchemy import Column, DateTime, Numeric, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+from database import Base
+
+
+class BalanceSnapshot(Base):
+    """Checkpointed account balance covering every ledger entry up to a position.
+
+    The position is the (created_at, id) of the last entry included, so the
+    current balance is the snapshot balance plus the entries ordered after it.
+    """
+    __tablename__ = "balance_snapshots"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey('accounts.id', ondelete='RESTRICT'),
+        nullable=False
+    )
+    as_of_entry_id = Column(UUID(as_uuid=True), nullable=False)
+    as_of_created_at = Column(DateTime(timezone=True), nullable=False)
+    balance = Column(Numeric(19, 4), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            'idx_balance_snapshots_account_position',
+            'account_id', 'as_of_created_at', 'as_of_entry_id'
+        ),
+    )
+
+    def __repr__(self):
+        return f"<BalanceSnapshot(account_id={self.account_id}, balance={self.balance}, as_of_entry={self.as_of_entry_id})>"
@@ -0,0 +1,15 @@
+from sqlalchemy import Table, Column, Date, Numeric, MetaData
+from sqlalchemy.dialects.postgresql import UUID
+
+# The materialized view is created and refreshed by migrations and jobs, so
+# it lives outside Base.metadata where create_all and autogenerate would
+# treat it as a table.
+view_metadata = MetaData()
+
+daily_account_balances = Table(
+    "daily_account_balances",
+    view_metadata,
+    Column("balance_date", Date, primary_key=True),
+    Column("account_id", UUID(as_uuid=True), primary_key=True),
+    Column("daily_balance", Numeric(19, 4), nullable=False),
+)
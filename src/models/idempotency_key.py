@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, DateTime, Integer, JSON, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+from database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    scope = Column(String(50), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    response_status = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('scope', 'key', name='unique_idempotency_scope_key'),
+        Index('idx_idempotency_keys_expires_at', 'expires_at'),
+    )
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(scope={self.scope}, key={self.key}, status={self.response_status})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey
+from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey, SmallInteger
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -8,9 +8,17 @@ from database import Base
 
 
 class LedgerEntry(Base):
+    """A single debit or credit leg of a transaction.
+
+    On PostgreSQL the table is range-partitioned by month of created_at, so
+    the table's primary key is (id, created_at); entries are still
+    identified by id alone in the session.
+    """
     __tablename__ = "ledger_entries"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # The client-side id lets both legs of a transfer go out in one INSERT
+    # even though created_at, part of the primary key, is server-generated
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, insert_sentinel=True)
     account_id = Column(
         UUID(as_uuid=True),
         ForeignKey('accounts.id', ondelete='RESTRICT'),
@@ -25,11 +33,18 @@ class LedgerEntry(Base):
     )
     entry_type = Column(String(10), nullable=False)
     amount = Column(Numeric(19, 4), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Position of the leg within its transaction, unique per transaction
+    leg_number = Column(SmallInteger, nullable=False, default=1, server_default='1')
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
+    
+    # Relationships. Loaded only when touched; queries that need them pick a
+    # strategy (selectinload) and list queries select plain columns instead
+    account = relationship("Account", lazy="select")
+    transaction = relationship("Transaction", lazy="select")
+    
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
-    # Relationships
-    account = relationship("Account", lazy="joined")
-    transaction = relationship("Transaction", lazy="joined")
+    __mapper_args__ = {"primary_key": [id]}
     
     def __repr__(self):
         return f"<LedgerEntry(id={self.id}, type={self.entry_type}, amount={self.amount})>"
@@ -19,5 +19,8 @@ class Transaction(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True))
     
+    # Fetch server defaults on flush so async callers never trigger a lazy refresh
+    __mapper_args__ = {"eager_defaults": True}
+    
     def __repr__(self):
         return f"<Transaction(id={self.id}, type={self.type}, amount={self.amount})>"
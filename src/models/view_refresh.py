@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime
+
+from database import Base
+
+
+class ViewRefresh(Base):
+    """When a materialized view was last refreshed.
+
+    refreshed_at is taken before the refresh starts, so the view contains
+    every row committed before that time.
+    """
+    __tablename__ = "view_refreshes"
+    
+    view_name = Column(String(100), primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<ViewRefresh(view_name={self.view_name}, refreshed_at={self.refreshed_at})>"
@@ -0,0 +1,267 @@
+import itertools
+import logging
+import re
+from contextvars import ContextVar
+from typing import AsyncGenerator, Generator, List, Optional
+
+from fastapi import Header, HTTPException, status
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+import database
+from config import settings
+from database import (
+    SessionLocal,
+    engine,
+    get_async_database_url,
+    get_async_sessionmaker,
+    get_engine_options,
+    get_session
+)
+from metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+replica_urls = [url.strip() for url in settings.REPLICA_DATABASE_URLS.split(',') if url.strip()]
+
+replica_engines = [create_engine(url, **get_engine_options(url)) for url in replica_urls]
+if settings.METRICS_ENABLED:
+    for index, replica_engine in enumerate(replica_engines):
+        instrument_engine(replica_engine, f"replica{index}")
+
+# Sessions marked read_only refuse money movement
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=replica_engine, info={'read_only': True})
+    for replica_engine in replica_engines
+]
+
+# Created on first use, as the primary async engine is
+AsyncReplicaSessionLocals: Optional[List[async_sessionmaker]] = None
+
+replica_counter = itertools.count()
+
+# A pg_lsn as printed by PostgreSQL, e.g. 16/B374D848
+LSN_PATTERN = re.compile(r'^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$')
+
+REPLAYED_LSN_QUERY = text("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)")
+
+
+class WriteState:
+    """Whether the current request has committed a transaction on the primary"""
+    __slots__ = ("committed",)
+    
+    def __init__(self):
+        self.committed = False
+
+
+# Set by WriteLSNMiddleware for each request. Threadpool workers and run_sync
+# greenlets run in a copy of the request's context and update the same object.
+request_write_state: ContextVar[Optional[WriteState]] = ContextVar("request_write_state", default=None)
+
+
+def replica_order() -> List[int]:
+    """Replica indexes to try for one read, starting from the next in round-robin order"""
+    start = next(replica_counter)
+    return [(start + offset) % len(replica_urls) for offset in range(len(replica_urls))]
+
+
+def validate_lsn_token(min_lsn: Optional[str]) -> None:
+    if min_lsn is not None and not LSN_PATTERN.match(min_lsn):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid X-Min-LSN token"
+        )
+
+
+def has_replayed(db: Session, min_lsn: str) -> bool:
+    """Check whether a replica has replayed the WAL up to a client's last write"""
+    try:
+        return bool(db.execute(REPLAYED_LSN_QUERY, {'lsn': min_lsn}).scalar())
+    except DBAPIError as e:
+        logger.warning("Skipping replica: %s", e.orig.__class__.__name__)
+        db.rollback()
+        return False
+
+
+def get_read_db(
+    min_lsn: Optional[str] = Header(None, alias="X-Min-LSN")
+) -> Generator[Session, None, None]:
+    """Session for read-only routes on the next replica, round-robin.
+    
+    With an X-Min-LSN token from an earlier write, replicas that have not
+    replayed that far are skipped, and the read falls back to the primary
+    if none has.
+    """
+    validate_lsn_token(min_lsn)
+    
+    db = None
+    for index in replica_order():
+        candidate = ReplicaSessionLocals[index]()
+        if min_lsn is None or has_replayed(candidate, min_lsn):
+            db = candidate
+            break
+        candidate.close()
+    
+    if db is None:
+        db = SessionLocal()
+    
+    try:
+        yield db
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Database error: %s", e)
+        raise
+    finally:
+        db.close()
+
+
+def get_async_replica_sessionmakers() -> List[async_sessionmaker]:
+    """Create the async replica engines and session factories on first use"""
+    global AsyncReplicaSessionLocals
+    
+    if AsyncReplicaSessionLocals is None:
+        sessionmakers = []
+        for index, url in enumerate(replica_urls):
+            async_url = get_async_database_url(url)
+            replica_engine = create_async_engine(async_url, **get_engine_options(async_url, async_driver=True))
+            if settings.METRICS_ENABLED:
+                instrument_engine(replica_engine.sync_engine, f"async_replica{index}")
+            sessionmakers.append(async_sessionmaker(
+                replica_engine,
+                autoflush=False,
+                expire_on_commit=False,
+                info={'read_only': True}
+            ))
+        AsyncReplicaSessionLocals = sessionmakers
+    
+    return AsyncReplicaSessionLocals
+
+
+async def get_async_read_db(
+    min_lsn: Optional[str] = Header(None, alias="X-Min-LSN")
+) -> AsyncGenerator[AsyncSession, None]:
+    """Async variant of get_read_db"""
+    validate_lsn_token(min_lsn)
+    
+    sessionmakers = get_async_replica_sessionmakers()
+    
+    db = None
+    for index in replica_order():
+        candidate = sessionmakers[index]()
+        if min_lsn is None or await candidate.run_sync(has_replayed, min_lsn):
+            db = candidate
+            break
+        await candidate.close()
+    
+    if db is None:
+        db = get_async_sessionmaker()()
+    
+    try:
+        yield db
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Database error: %s", e)
+        raise
+    finally:
+        await db.close()
+
+
+# Session dependency for read-only routes; the primary when no replicas are configured
+if not replica_urls:
+    get_read_session = get_session
+elif settings.DB_MODE == "async":
+    get_read_session = get_async_read_db
+else:
+    get_read_session = get_read_db
+
+
+def mark_wrote(session: Session, *args) -> None:
+    session.info['wrote'] = True
+
+
+def mark_statement_wrote(orm_execute_state) -> None:
+    # Core INSERT/UPDATE/DELETE run through the session skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_wrote(orm_execute_state.session)
+
+
+def forget_writes(session: Session) -> None:
+    session.info.pop('wrote', None)
+
+
+def mark_committed(session: Session) -> None:
+    state = request_write_state.get()
+    wrote = session.info.pop('wrote', False)
+    if wrote and state is not None and not session.info.get('read_only'):
+        state.committed = True
+
+
+def track_primary_writes(target=Session) -> None:
+    """Mark the request as having written when a session commits a transaction that wrote.
+    
+    Commits that only read, such as the commit ending every request's
+    session, leave the request on the replicas.
+    """
+    event.listen(target, "after_flush", mark_wrote)
+    event.listen(target, "do_orm_execute", mark_statement_wrote)
+    event.listen(target, "after_rollback", forget_writes)
+    event.listen(target, "after_commit", mark_committed)
+
+
+if replica_urls:
+    track_primary_writes()
+
+
+async def get_primary_wal_lsn() -> str:
+    """Current WAL position on the primary, at or after every commit so far"""
+    statement = select(func.pg_current_wal_lsn())
+    
+    if settings.DB_MODE == "async":
+        get_async_sessionmaker()
+        async with database.async_engine.connect() as connection:
+            return (await connection.execute(statement)).scalar()
+    
+    def fetch() -> str:
+        with engine.connect() as connection:
+            return connection.execute(statement).scalar()
+    
+    return await run_in_threadpool(fetch)
+
+
+class WriteLSNMiddleware:
+    """ASGI middleware returning a read-your-writes token after writes.
+    
+    Responses to requests that committed on the primary carry the primary's
+    WAL position in X-Last-Write-LSN. Clients that need to see their write
+    send it back as X-Min-LSN on later reads.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        state = WriteState()
+        
+        async def send_with_lsn(message):
+            if message["type"] == "http.response.start" and state.committed:
+                try:
+                    lsn = await get_primary_wal_lsn()
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-last-write-lsn", lsn.encode())]
+                except Exception as e:
+                    logger.warning("Could not read the primary WAL position: %s", e)
+            await send(message)
+        
+        token = request_write_state.set(state)
+        try:
+            await self.app(scope, receive, send_with_lsn)
+        finally:
+            request_write_state.reset(token)
@@ -1,5 +1,15 @@
 from .account_service import AccountService
 from .transaction_service import TransactionService
 from .ledger_service import LedgerService
+from .idempotency_service import IdempotencyService
+from .async_services import AsyncAccountService, AsyncTransactionService, AsyncLedgerService
 
-__all__ = ["AccountService", "TransactionService", "LedgerService"]
+__all__ = [
+    "AccountService",
+    "TransactionService",
+    "LedgerService",
+    "IdempotencyService",
+    "AsyncAccountService",
+    "AsyncTransactionService",
+    "AsyncLedgerService",
+]
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import get_engine_options
+
+logger = logging.getLogger(__name__)
+
+# Channel notified by the accounts trigger with the id of a changed account
+ACCOUNT_CHANGES_CHANNEL = 'account_changes'
+
+# Seconds to wait before reconnecting a dropped listener
+LISTENER_RETRY_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class CachedAccount:
+    """Account attributes safe to serve from a cache.
+    
+    Currency, type and owner never change. Status can, so it is only good
+    for early rejection; money movement re-checks it under the row lock.
+    """
+    id: Any
+    user_id: str
+    account_type: str
+    currency: str
+    status: str
+    # Grows but never shrinks, so a stale count only means fewer buckets are used
+    bucket_count: int = 0
+
+
+class AccountCache:
+    """Bounded LRU of account attributes whose entries also expire after a TTL"""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Tuple[float, CachedAccount]]" = OrderedDict()
+        # Bumped by every invalidation, so a load that raced one is not stored
+        self.generation = 0
+        self.lock = threading.Lock()
+    
+    def get(self, account_id: str) -> Optional[CachedAccount]:
+        with self.lock:
+            entry = self.entries.get(account_id)
+            if entry is None:
+                return None
+            
+            expires_at, account = entry
+            if expires_at <= time.monotonic():
+                del self.entries[account_id]
+                return None
+            
+            self.entries.move_to_end(account_id)
+            return account
+    
+    def put(self, account_id: str, account: CachedAccount, generation: int) -> None:
+        """Store an account loaded while the cache was at the given generation"""
+        if self.max_size <= 0:
+            return
+        
+        with self.lock:
+            if generation != self.generation:
+                return
+            
+            self.entries[account_id] = (time.monotonic() + self.ttl_seconds, account)
+            self.entries.move_to_end(account_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, account_id: str) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(account_id, None)
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+account_cache = AccountCache(settings.ACCOUNT_CACHE_SIZE, settings.ACCOUNT_CACHE_TTL_SECONDS)
+
+
+def connect_listener(engine: Engine):
+    """Open a dedicated autocommit connection listening for account changes.
+    
+    It is kept outside the pool because LISTEN holds it for the life of the
+    process.
+    """
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    # Keepalives notice a dead server, which would otherwise leave LISTEN silently idle
+    cparams.update(get_engine_options(engine.url.render_as_string(hide_password=False)).get('connect_args', {}))
+    connection = engine.dialect.connect(*cargs, **cparams)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {ACCOUNT_CHANGES_CHANNEL}")
+    return connection
+
+
+async def listen_for_account_changes(engine: Engine) -> None:
+    """Invalidate cached accounts changed by any worker, as the database reports them.
+    
+    Notifications sent while the listener is disconnected are lost, so the
+    whole cache is cleared each time it (re)connects.
+    """
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        connection = None
+        try:
+            connection = await run_in_threadpool(connect_listener, engine)
+            account_cache.clear()
+            
+            readable = asyncio.Event()
+            fileno = connection.fileno()
+            loop.add_reader(fileno, readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    
+                    connection.poll()
+                    while connection.notifies:
+                        account_cache.invalidate(connection.notifies.pop(0).payload)
+            finally:
+                loop.remove_reader(fileno)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Account cache listener failed: %s", e)
+            account_cache.clear()
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+        finally:
+            if connection is not None:
+                connection.close()
@@ -5,11 +5,15 @@ from sqlalchemy import or_, and_
 import uuid
 import logging
 
-from models.account import Account
+from models.account import Account, bucket_account_id
+from services.account_cache import CachedAccount, account_cache
 from services.ledger_service import LedgerService
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on the buckets of one hot account
+MAX_ACCOUNT_BUCKETS = 256
+
 
 class AccountService:
     @staticmethod
@@ -40,23 +44,157 @@ class AccountService:
             db.add(account)
             db.flush()
             
-            logger.info(f"Created account {account.id} for user {user_id}")
+            logger.info("Created account", extra={"account_id": account.id, "user_id": user_id})
             
             return account
             
         except Exception as e:
-            logger.error(f"Error creating account: {e}")
+            logger.error("Error creating account: %s", e)
             raise
     
     @staticmethod
     def get_account(db: Session, account_id: str) -> Optional[Account]:
         """Get account by ID"""
         try:
-            return db.query(Account).filter(Account.id == account_id).first()
+            # Ids arrive as strings from routes; the UUID column only binds uuid.UUID values everywhere
+            return db.query(Account).filter(Account.id == uuid.UUID(str(account_id))).first()
         except Exception as e:
-            logger.error(f"Error getting account {account_id}: {e}")
+            logger.error("Error getting account %s: %s", account_id, e)
             return None
     
+    @staticmethod
+    def get_account_info(db: Session, account_id: str) -> Optional[CachedAccount]:
+        """Get an account's attributes from the in-process cache, loading them on a miss.
+        
+        Status may be up to ACCOUNT_CACHE_TTL_SECONDS stale if an invalidation
+        is missed, so it must not be the final check before moving money.
+        """
+        key = str(uuid.UUID(str(account_id)))
+        
+        cached = account_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        generation = account_cache.generation
+        account = AccountService.get_account(db, account_id)
+        if not account:
+            return None
+        
+        return AccountService.cache_account(account, generation)
+    
+    @staticmethod
+    def cache_account(account: Account, generation: int) -> CachedAccount:
+        """Store an account loaded while the cache was at the given generation"""
+        cached = CachedAccount(
+            id=account.id,
+            user_id=account.user_id,
+            account_type=account.account_type,
+            currency=account.currency,
+            status=account.status,
+            bucket_count=account.bucket_count or 0
+        )
+        account_cache.put(str(account.id), cached, generation)
+        
+        return cached
+    
+    @staticmethod
+    def get_accounts(
+        db: Session,
+        account_ids: List[str],
+        for_update: bool = False
+    ) -> Dict[Any, Account]:
+        """Get accounts by ID in one query, optionally locking them in ID order"""
+        if not account_ids:
+            return {}
+        
+        account_ids = sorted({uuid.UUID(str(account_id)) for account_id in account_ids})
+        generation = account_cache.generation
+        
+        try:
+            query = db.query(Account)\
+                .filter(Account.id.in_(account_ids))\
+                .order_by(Account.id)
+            
+            # Locking in a fixed order keeps concurrent lockers from deadlocking
+            if for_update:
+                query = query.with_for_update().populate_existing()
+            
+            accounts = {account.id: account for account in query.all()}
+        except Exception as e:
+            logger.error("Error getting %s accounts: %s", len(account_ids), e)
+            raise
+        
+        # Rows read under lock are current; this is how transfers learn that an account is hot
+        if for_update:
+            for account in accounts.values():
+                AccountService.cache_account(account, generation)
+        
+        return accounts
+    
+    @staticmethod
+    def get_credit_account_id(account_id: str, posting_id: uuid.UUID) -> uuid.UUID:
+        """The account a credit to account_id should be posted to.
+        
+        Credits to a hot account go to one of its buckets, picked by hashing
+        the posting's id, so concurrent credits lock different rows. Only the
+        cache is consulted; on a miss the credit goes to the account itself,
+        which is also correct, and locking it caches its bucket count.
+        """
+        key = uuid.UUID(str(account_id))
+        
+        cached = account_cache.get(str(key))
+        if cached is None or not cached.bucket_count:
+            return key
+        
+        return bucket_account_id(key, posting_id.int % cached.bucket_count)
+    
+    @staticmethod
+    def split_account(db: Session, account_id: str, bucket_count: int) -> Account:
+        """Make an account hot by spreading its postings over bucket sub-accounts.
+        
+        Buckets copy the account's owner, type, currency and status. The
+        count can only grow, since existing buckets hold funds. The account
+        keeps its own balance, which debits draw on along with the buckets.
+        """
+        if not 1 <= bucket_count <= MAX_ACCOUNT_BUCKETS:
+            raise ValueError(f"Bucket count must be between 1 and {MAX_ACCOUNT_BUCKETS}")
+        
+        try:
+            account = AccountService.get_accounts(db, [account_id], for_update=True).get(uuid.UUID(str(account_id)))
+            
+            if not account:
+                raise ValueError("Account does not exist")
+            
+            if account.parent_account_id:
+                raise ValueError("A bucket account cannot be split")
+            
+            if bucket_count < account.bucket_count:
+                raise ValueError(f"Bucket count cannot be reduced from {account.bucket_count}")
+            
+            db.add_all(
+                Account(
+                    id=bucket_account_id(account.id, bucket),
+                    user_id=account.user_id,
+                    account_type=account.account_type,
+                    currency=account.currency,
+                    status=account.status,
+                    parent_account_id=account.id
+                )
+                for bucket in range(account.bucket_count, bucket_count)
+            )
+            account.bucket_count = bucket_count
+            db.flush()
+            
+            # Other workers are notified by the accounts trigger
+            account_cache.invalidate(str(account.id))
+            
+            logger.info("Split account %s into %s buckets", account.id, bucket_count)
+            
+            return account
+        except Exception as e:
+            logger.error("Error splitting account %s: %s", account_id, e)
+            raise
+    
     @staticmethod
     def get_account_with_balance(db: Session, account_id: str) -> Optional[Dict[str, Any]]:
         """Get account details with calculated balance"""
@@ -66,7 +204,7 @@ class AccountService:
             if not account:
                 return None
             
-            balance = LedgerService.calculate_balance(db, account_id)
+            balance = LedgerService.calculate_balance(db, account.id, bucket_count=account.bucket_count)
             
             return {
                 'id': str(account.id),
@@ -80,18 +218,24 @@ class AccountService:
                 'updated_at': account.updated_at.isoformat() if account.updated_at else None
             }
         except Exception as e:
-            logger.error(f"Error getting account with balance {account_id}: {e}")
+            logger.error("Error getting account with balance %s: %s", account_id, e)
             return None
     
     @staticmethod
     def get_user_accounts(db: Session, user_id: str) -> List[Dict[str, Any]]:
         """Get all accounts for a user with balances"""
         try:
-            accounts = db.query(Account).filter(Account.user_id == user_id).all()
+            # Buckets share their hot account's owner but are listed as part of it
+            accounts = db.query(Account)\
+                .filter(Account.user_id == user_id, Account.parent_account_id.is_(None))\
+                .all()
+            balances = LedgerService.calculate_account_balances(
+                db, {account.id: account.bucket_count for account in accounts}
+            )
             
             result = []
             for account in accounts:
-                balance = LedgerService.calculate_balance(db, account.id)
+                balance = balances.get(account.id, Decimal(0))
                 
                 result.append({
                     'id': str(account.id),
@@ -107,7 +251,7 @@ class AccountService:
             
             return result
         except Exception as e:
-            logger.error(f"Error getting user accounts for {user_id}: {e}")
+            logger.error("Error getting user accounts for %s: %s", user_id, e)
             return []
     
     @staticmethod
@@ -128,23 +272,33 @@ class AccountService:
                 return None
             
             account.status = status
+            
+            # Credits to a hot account check the status of the bucket they lock
+            if account.bucket_count:
+                db.query(Account)\
+                    .filter(Account.parent_account_id == account.id)\
+                    .update({Account.status: status}, synchronize_session=False)
+            
             db.commit()
             
-            logger.info(f"Updated account {account_id} status to {status}")
+            # Other workers are notified by the accounts trigger
+            account_cache.invalidate(str(account.id))
+            
+            logger.info("Updated account %s status to %s", account_id, status)
             
             return account
         except Exception as e:
-            logger.error(f"Error updating account status for {account_id}: {e}")
+            logger.error("Error updating account status for %s: %s", account_id, e)
             return None
     
     @staticmethod
     def validate_account_currency(db: Session, account_id: str, currency: str) -> bool:
         """Validate that account currency matches expected currency"""
         try:
-            account = AccountService.get_account(db, account_id)
+            account = AccountService.get_account_info(db, account_id)
             if not account:
                 return False
             return account.currency == currency.upper()
         except Exception as e:
-            logger.error(f"Error validating account currency: {e}")
+            logger.error("Error validating account currency: %s", e)
             return False
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar, Union
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from config import settings
+from database import retry_backoff
+from models.account import Account
+from services.account_service import AccountService
+from services.ledger_service import LedgerService, LEDGER_EXPORT_COLUMNS
+from services.transaction_service import TransactionService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+async def run_sync_service(db: Union[Session, AsyncSession], operation: Callable[[Session], T]) -> T:
+    """Run sync service code against either session type from async code.
+    
+    An AsyncSession runs the operation through run_sync on asyncpg, on the
+    event loop thread, yielding to other tasks only while it waits on the
+    database; a plain Session runs it in the threadpool, as FastAPI does
+    for sync routes.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(operation)
+    return await run_in_threadpool(operation, db)
+
+
+def async_service_method(method: Callable[..., T]) -> Callable[..., Any]:
+    """Wrap a sync service staticmethod as an awaitable taking the same arguments"""
+    async def call(db: Union[Session, AsyncSession], *args, **kwargs) -> T:
+        return await run_sync_service(db, lambda session: method(session, *args, **kwargs))
+    
+    call.__name__ = method.__name__
+    call.__doc__ = method.__doc__
+    return staticmethod(call)
+
+
+class AsyncAccountService:
+    create_account = async_service_method(AccountService.create_account)
+    get_account = async_service_method(AccountService.get_account)
+    get_account_info = async_service_method(AccountService.get_account_info)
+    get_accounts = async_service_method(AccountService.get_accounts)
+    get_account_with_balance = async_service_method(AccountService.get_account_with_balance)
+    get_user_accounts = async_service_method(AccountService.get_user_accounts)
+    split_account = async_service_method(AccountService.split_account)
+    update_account_status = async_service_method(AccountService.update_account_status)
+    validate_account_currency = async_service_method(AccountService.validate_account_currency)
+
+
+class AsyncLedgerService:
+    calculate_balance = async_service_method(LedgerService.calculate_balance)
+    calculate_balances = async_service_method(LedgerService.calculate_balances)
+    calculate_account_balances = async_service_method(LedgerService.calculate_account_balances)
+    calculate_balance_as_of = async_service_method(LedgerService.calculate_balance_as_of)
+    calculate_balances_as_of = async_service_method(LedgerService.calculate_balances_as_of)
+    get_latest_snapshot = async_service_method(LedgerService.get_latest_snapshot)
+    create_balance_snapshot = async_service_method(LedgerService.create_balance_snapshot)
+    get_account_ledger = async_service_method(LedgerService.get_account_ledger)
+    get_account_ledger_page = async_service_method(LedgerService.get_account_ledger_page)
+    create_ledger_entries = async_service_method(LedgerService.create_ledger_entries)
+    post_journal = async_service_method(LedgerService.post_journal)
+    verify_double_entry = async_service_method(LedgerService.verify_double_entry)
+    
+    @staticmethod
+    async def stream_ledger_export(
+        db: Union[Session, AsyncSession],
+        account_id: str,
+        export_format: str = 'csv',
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        bucket_count: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Stream a ledger export from the engine behind either session type.
+        
+        On asyncpg the rows come from AsyncConnection.stream; a sync engine's
+        generator is advanced in the threadpool one batch at a time.
+        """
+        if not isinstance(db, AsyncSession):
+            chunks = LedgerService.stream_ledger_export(
+                db.get_bind(), account_id, export_format, start, end, batch_size, bucket_count
+            )
+            async for chunk in iterate_in_threadpool(chunks):
+                yield chunk
+            return
+        
+        if export_format == 'csv':
+            yield ','.join(LEDGER_EXPORT_COLUMNS) + '\n'
+        
+        async with db.bind.connect() as connection:
+            if bucket_count is None:
+                bucket_count = (await connection.execute(
+                    select(Account.bucket_count).where(Account.id == uuid.UUID(str(account_id)))
+                )).scalar() or 0
+            
+            statement = LedgerService.ledger_export_statement(account_id, start, end, bucket_count)\
+                .execution_options(yield_per=batch_size)
+            result = await connection.stream(statement)
+            async for rows in result.partitions():
+                yield LedgerService.format_ledger_export(rows, export_format)
+
+
+class AsyncTransactionService:
+    create_transaction = async_service_method(TransactionService.create_transaction)
+    execute_transfer = async_service_method(TransactionService.execute_transfer)
+    execute_transfers_batch = async_service_method(TransactionService.execute_transfers_batch)
+    execute_journal = async_service_method(TransactionService.execute_journal)
+    execute_deposit = async_service_method(TransactionService.execute_deposit)
+    execute_withdrawal = async_service_method(TransactionService.execute_withdrawal)
+    get_transaction = async_service_method(TransactionService.get_transaction)
+    
+    @staticmethod
+    async def run_with_retry(
+        db: Union[Session, AsyncSession],
+        operation: Callable[[Session], T],
+        max_attempts: Optional[int] = None
+    ) -> T:
+        """Run and commit a unit of service work, retrying serialization failures and deadlocks.
+        
+        The retry policy is database.retry_backoff, as for run_with_retry,
+        but only the operation and its commit go through run_sync_service;
+        the rollback and the backoff between attempts are awaited, so a
+        retrying request does not hold up the others.
+        """
+        max_attempts = max_attempts or settings.DB_RETRY_ATTEMPTS
+        
+        def attempt_operation(session: Session) -> T:
+            result = operation(session)
+            session.commit()
+            return result
+        
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return await run_sync_service(db, attempt_operation)
+            except DBAPIError as e:
+                if isinstance(db, AsyncSession):
+                    await db.rollback()
+                else:
+                    await run_in_threadpool(db.rollback)
+                delay = retry_backoff(e, attempt, max_attempts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
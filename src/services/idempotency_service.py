@@ -0,0 +1,108 @@
+from typing import Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+import hashlib
+import json
+import uuid
+import logging
+
+from config import settings
+from models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    @staticmethod
+    def request_hash(payload: Dict[str, Any]) -> str:
+        """Fingerprint a request body so a reused key with a different request is detected"""
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @staticmethod
+    def claim(
+        db: Session,
+        scope: str,
+        key: str,
+        request_hash: str
+    ) -> Optional[IdempotencyKey]:
+        """Claim a key for this request, or return the stored record of an earlier one.
+
+        The key row is inserted in the caller's transaction, so a concurrent
+        request with the same key blocks on the unique index until this one
+        commits (and then replays its response) or rolls back (and then
+        claims the key itself). Expired keys are reclaimed in place.
+        """
+        now = datetime.now(timezone.utc)
+        dialect = postgresql if db.get_bind().dialect.name == 'postgresql' else sqlite
+
+        statement = dialect.insert(IdempotencyKey).values(
+            id=uuid.uuid4(),
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['scope', 'key'],
+            set_={
+                'request_hash': statement.excluded.request_hash,
+                'response_status': None,
+                'response_body': None,
+                'created_at': now,
+                'expires_at': statement.excluded.expires_at
+            },
+            where=IdempotencyKey.expires_at < now
+        )
+
+        if db.execute(statement).rowcount == 1:
+            return None
+
+        stored = db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key)\
+            .populate_existing()\
+            .one()
+
+        if stored.request_hash != request_hash:
+            raise ValueError("Idempotency-Key has already been used with a different request")
+
+        logger.info("Replaying stored response for idempotency key %s (%s)", key, scope)
+
+        return stored
+
+    @staticmethod
+    def complete(
+        db: Session,
+        scope: str,
+        key: str,
+        response_status: int,
+        response_body: Dict[str, Any]
+    ) -> None:
+        """Store the response for a claimed key in the caller's transaction"""
+        db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key)\
+            .update(
+                {'response_status': response_status, 'response_body': response_body},
+                synchronize_session=False
+            )
+
+    @staticmethod
+    def purge_expired(db: Session, batch_size: int = 10000) -> int:
+        """Delete one batch of expired keys and return how many were removed"""
+        try:
+            expired_ids = db.query(IdempotencyKey.id)\
+                .filter(IdempotencyKey.expires_at < datetime.now(timezone.utc))\
+                .limit(batch_size)\
+                .subquery()
+
+            deleted = db.query(IdempotencyKey)\
+                .filter(IdempotencyKey.id.in_(expired_ids.select()))\
+                .delete(synchronize_session=False)
+
+            logger.info("Purged %s expired idempotency keys", deleted)
+
+            return deleted
+        except Exception as e:
+            logger.error("Error purging idempotency keys: %s", e)
+            raise
@@ -1,53 +1,759 @@
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any, Iterable, Iterator, Sequence
 from decimal import Decimal
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from datetime import datetime, time, timedelta, timezone
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.sql import Select
+from sqlalchemy import func, and_, or_, case, select, text, update
+import base64
+import csv
+import io
+import json
+import uuid
 import logging
 
+from config import settings
 from models.ledger_entry import LedgerEntry
-from models.account import Account
+from models.account import Account, bucket_account_id
+from models.balance_snapshot import BalanceSnapshot
+from models.view_refresh import ViewRefresh
+from models.daily_account_balance import daily_account_balances
+from models.account_balance import account_balances
 
 logger = logging.getLogger(__name__)
 
+LEDGER_EXPORT_FORMATS = ('csv', 'ndjson')
+LEDGER_EXPORT_COLUMNS = ('id', 'transaction_id', 'entry_type', 'amount', 'created_at')
+LEDGER_PAGE_COLUMNS = ('id', 'account_id', 'transaction_id', 'entry_type', 'amount', 'leg_number', 'created_at')
+
+# Credits increase and debits decrease an account balance
+signed_amount = case(
+    (LedgerEntry.entry_type == 'credit', LedgerEntry.amount),
+    (LedgerEntry.entry_type == 'debit', -LedgerEntry.amount),
+    else_=0
+)
+
+
+def entries_after(created_at, entry_id):
+    """Filter for ledger entries ordered after the (created_at, id) position"""
+    return or_(
+        LedgerEntry.created_at > created_at,
+        and_(LedgerEntry.created_at == created_at, LedgerEntry.id > entry_id)
+    )
+
+
+def entries_before(created_at, entry_id):
+    """Filter for ledger entries ordered before the (created_at, id) position.
+    
+    The leading created_at bound is redundant with the OR but lets the
+    planner use it as an index condition on (account_id, created_at).
+    """
+    return and_(
+        LedgerEntry.created_at <= created_at,
+        or_(
+            LedgerEntry.created_at < created_at,
+            and_(LedgerEntry.created_at == created_at, LedgerEntry.id < entry_id)
+        )
+    )
+
+
+def account_entries(account_id, bucket_count: int):
+    """Filter for an account's ledger entries, with those posted to a hot account's buckets"""
+    account_id = uuid.UUID(str(account_id))
+    if not bucket_count:
+        return LedgerEntry.account_id == account_id
+    return LedgerEntry.account_id.in_(
+        [account_id] + [bucket_account_id(account_id, bucket) for bucket in range(bucket_count)]
+    )
+
+
+def latest_snapshots(db: Session, account_ids: Optional[List[Any]] = None):
+    """CTE of each account's latest balance snapshot, for some accounts or all of them"""
+    latest = db.query(
+        BalanceSnapshot.account_id,
+        BalanceSnapshot.balance,
+        BalanceSnapshot.as_of_created_at,
+        BalanceSnapshot.as_of_entry_id,
+        func.row_number().over(
+            partition_by=BalanceSnapshot.account_id,
+            order_by=(BalanceSnapshot.as_of_created_at.desc(), BalanceSnapshot.as_of_entry_id.desc())
+        ).label('position')
+    )
+    
+    if account_ids is not None:
+        latest = latest.filter(BalanceSnapshot.account_id.in_(account_ids))
+    
+    latest = latest.subquery()
+    return db.query(latest).filter(latest.c.position == 1).cte('latest_snapshots')
+
 
 class LedgerService:
     @staticmethod
-    def calculate_balance(db: Session, account_id: str) -> Decimal:
-        """Calculate current balance by summing ledger entries"""
+    def calculate_balance(db: Session, account_id: str, bucket_count: Optional[int] = None) -> Decimal:
+        """Calculate current balance from the latest snapshot plus the entries posted after it.
+        
+        A hot account's balance includes its buckets. Callers that already
+        hold the account pass its bucket_count; otherwise it is looked up.
+        """
+        if bucket_count is None:
+            bucket_count = LedgerService.get_bucket_count(db, account_id)
+        
+        account_id = uuid.UUID(str(account_id))
+        balances = LedgerService.calculate_account_balances(db, {account_id: bucket_count})
+        return balances.get(account_id, Decimal(0))
+    
+    @staticmethod
+    def get_bucket_count(db: Session, account_id: str) -> int:
+        """Number of buckets a hot account is split into, 0 for other accounts"""
+        return db.query(Account.bucket_count).filter(Account.id == uuid.UUID(str(account_id))).scalar() or 0
+    
+    @staticmethod
+    def calculate_account_balances(db: Session, bucket_counts: Dict[Any, int]) -> Dict[Any, Decimal]:
+        """Calculate current balances of accounts, each summed with its buckets' balances.
+        
+        bucket_counts maps each account id to its bucket count. Bucket ids
+        are derived from it, so the buckets cost no extra query.
+        """
+        owners = {}
+        for account_id, bucket_count in bucket_counts.items():
+            owners[account_id] = account_id
+            for bucket in range(bucket_count or 0):
+                owners[bucket_account_id(account_id, bucket)] = account_id
+        
+        balances: Dict[Any, Decimal] = {}
+        for account_id, balance in LedgerService.calculate_balances(db, list(owners)).items():
+            owner = owners[account_id]
+            balances[owner] = balances.get(owner, Decimal(0)) + balance
+        
+        return balances
+    
+    @staticmethod
+    def allocate_debit(balances: Dict[Any, Decimal], amount: Decimal) -> List[Tuple[Any, Decimal]]:
+        """Split a debit from a hot account over its buckets' balances.
+        
+        The fullest buckets are drawn on first, which keeps the buckets level
+        and takes the whole amount from one bucket whenever one can cover it.
+        Returns (account_id, amount) pairs summing to amount.
+        """
+        available = sum((balance for balance in balances.values() if balance > 0), Decimal(0))
+        if available < amount:
+            raise ValueError(f"Insufficient funds. Available: {available}, Required: {amount}")
+        
+        debits = []
+        remaining = amount
+        for account_id, balance in sorted(balances.items(), key=lambda item: item[1], reverse=True):
+            if remaining <= 0:
+                break
+            debit = min(balance, remaining)
+            debits.append((account_id, debit))
+            remaining -= debit
+        
+        return debits
+    
+    @staticmethod
+    def calculate_balances(db: Session, account_ids: List[str]) -> Dict[Any, Decimal]:
+        """Calculate current balances for many accounts with a single grouped query.
+        
+        Returns a mapping of account id to balance; accounts without snapshots
+        or entries are omitted and should be treated as a zero balance. Only
+        reads: snapshots are written by the create_balance_snapshots job.
+        """
+        if not account_ids:
+            return {}
+        
+        if settings.BALANCE_MODE == "materialized":
+            return LedgerService.get_materialized_balances(db, account_ids)
+        
+        try:
+            snapshots = latest_snapshots(db, account_ids)
+            
+            heads = db.query(
+                snapshots.c.account_id.label('account_id'),
+                snapshots.c.balance.label('amount')
+            )
+            
+            tails = db.query(
+                LedgerEntry.account_id.label('account_id'),
+                signed_amount.label('amount')
+            ).outerjoin(snapshots, snapshots.c.account_id == LedgerEntry.account_id)\
+                .filter(LedgerEntry.account_id.in_(account_ids))\
+                .filter(or_(
+                    snapshots.c.account_id.is_(None),
+                    entries_after(snapshots.c.as_of_created_at, snapshots.c.as_of_entry_id)
+                ))
+            
+            combined = heads.union_all(tails).subquery()
+            
+            rows = db.query(combined.c.account_id, func.sum(combined.c.amount))\
+                .group_by(combined.c.account_id)\
+                .all()
+        except Exception as e:
+            logger.error("Error calculating balances for %s accounts: %s", len(account_ids), e)
+            return {}
+        
+        return {account_id: Decimal(balance or 0) for account_id, balance in rows}
+    
+    @staticmethod
+    def get_materialized_balances(db: Session, account_ids: List[str]) -> Dict[Any, Decimal]:
+        """Read balances from accounts.balance, maintained by every posting in materialized mode"""
+        try:
+            rows = db.query(Account.id, Account.balance)\
+                .filter(Account.id.in_(account_ids))\
+                .all()
+        except Exception as e:
+            logger.error("Error reading materialized balances for %s accounts: %s", len(account_ids), e)
+            return {}
+        
+        return {account_id: Decimal(balance) for account_id, balance in rows}
+    
+    @staticmethod
+    def apply_balance_delta(
+        db: Session,
+        account_id: Any,
+        delta: Decimal,
+        entries: int = 1,
+        require_funds: bool = False
+    ) -> Optional[Decimal]:
+        """Add a posting to an account's materialized balance with one UPDATE ... RETURNING.
+        
+        With require_funds the update only matches while the balance covers a
+        negative delta, so the sufficient-funds check and the debit are one
+        atomic statement. Returns the new balance, or None if nothing matched.
+        """
+        statement = update(Account)\
+            .where(Account.id == account_id)\
+            .values(
+                balance=Account.balance + delta,
+                entry_count=Account.entry_count + entries,
+                # A posting is not a change to the account itself
+                updated_at=Account.updated_at
+            )\
+            .returning(Account.balance)\
+            .execution_options(synchronize_session=False)
+        
+        if require_funds:
+            statement = statement.where(Account.balance + delta >= 0)
+        
+        return db.execute(statement).scalar()
+    
+    @staticmethod
+    def apply_balance_deltas(
+        db: Session,
+        postings: Iterable[Tuple[Any, str, Decimal]],
+        require_funds: bool = False
+    ) -> None:
+        """Add each account's net (account_id, entry_type, amount) postings to its materialized balance.
+        
+        One UPDATE per account, in account id order to match the FOR UPDATE
+        lock order, so concurrent postings cannot deadlock. With require_funds
+        an account whose postings net to a debit must cover it.
+        """
+        deltas: Dict[Any, Tuple[Decimal, int]] = {}
+        for account_id, entry_type, amount in postings:
+            signed = amount if entry_type == 'credit' else -amount
+            delta, count = deltas.get(account_id, (Decimal(0), 0))
+            deltas[account_id] = (delta + signed, count + 1)
+        
+        for account_id in sorted(deltas, key=lambda account_id: uuid.UUID(str(account_id))):
+            delta, count = deltas[account_id]
+            guarded = require_funds and delta < 0
+            if LedgerService.apply_balance_delta(db, account_id, delta, entries=count, require_funds=guarded) is None:
+                raise ValueError(f"Insufficient funds in account {account_id}. Required: {-delta}")
+    
+    @staticmethod
+    def verify_materialized_balances(db: Session) -> int:
+        """Compare accounts.balance and entry_count with the account_balances view sums.
+        
+        Both sides are read in one statement, so postings committed while it
+        runs cannot show up as mismatches. Returns the number of mismatched
+        accounts, each of which is logged.
+        """
+        try:
+            mismatches = db.execute(
+                select(
+                    Account.id,
+                    Account.balance,
+                    Account.entry_count,
+                    account_balances.c.current_balance,
+                    account_balances.c.total_entries
+                ).join(account_balances, account_balances.c.account_id == Account.id)
+                .where(or_(
+                    Account.balance != account_balances.c.current_balance,
+                    Account.entry_count != account_balances.c.total_entries
+                ))
+            ).all()
+        except Exception as e:
+            logger.error("Error verifying materialized balances: %s", e)
+            raise
+        
+        for account_id, balance, entry_count, ledger_balance, ledger_entries in mismatches:
+            logger.error(
+                "Materialized balance mismatch for account %s: stored %s over %s entries, ledger %s over %s entries",
+                account_id, balance, entry_count, ledger_balance, ledger_entries
+            )
+        
+        logger.info("Verified materialized balances: %s mismatched accounts", len(mismatches))
+        
+        return len(mismatches)
+    
+    @staticmethod
+    def rebuild_materialized_balances(db: Session) -> int:
+        """Recompute accounts.balance and entry_count from the ledger.
+        
+        Holds an EXCLUSIVE lock on accounts until the caller commits, which
+        blocks postings (they lock or update account rows) but not reads, so
+        no posting can land between the sums and the update.
+        """
+        try:
+            db.execute(text("LOCK TABLE accounts IN EXCLUSIVE MODE"))
+            
+            rebuilt = db.execute(
+                update(Account)
+                .where(Account.id == account_balances.c.account_id)
+                .values(
+                    balance=account_balances.c.current_balance,
+                    entry_count=account_balances.c.total_entries,
+                    updated_at=Account.updated_at
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            
+            logger.info("Rebuilt materialized balances for %s accounts", rebuilt)
+            
+            return rebuilt
+        except Exception as e:
+            logger.error("Error rebuilding materialized balances: %s", e)
+            raise
+    
+    @staticmethod
+    def calculate_balance_as_of(
+        db: Session,
+        account_id: str,
+        as_of: datetime,
+        bucket_count: Optional[int] = None
+    ) -> Decimal:
+        """Calculate an account's balance at a point in time, including a hot account's buckets"""
+        if bucket_count is None:
+            bucket_count = LedgerService.get_bucket_count(db, account_id)
+        
+        account_ids = [account_id] + [bucket_account_id(account_id, bucket) for bucket in range(bucket_count)]
+        balances = LedgerService.calculate_balances_as_of(db, account_ids, as_of)
+        return sum(balances.values(), Decimal(0))
+    
+    @staticmethod
+    def calculate_balances_as_of(
+        db: Session,
+        account_ids: Optional[List[Any]],
+        as_of: datetime
+    ) -> Dict[Any, Decimal]:
+        """Calculate balances at a point in time for many accounts, or all when account_ids is None.
+        
+        Whole days covered by the last daily_account_balances refresh are
+        summed from the daily rollups; only entries from the first uncovered
+        day (or the day of as_of) up to as_of are read from the ledger.
+        Days within BALANCE_SNAPSHOT_SETTLE_SECONDS of the refresh are
+        treated as uncovered, since transactions in flight during the
+        refresh may still have been adding entries to them.
+        """
+        if as_of.tzinfo is None:
+            as_of = as_of.replace(tzinfo=timezone.utc)
+        if account_ids is not None:
+            account_ids = [uuid.UUID(str(account_id)) for account_id in account_ids]
+        
+        try:
+            refreshed_at = LedgerService.get_view_refreshed_at(db, daily_account_balances.name)
+            
+            tails = db.query(
+                LedgerEntry.account_id.label('account_id'),
+                signed_amount.label('amount')
+            ).filter(LedgerEntry.created_at <= as_of)
+            
+            if account_ids is not None:
+                tails = tails.filter(LedgerEntry.account_id.in_(account_ids))
+            
+            combined = tails
+            
+            if refreshed_at:
+                # Rollup days are UTC days, see refresh_daily_balances
+                covered_until = refreshed_at - timedelta(seconds=settings.BALANCE_SNAPSHOT_SETTLE_SECONDS)
+                boundary_date = min(
+                    as_of.astimezone(timezone.utc).date(),
+                    covered_until.astimezone(timezone.utc).date()
+                )
+                
+                heads = db.query(
+                    daily_account_balances.c.account_id.label('account_id'),
+                    daily_account_balances.c.daily_balance.label('amount')
+                ).filter(daily_account_balances.c.balance_date < boundary_date)
+                
+                if account_ids is not None:
+                    heads = heads.filter(daily_account_balances.c.account_id.in_(account_ids))
+                
+                tails = tails.filter(
+                    LedgerEntry.created_at >= datetime.combine(boundary_date, time.min, tzinfo=timezone.utc)
+                )
+                combined = heads.union_all(tails)
+            
+            combined = combined.subquery()
+            
+            rows = db.query(combined.c.account_id, func.sum(combined.c.amount))\
+                .group_by(combined.c.account_id)\
+                .all()
+        except Exception as e:
+            logger.error("Error calculating balances as of %s: %s", as_of, e)
+            return {}
+        
+        balances = {account_id: Decimal(0) for account_id in account_ids or []}
+        balances.update((account_id, Decimal(balance or 0)) for account_id, balance in rows)
+        
+        return balances
+    
+    @staticmethod
+    def get_view_refreshed_at(db: Session, view_name: str) -> Optional[datetime]:
+        """When a materialized view was last refreshed, or None if it never was"""
+        refreshed_at = db.query(ViewRefresh.refreshed_at)\
+            .filter(ViewRefresh.view_name == view_name)\
+            .scalar()
+        
+        if refreshed_at and refreshed_at.tzinfo is None:
+            refreshed_at = refreshed_at.replace(tzinfo=timezone.utc)
+        
+        return refreshed_at
+    
+    @staticmethod
+    def refresh_daily_balances(db: Session) -> datetime:
+        """Refresh daily_account_balances without blocking readers and record when.
+        
+        The refresh runs with the session time zone set to UTC so that the
+        view's DATE(created_at) days are UTC days. The recorded time is the
+        transaction start, which precedes the refresh snapshot.
+        """
+        try:
+            refreshed_at = db.execute(select(func.now())).scalar()
+            
+            db.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+            db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {daily_account_balances.name}"))
+            db.merge(ViewRefresh(view_name=daily_account_balances.name, refreshed_at=refreshed_at))
+            db.flush()
+            
+            logger.info("Refreshed %s as of %s", daily_account_balances.name, refreshed_at)
+            
+            return refreshed_at
+        except Exception as e:
+            logger.error("Error refreshing %s: %s", daily_account_balances.name, e)
+            raise
+    
+    @staticmethod
+    def get_latest_snapshot(db: Session, account_id: str) -> Optional[BalanceSnapshot]:
+        """Get the most recent balance snapshot for an account"""
+        return db.query(BalanceSnapshot)\
+            .filter(BalanceSnapshot.account_id == account_id)\
+            .order_by(BalanceSnapshot.as_of_created_at.desc(), BalanceSnapshot.as_of_entry_id.desc())\
+            .first()
+    
+    @staticmethod
+    def oldest_open_transaction_start(db: Session) -> Optional[datetime]:
+        """When the oldest transaction still open on the server began, or None if unknown.
+        
+        Only PostgreSQL reports this. Sessions of other roles show no
+        xact_start unless the application role has pg_read_all_stats.
+        Transactions in other databases cannot write this ledger, and the
+        caller's own transaction is the one taking the snapshot, so neither
+        holds the cutoff back.
+        """
+        if db.get_bind().dialect.name != 'postgresql':
+            return None
+        
+        return db.execute(text("""
+            SELECT min(xact_start) FROM pg_stat_activity
+            WHERE xact_start IS NOT NULL
+              AND datname = current_database()
+              AND pid <> pg_backend_pid()
+        """)).scalar()
+    
+    @staticmethod
+    def get_snapshot_cutoff(db: Session) -> datetime:
+        """Entries created before this have all committed, so a snapshot may cover them.
+        
+        Ledger entries take created_at from now(), the start of the database
+        transaction writing them, so an entry can commit long after its
+        created_at. None can still commit with a created_at before the start
+        of the oldest open transaction. BALANCE_SNAPSHOT_SETTLE_SECONDS is
+        an extra margin, and the only bound where that start is unknown.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.BALANCE_SNAPSHOT_SETTLE_SECONDS)
+        
+        oldest = LedgerService.oldest_open_transaction_start(db)
+        if oldest is not None:
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            cutoff = min(cutoff, oldest)
+        
+        return cutoff
+    
+    @staticmethod
+    def create_balance_snapshot(
+        db: Session,
+        account_id: str,
+        cutoff: Optional[datetime] = None
+    ) -> Optional[BalanceSnapshot]:
+        """Checkpoint the balance of every entry before cutoff after the latest snapshot.
+        
+        cutoff defaults to get_snapshot_cutoff, so entries from transactions
+        still in flight cannot land behind the checkpoint.
+        """
         try:
-            result = db.query(
-                func.sum(
-                    func.case(
-                        (LedgerEntry.entry_type == 'credit', LedgerEntry.amount),
-                        (LedgerEntry.entry_type == 'debit', -LedgerEntry.amount),
-                        else_=0
-                    )
+            with db.begin_nested():
+                previous = LedgerService.get_latest_snapshot(db, account_id)
+                if cutoff is None:
+                    cutoff = LedgerService.get_snapshot_cutoff(db)
+                
+                settled = db.query(LedgerEntry)\
+                    .filter(LedgerEntry.account_id == account_id)\
+                    .filter(LedgerEntry.created_at < cutoff)
+                
+                if previous:
+                    settled = settled.filter(entries_after(previous.as_of_created_at, previous.as_of_entry_id))
+                
+                last_entry = settled.with_entities(LedgerEntry.created_at, LedgerEntry.id)\
+                    .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())\
+                    .first()
+                
+                if not last_entry:
+                    return None
+                
+                delta = settled.with_entities(func.sum(signed_amount))\
+                    .filter(~entries_after(last_entry.created_at, last_entry.id))\
+                    .scalar()
+                
+                snapshot = BalanceSnapshot(
+                    account_id=account_id,
+                    as_of_entry_id=last_entry.id,
+                    as_of_created_at=last_entry.created_at,
+                    balance=(previous.balance if previous else Decimal(0)) + Decimal(delta or 0)
                 )
-            ).filter(LedgerEntry.account_id == account_id).scalar()
+                
+                db.add(snapshot)
+            
+            logger.info("Created balance snapshot for account %s at entry %s", account_id, last_entry.id)
             
-            return Decimal(result or 0)
+            return snapshot
         except Exception as e:
-            logger.error(f"Error calculating balance for account {account_id}: {e}")
-            return Decimal(0)
+            logger.error("Error creating balance snapshot for account %s: %s", account_id, e)
+            return None
+    
+    @staticmethod
+    def create_balance_snapshots(db: Session, limit: int = 1000) -> int:
+        """Checkpoint up to limit accounts with BALANCE_SNAPSHOT_THRESHOLD entries past their latest snapshot.
+        
+        Run by a background job so that balance reads never write. Returns
+        the number of snapshots created.
+        """
+        cutoff = LedgerService.get_snapshot_cutoff(db)
+        
+        try:
+            snapshots = latest_snapshots(db)
+            
+            due = db.query(LedgerEntry.account_id)\
+                .outerjoin(snapshots, snapshots.c.account_id == LedgerEntry.account_id)\
+                .filter(LedgerEntry.created_at < cutoff)\
+                .filter(or_(
+                    snapshots.c.account_id.is_(None),
+                    entries_after(snapshots.c.as_of_created_at, snapshots.c.as_of_entry_id)
+                ))\
+                .group_by(LedgerEntry.account_id)\
+                .having(func.count() >= settings.BALANCE_SNAPSHOT_THRESHOLD)\
+                .limit(limit)\
+                .all()
+        except Exception as e:
+            logger.error("Error finding accounts due a balance snapshot: %s", e)
+            raise
+        
+        created = sum(
+            LedgerService.create_balance_snapshot(db, account_id, cutoff) is not None
+            for (account_id,) in due
+        )
+        
+        logger.info("Created %s balance snapshots", created)
+        
+        return created
     
     @staticmethod
     def get_account_ledger(
         db: Session, 
         account_id: str,
         limit: int = 100,
-        offset: int = 0
-    ) -> List[LedgerEntry]:
+        offset: int = 0,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_transaction: bool = False,
+        bucket_count: Optional[int] = None
+    ) -> List[Any]:
         """Get chronological ledger entries for an account"""
+        entries, _ = LedgerService.get_account_ledger_page(
+            db, account_id, limit=limit, offset=offset, start=start, end=end,
+            include_transaction=include_transaction, bucket_count=bucket_count
+        )
+        return entries
+    
+    @staticmethod
+    def get_account_ledger_page(
+        db: Session,
+        account_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_transaction: bool = False,
+        bucket_count: Optional[int] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Get a page of ledger entries, newest first, and the cursor for the next page.
+        
+        With a cursor the page starts after the cursor's (created_at, id)
+        position, so every page costs the same index range scan regardless
+        of depth. Offset paging is kept for existing clients. The next
+        cursor is None on the last page. A [start, end) range on created_at
+        limits the scan to the monthly partitions it overlaps.
+        
+        Entries are rows of LEDGER_PAGE_COLUMNS, without building ORM
+        objects. With include_transaction they are LedgerEntry objects whose
+        transactions are loaded in one more query for the whole page.
+        
+        A hot account's ledger includes the entries posted to its buckets,
+        which keep the bucket's account_id, so the page adds up to the
+        balance. Callers that already hold the account pass its
+        bucket_count; otherwise it is looked up.
+        """
+        position = LedgerService.decode_ledger_cursor(cursor) if cursor else None
+        
         try:
-            return db.query(LedgerEntry)\
-                .filter(LedgerEntry.account_id == account_id)\
-                .order_by(LedgerEntry.created_at.desc())\
-                .offset(offset)\
-                .limit(limit)\
-                .all()
+            if bucket_count is None:
+                bucket_count = LedgerService.get_bucket_count(db, account_id)
+            
+            if include_transaction:
+                query = db.query(LedgerEntry).options(selectinload(LedgerEntry.transaction))
+            else:
+                query = db.query(*(getattr(LedgerEntry, column) for column in LEDGER_PAGE_COLUMNS))
+            
+            query = query\
+                .filter(account_entries(account_id, bucket_count))\
+                .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
+            
+            if start:
+                query = query.filter(LedgerEntry.created_at >= start)
+            if end:
+                query = query.filter(LedgerEntry.created_at < end)
+            
+            if position:
+                query = query.filter(entries_before(*position))
+            elif offset:
+                query = query.offset(offset)
+            
+            entries = query.limit(limit + 1).all()
         except Exception as e:
-            logger.error(f"Error getting ledger for account {account_id}: {e}")
-            return []
+            logger.error("Error getting ledger for account %s: %s", account_id, e)
+            return [], None
+        
+        if len(entries) <= limit:
+            return entries, None
+        
+        entries = entries[:limit]
+        return entries, LedgerService.encode_ledger_cursor(entries[-1])
+    
+    @staticmethod
+    def encode_ledger_cursor(entry: Any) -> str:
+        """Opaque cursor for the (created_at, id) position of a ledger entry"""
+        position = json.dumps([entry.created_at.isoformat(), str(entry.id)])
+        return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_ledger_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+        """Decode a cursor from encode_ledger_cursor into its (created_at, id) position"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created_at), uuid.UUID(entry_id)
+        except Exception:
+            raise ValueError("Invalid ledger cursor")
+    
+    @staticmethod
+    def ledger_export_statement(
+        account_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_count: int = 0
+    ) -> Select:
+        """Oldest-first ledger rows for an account and its buckets in [start, end), as plain columns"""
+        statement = select(*(getattr(LedgerEntry, column) for column in LEDGER_EXPORT_COLUMNS))\
+            .where(account_entries(account_id, bucket_count))\
+            .order_by(LedgerEntry.created_at, LedgerEntry.id)
+        
+        if start:
+            statement = statement.where(LedgerEntry.created_at >= start)
+        if end:
+            statement = statement.where(LedgerEntry.created_at < end)
+        
+        return statement
+    
+    @staticmethod
+    def format_ledger_export(rows: Sequence[Row], export_format: str) -> str:
+        """Render a batch of export rows as CSV lines or newline-delimited JSON"""
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerows(
+                (row.id, row.transaction_id, row.entry_type, row.amount, row.created_at.isoformat())
+                for row in rows
+            )
+            return buffer.getvalue()
+        
+        return ''.join(
+            json.dumps({
+                'id': str(row.id),
+                'transaction_id': str(row.transaction_id),
+                'entry_type': row.entry_type,
+                'amount': str(row.amount),
+                'created_at': row.created_at.isoformat()
+            }) + '\n'
+            for row in rows
+        )
+    
+    @staticmethod
+    def stream_ledger_export(
+        bind: Engine,
+        account_id: str,
+        export_format: str = 'csv',
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        bucket_count: Optional[int] = None
+    ) -> Iterator[str]:
+        """Stream an account's ledger as CSV or NDJSON chunks of batch_size rows.
+        
+        Rows come from a server-side cursor on a dedicated connection, so
+        memory use stays at one batch however long the history is, and the
+        export does not depend on the request's session staying open while
+        the response body is sent. A hot account's export includes its
+        buckets' entries; bucket_count is looked up when not given.
+        """
+        if export_format not in LEDGER_EXPORT_FORMATS:
+            raise ValueError(f"Export format must be one of: {', '.join(LEDGER_EXPORT_FORMATS)}")
+        
+        if export_format == 'csv':
+            yield ','.join(LEDGER_EXPORT_COLUMNS) + '\n'
+        
+        with bind.connect() as connection:
+            if bucket_count is None:
+                bucket_count = connection.execute(
+                    select(Account.bucket_count).where(Account.id == uuid.UUID(str(account_id)))
+                ).scalar() or 0
+            
+            statement = LedgerService.ledger_export_statement(account_id, start, end, bucket_count)
+            result = connection.execution_options(stream_results=True, yield_per=batch_size)\
+                .execute(statement)
+            for rows in result.partitions():
+                yield LedgerService.format_ledger_export(rows, export_format)
     
     @staticmethod
     def create_ledger_entries(
@@ -60,49 +766,161 @@ class LedgerService:
     ) -> Tuple[LedgerEntry, LedgerEntry]:
         """Create balanced debit and credit ledger entries"""
         try:
-            # Create debit entry
-            debit_entry = LedgerEntry(
-                account_id=debit_account_id,
-                transaction_id=transaction_id,
-                entry_type='debit',
-                amount=amount,
-            )
-            
-            # Create credit entry
-            credit_entry = LedgerEntry(
-                account_id=credit_account_id,
-                transaction_id=transaction_id,
-                entry_type='credit',
-                amount=amount,
+            debit_entry, credit_entry = LedgerService.build_ledger_entries(
+                transaction_id,
+                debit_account_id,
+                credit_account_id,
+                amount
             )
             
             db.add(debit_entry)
             db.add(credit_entry)
             db.flush()
             
-            logger.info(f"Created ledger entries for transaction {transaction_id}")
+            if settings.BALANCE_MODE == "materialized":
+                LedgerService.apply_balance_deltas(db, [
+                    (entry.account_id, entry.entry_type, entry.amount) for entry in (debit_entry, credit_entry)
+                ])
+            
+            logger.info("Created ledger entries", extra={"transaction_id": transaction_id})
             
             return debit_entry, credit_entry
+        
+        except Exception as e:
+            logger.error("Error creating ledger entries: %s", e)
+            raise
+    
+    @staticmethod
+    def ensure_ledger_partitions(db: Session, months_ahead: Optional[int] = None) -> int:
+        """Create any missing monthly ledger partitions up to months_ahead months from now.
+        
+        There is no DEFAULT partition (migration 007), so creating one only
+        locks the parent table briefly, and an entry dated past the last
+        partition fails to insert rather than landing somewhere unchecked.
+        """
+        months_ahead = settings.LEDGER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        
+        try:
+            created = db.execute(
+                select(func.ensure_ledger_partitions(months_ahead))
+            ).scalar()
+            
+            logger.info("Created %s ledger partitions", created)
+            
+            return created
+        except Exception as e:
+            logger.error("Error creating ledger partitions: %s", e)
+            raise
+    
+    @staticmethod
+    def build_ledger_entries(
+        transaction_id: str,
+        debit_account_id: str,
+        credit_account_id: str,
+        amount: Decimal
+    ) -> Tuple[LedgerEntry, LedgerEntry]:
+        """Build a debit and credit entry pair without adding it to a session"""
+        debit_entry = LedgerEntry(
+            id=uuid.uuid4(),
+            account_id=debit_account_id,
+            transaction_id=transaction_id,
+            entry_type='debit',
+            amount=amount,
+            leg_number=1,
+        )
+        
+        credit_entry = LedgerEntry(
+            id=uuid.uuid4(),
+            account_id=credit_account_id,
+            transaction_id=transaction_id,
+            entry_type='credit',
+            amount=amount,
+            leg_number=2,
+        )
+        
+        return debit_entry, credit_entry
+    
+    @staticmethod
+    def build_journal_entries(transaction_id: Any, legs: Sequence[Dict[str, Any]]) -> List[LedgerEntry]:
+        """Build numbered entries for a journal's legs, checking that debits equal credits.
+        
+        Each leg is a dict with account_id, entry_type and amount. Legs are
+        numbered in the order given.
+        """
+        if len(legs) < 2:
+            raise ValueError("A journal needs at least two legs")
+        
+        entries = []
+        for leg_number, leg in enumerate(legs, start=1):
+            if leg['entry_type'] not in ('debit', 'credit'):
+                raise ValueError(f"Leg {leg_number} must be a debit or a credit")
+            
+            amount = Decimal(str(leg['amount']))
+            if amount <= 0:
+                raise ValueError(f"Leg {leg_number} amount must be positive")
             
+            entries.append(LedgerEntry(
+                id=uuid.uuid4(),
+                account_id=leg['account_id'],
+                transaction_id=transaction_id,
+                entry_type=leg['entry_type'],
+                amount=amount,
+                leg_number=leg_number,
+            ))
+        
+        if not LedgerService.entries_balance(entries):
+            raise ValueError("Journal legs do not balance: total debits must equal total credits")
+        
+        return entries
+    
+    @staticmethod
+    def post_journal(db: Session, entries: Sequence[LedgerEntry]) -> List[LedgerEntry]:
+        """Write a journal's entries with one multi-row INSERT.
+        
+        In materialized mode each account's net is applied with a conditional
+        update, which also rejects an account that cannot cover its net debit.
+        """
+        try:
+            db.add_all(entries)
+            db.flush()
+            
+            if settings.BALANCE_MODE == "materialized":
+                LedgerService.apply_balance_deltas(
+                    db,
+                    [(entry.account_id, entry.entry_type, entry.amount) for entry in entries],
+                    require_funds=True
+                )
+            
+            logger.info("Posted journal legs", extra={"transaction_id": entries[0].transaction_id, "legs": len(entries)})
+            
+            return list(entries)
         except Exception as e:
-            logger.error(f"Error creating ledger entries: {e}")
+            logger.error("Error posting journal: %s", e)
             raise
     
+    @staticmethod
+    def entries_balance(entries: Sequence[LedgerEntry]) -> bool:
+        """Check in memory that entries net to zero, as verify_double_entry does in the database"""
+        total = Decimal(0)
+        for entry in entries:
+            if entry.entry_type == 'credit':
+                total += entry.amount
+            elif entry.entry_type == 'debit':
+                total -= entry.amount
+            else:
+                return False
+        
+        return total == 0
+    
     @staticmethod
     def verify_double_entry(db: Session, transaction_id: str) -> bool:
         """Verify that a transaction has balanced debit and credit entries"""
         try:
-            result = db.query(
-                func.sum(
-                    func.case(
-                        (LedgerEntry.entry_type == 'credit', LedgerEntry.amount),
-                        (LedgerEntry.entry_type == 'debit', -LedgerEntry.amount),
-                        else_=0
-                    )
-                )
-            ).filter(LedgerEntry.transaction_id == transaction_id).scalar()
+            result = db.query(func.sum(signed_amount))\
+                .filter(LedgerEntry.transaction_id == transaction_id)\
+                .scalar()
             
             return result == 0
         except Exception as e:
-            logger.error(f"Error verifying double entry for transaction {transaction_id}: {e}")
+            logger.error("Error verifying double entry for transaction %s: %s", transaction_id, e)
             return False
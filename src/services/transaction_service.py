@@ -1,11 +1,14 @@
-from typing import Optional, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from decimal import Decimal
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, insert
 import uuid
 import logging
 
+from database import require_primary
+from config import settings
+from models.account import Account, bucket_account_id
 from models.transaction import Transaction
 from models.ledger_entry import LedgerEntry
 from services.ledger_service import LedgerService
@@ -26,26 +29,141 @@ class TransactionService:
     ) -> Transaction:
         """Create a new transaction record"""
         try:
-            transaction_obj = Transaction(
-                type=transaction_type,
+            transaction_obj = TransactionService.build_transaction(
+                transaction_type=transaction_type,
                 amount=amount,
                 currency=currency,
                 description=description,
-                metadata=metadata or {},
-                status='pending'
+                metadata=metadata
             )
             
             db.add(transaction_obj)
             db.flush()
             
-            logger.info(f"Created transaction {transaction_obj.id} of type {transaction_type}")
+            logger.info("Created transaction", extra={"transaction_id": transaction_obj.id, "transaction_type": transaction_type})
             
             return transaction_obj
-            
+        
         except Exception as e:
-            logger.error(f"Error creating transaction: {e}")
+            logger.error("Error creating transaction: %s", e)
             raise
     
+    @staticmethod
+    def build_transaction(
+        transaction_type: str,
+        amount: Decimal,
+        currency: str = 'USD',
+        description: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: str = 'pending'
+    ) -> Transaction:
+        """Build a transaction record with a client-side id, without writing it"""
+        return Transaction(
+            id=uuid.uuid4(),
+            type=transaction_type,
+            amount=amount,
+            currency=currency,
+            description=description,
+            metadata=metadata or {},
+            status=status
+        )
+    
+    @staticmethod
+    def validate_transfer_request(
+        source_account_id: str,
+        destination_account_id: str,
+        amount: Decimal
+    ) -> None:
+        """Validate transfer parameters that do not need the database"""
+        if source_account_id == destination_account_id:
+            raise ValueError("Source and destination accounts cannot be the same")
+        
+        if amount <= 0:
+            raise ValueError("Transfer amount must be positive")
+    
+    @staticmethod
+    def validate_transfer_accounts(
+        source_account: Optional[Account],
+        destination_account: Optional[Account],
+        currency: str,
+        destination_account_id: Any
+    ) -> None:
+        """Validate that both transfer accounts exist, are active and match the currency.
+        
+        destination_account is the account the credit is posted to, which is
+        one of its buckets when destination_account_id is hot. Buckets cannot
+        be named directly on either side.
+        """
+        if not source_account:
+            raise ValueError("Source account does not exist")
+        
+        if source_account.status != 'active':
+            raise ValueError("Source account is not active")
+        
+        if source_account.parent_account_id:
+            raise ValueError("Source account is a bucket of a hot account; transfer from its parent account")
+        
+        if not destination_account:
+            raise ValueError("Destination account does not exist")
+        
+        if destination_account.status != 'active':
+            raise ValueError("Destination account is not active")
+        
+        if TransactionService.is_bucket_posting(destination_account, destination_account_id):
+            raise ValueError("Destination account is a bucket of a hot account; transfer to its parent account")
+        
+        # Check currency compatibility
+        if source_account.currency != currency.upper():
+            raise ValueError(f"Source account currency ({source_account.currency}) does not match transfer currency ({currency.upper()})")
+        
+        if destination_account.currency != currency.upper():
+            raise ValueError(f"Destination account currency ({destination_account.currency}) does not match transfer currency ({currency.upper()})")
+    
+    @staticmethod
+    def is_bucket_posting(account: Account, requested_account_id: Any) -> bool:
+        """Whether a posting names a bucket itself rather than reaching it through its hot account.
+        
+        A credit routed to a bucket by get_credit_account_id carries the
+        bucket's id while the request carries the parent's, so only postings
+        that asked for the bucket by id are caught.
+        """
+        return bool(account.parent_account_id) and account.id == uuid.UUID(str(requested_account_id))
+    
+    @staticmethod
+    def lock_bucket_balances(db: Session, accounts: List[Account]) -> Dict[Any, Decimal]:
+        """Lock hot accounts' buckets and read the balances their debits can draw on.
+        
+        The accounts themselves must already be locked; each one's own balance
+        is drawn on like a bucket's. The buckets are locked after the other
+        accounts in the transaction, so a deadlock with a concurrent credit is
+        possible and is retried by run_with_retry. Accounts and buckets
+        without funds may be missing from the result.
+        """
+        buckets = AccountService.get_accounts(
+            db,
+            [bucket_account_id(account.id, bucket) for account in accounts for bucket in range(account.bucket_count)],
+            for_update=True
+        )
+        
+        if settings.BALANCE_MODE == "materialized":
+            balances = {account_id: bucket.balance for account_id, bucket in buckets.items()}
+            balances.update((account.id, account.balance) for account in accounts)
+            return balances
+        
+        return LedgerService.calculate_balances(db, [*(account.id for account in accounts), *buckets])
+    
+    @staticmethod
+    def bucket_balances(balances: Dict[Any, Decimal], account: Account) -> Dict[Any, Decimal]:
+        """The entries of balances that belong to a hot account and its buckets"""
+        account_ids = [account.id] + [bucket_account_id(account.id, bucket) for bucket in range(account.bucket_count)]
+        return {account_id: balances[account_id] for account_id in account_ids if account_id in balances}
+    
+    @staticmethod
+    def allocate_bucket_debit(db: Session, account: Account, amount: Decimal) -> List[Tuple[Any, Decimal]]:
+        """Lock a hot account's buckets and choose which of them a debit draws on"""
+        balances = TransactionService.lock_bucket_balances(db, [account])
+        return LedgerService.allocate_debit(TransactionService.bucket_balances(balances, account), amount)
+    
     @staticmethod
     def execute_transfer(
         db: Session,
@@ -56,46 +174,11 @@ class TransactionService:
         description: Optional[str] = None
     ) -> Transaction:
         """Execute a transfer between two accounts with ACID compliance"""
-        if source_account_id == destination_account_id:
-            raise ValueError("Source and destination accounts cannot be the same")
-        
-        if amount <= 0:
-            raise ValueError("Transfer amount must be positive")
+        require_primary(db)
+        TransactionService.validate_transfer_request(source_account_id, destination_account_id, amount)
         
         try:
-            # Check if accounts exist and are active
-            source_account = AccountService.get_account(db, source_account_id)
-            destination_account = AccountService.get_account(db, destination_account_id)
-            
-            if not source_account:
-                raise ValueError("Source account does not exist")
-            
-            if source_account.status != 'active':
-                raise ValueError("Source account is not active")
-            
-            if not destination_account:
-                raise ValueError("Destination account does not exist")
-            
-            if destination_account.status != 'active':
-                raise ValueError("Destination account is not active")
-            
-            # Check currency compatibility
-            if source_account.currency != currency.upper():
-                raise ValueError(f"Source account currency ({source_account.currency}) does not match transfer currency ({currency.upper()})")
-            
-            if destination_account.currency != currency.upper():
-                raise ValueError(f"Destination account currency ({destination_account.currency}) does not match transfer currency ({currency.upper()})")
-            
-            # Calculate current balance with lock
-            current_balance = LedgerService.calculate_balance(db, source_account_id)
-            
-            # Check for sufficient funds
-            if current_balance < amount:
-                raise ValueError(f"Insufficient funds. Available: {current_balance}, Required: {amount}")
-            
-            # Create transaction record
-            transaction_obj = TransactionService.create_transaction(
-                db=db,
+            transaction_obj = TransactionService.build_transaction(
                 transaction_type='transfer',
                 amount=amount,
                 currency=currency,
@@ -103,33 +186,353 @@ class TransactionService:
                 metadata={
                     'source_account_id': str(source_account_id),
                     'destination_account_id': str(destination_account_id)
-                }
+                },
+                status='completed'
             )
+            transaction_obj.completed_at = datetime.utcnow()
             
-            # Create ledger entries
-            LedgerService.create_ledger_entries(
-                db=db,
-                transaction_id=transaction_obj.id,
-                debit_account_id=source_account_id,
-                credit_account_id=destination_account_id,
-                amount=amount,
-                description=description
-            )
+            # A hot destination is credited through one of its buckets
+            credit_account_id = AccountService.get_credit_account_id(destination_account_id, transaction_obj.id)
             
-            # Verify double-entry balance
-            if not LedgerService.verify_double_entry(db, transaction_obj.id):
+            # Lock both accounts in id order before reading the balance
+            accounts = AccountService.get_accounts(
+                db,
+                [source_account_id, credit_account_id],
+                for_update=True
+            )
+            source_account = accounts.get(uuid.UUID(str(source_account_id)))
+            destination_account = accounts.get(credit_account_id)
+            
+            TransactionService.validate_transfer_accounts(source_account, destination_account, currency, destination_account_id)
+            
+            if source_account.bucket_count:
+                debits = TransactionService.allocate_bucket_debit(db, source_account, amount)
+                
+                if settings.BALANCE_MODE == "materialized":
+                    # Every bucket drawn on is locked and was checked to cover its share
+                    LedgerService.apply_balance_deltas(db, [
+                        *((account_id, 'debit', debit) for account_id, debit in debits),
+                        (destination_account.id, 'credit', amount)
+                    ])
+            elif settings.BALANCE_MODE == "materialized":
+                debits = [(source_account.id, amount)]
+                
+                # The sufficient-funds check is the conditional debit itself
+                if LedgerService.apply_balance_delta(db, source_account.id, -amount, require_funds=True) is None:
+                    raise ValueError(f"Insufficient funds. Available: {source_account.balance}, Required: {amount}")
+                LedgerService.apply_balance_delta(db, destination_account.id, amount)
+            else:
+                debits = [(source_account.id, amount)]
+                
+                # Calculate current balance under the source account lock
+                current_balance = LedgerService.calculate_balance(db, source_account.id, bucket_count=0)
+                
+                # Check for sufficient funds
+                if current_balance < amount:
+                    raise ValueError(f"Insufficient funds. Available: {current_balance}, Required: {amount}")
+            
+            # Build the entries in memory with client-side ids
+            if len(debits) == 1:
+                entries = LedgerService.build_ledger_entries(
+                    transaction_id=transaction_obj.id,
+                    debit_account_id=debits[0][0],
+                    credit_account_id=destination_account.id,
+                    amount=amount
+                )
+            else:
+                entries = LedgerService.build_journal_entries(transaction_obj.id, [
+                    *({'account_id': account_id, 'entry_type': 'debit', 'amount': debit} for account_id, debit in debits),
+                    {'account_id': destination_account.id, 'entry_type': 'credit', 'amount': amount}
+                ])
+            
+            # Verify double-entry balance before anything is written
+            if not LedgerService.entries_balance(entries):
                 raise ValueError("Double-entry verification failed")
             
-            # Update transaction status to completed
-            transaction_obj.status = 'completed'
-            transaction_obj.completed_at = datetime.utcnow()
+            # One flush inserts the transaction, then all entries in a single statement
+            db.add(transaction_obj)
+            db.add_all(entries)
+            db.flush()
             
-            logger.info(f"Transfer completed successfully: {transaction_obj.id}")
+            logger.info("Transfer completed successfully", extra={"transaction_id": transaction_obj.id})
             
             return transaction_obj
+        
+        except Exception as e:
+            logger.error("Transfer failed: %s", e)
+            raise
+    
+    @staticmethod
+    def execute_transfers_batch(
+        db: Session,
+        transfers: List[Dict[str, Any]],
+        atomic: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Execute many transfers with one account lock, one balance query and bulk inserts.
+        
+        Each transfer dict takes the execute_transfer arguments. Hot accounts
+        are posted to through their buckets as execute_transfer posts to
+        them; hot sources cost one more lock and balance query for their
+        buckets. Results are returned per item in request order. In atomic mode a single failure
+        aborts the whole batch and nothing is written; otherwise failed items
+        are skipped and the rest are committed with the caller's transaction.
+        """
+        require_primary(db)
+        
+        results = []
+        pending = []
+        
+        # Validate requests that do not need the database
+        for index, transfer in enumerate(transfers):
+            try:
+                source_account_id = uuid.UUID(str(transfer['source_account_id']))
+                destination_account_id = uuid.UUID(str(transfer['destination_account_id']))
+            except ValueError:
+                results.append({'index': index, 'status': 'failed', 'error': "Invalid account ID format"})
+                continue
+            
+            amount = Decimal(str(transfer['amount']))
+            
+            try:
+                TransactionService.validate_transfer_request(source_account_id, destination_account_id, amount)
+            except ValueError as e:
+                results.append({'index': index, 'status': 'failed', 'error': str(e)})
+                continue
+            
+            # A hot destination is credited through the bucket its transaction id picks
+            transaction_id = uuid.uuid4()
+            credit_account_id = AccountService.get_credit_account_id(destination_account_id, transaction_id)
+            
+            results.append({'index': index, 'status': 'completed'})
+            pending.append((index, transaction_id, source_account_id, destination_account_id, credit_account_id, amount, transfer))
+        
+        try:
+            source_ids = {item[2] for item in pending}
+            accounts = AccountService.get_accounts(db, list(source_ids | {item[4] for item in pending}), for_update=True)
+            
+            # Debits from a hot source draw on its buckets, so all of them are locked and read
+            hot_sources = [accounts[source] for source in source_ids if source in accounts and accounts[source].bucket_count]
+            balances = TransactionService.lock_bucket_balances(db, hot_sources) if hot_sources else {}
+            balances.update(LedgerService.calculate_balances(
+                db, [source for source in source_ids if source not in accounts or not accounts[source].bucket_count]
+            ))
+            
+            transaction_rows = []
+            entry_rows = []
+            completed_at = datetime.utcnow()
+            
+            for index, transaction_id, source_account_id, destination_account_id, credit_account_id, amount, transfer in pending:
+                currency = transfer.get('currency', 'USD')
+                source_account = accounts.get(source_account_id)
+                
+                try:
+                    TransactionService.validate_transfer_accounts(
+                        source_account,
+                        accounts.get(credit_account_id),
+                        currency,
+                        destination_account_id
+                    )
+                    
+                    # Balances carry forward so earlier items in the batch are honoured
+                    if source_account.bucket_count:
+                        debits = LedgerService.allocate_debit(TransactionService.bucket_balances(balances, source_account), amount)
+                    else:
+                        current_balance = balances.get(source_account_id, Decimal(0))
+                        if current_balance < amount:
+                            raise ValueError(f"Insufficient funds. Available: {current_balance}, Required: {amount}")
+                        debits = [(source_account_id, amount)]
+                except ValueError as e:
+                    results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+                    continue
+                
+                for debit_account_id, debit in debits:
+                    balances[debit_account_id] = balances.get(debit_account_id, Decimal(0)) - debit
+                balances[credit_account_id] = balances.get(credit_account_id, Decimal(0)) + amount
+                
+                transaction_rows.append({
+                    'id': transaction_id,
+                    'type': 'transfer',
+                    'status': 'completed',
+                    'amount': amount,
+                    'currency': currency,
+                    'description': transfer.get('description'),
+                    'metadata': {
+                        'source_account_id': str(source_account_id),
+                        'destination_account_id': str(destination_account_id)
+                    },
+                    'completed_at': completed_at
+                })
+                entry_rows.extend(
+                    {
+                        'account_id': debit_account_id,
+                        'transaction_id': transaction_id,
+                        'entry_type': 'debit',
+                        'amount': debit,
+                        'leg_number': leg_number
+                    }
+                    for leg_number, (debit_account_id, debit) in enumerate(debits, start=1)
+                )
+                entry_rows.append({
+                    'account_id': credit_account_id,
+                    'transaction_id': transaction_id,
+                    'entry_type': 'credit',
+                    'amount': amount,
+                    'leg_number': len(debits) + 1
+                })
+                results[index]['transaction_id'] = str(transaction_id)
+            
+            failed = [result for result in results if result['status'] == 'failed']
+            
+            if atomic and failed:
+                for result in results:
+                    if result['status'] == 'completed':
+                        result.pop('transaction_id', None)
+                        result['status'] = 'aborted'
+                        result['error'] = "Batch aborted because another transfer failed"
+                
+                logger.info("Atomic transfer batch aborted", extra={"failed": len(failed), "transfers": len(transfers)})
+                return results
+            
+            if transaction_rows:
+                db.execute(insert(Transaction), transaction_rows)
+                db.execute(insert(LedgerEntry), entry_rows)
+                
+                # Funds were checked above against balances read under the account locks
+                if settings.BALANCE_MODE == "materialized":
+                    LedgerService.apply_balance_deltas(db, [
+                        (row['account_id'], row['entry_type'], row['amount']) for row in entry_rows
+                    ])
+            
+            logger.info("Transfer batch completed", extra={"succeeded": len(transaction_rows), "failed": len(failed)})
+            
+            return results
+        
+        except Exception as e:
+            logger.error("Transfer batch failed: %s", e)
+            raise
+    
+    @staticmethod
+    def spread_journal_entries(
+        db: Session,
+        transaction_id: Any,
+        entries: List[LedgerEntry],
+        hot_accounts: Dict[Any, Account]
+    ) -> List[LedgerEntry]:
+        """Rebuild a journal's entries with the legs on hot accounts posted to their buckets.
+        
+        A hot account's credits go to the bucket the transaction id picks. Its
+        debits draw on its buckets, fullest first, once its credits in the
+        journal are counted, and fail if the account cannot cover them.
+        """
+        credit_account_ids = {
+            account_id: AccountService.get_credit_account_id(account_id, transaction_id) for account_id in hot_accounts
+        }
+        debited = {entry.account_id for entry in entries if entry.entry_type == 'debit' and entry.account_id in hot_accounts}
+        
+        # Debited accounts lock all their buckets below; the others only the bucket credited
+        AccountService.get_accounts(
+            db,
+            [credit_account_ids[account_id] for account_id in hot_accounts if account_id not in debited],
+            for_update=True
+        )
+        balances = TransactionService.lock_bucket_balances(db, [hot_accounts[account_id] for account_id in debited])
+        
+        for entry in entries:
+            if entry.entry_type == 'credit' and entry.account_id in debited:
+                credit_account_id = credit_account_ids[entry.account_id]
+                balances[credit_account_id] = balances.get(credit_account_id, Decimal(0)) + entry.amount
+        
+        legs = []
+        for entry in entries:
+            if entry.account_id not in hot_accounts:
+                legs.append({'account_id': entry.account_id, 'entry_type': entry.entry_type, 'amount': entry.amount})
+            elif entry.entry_type == 'credit':
+                legs.append({'account_id': credit_account_ids[entry.account_id], 'entry_type': 'credit', 'amount': entry.amount})
+            else:
+                debits = LedgerService.allocate_debit(
+                    TransactionService.bucket_balances(balances, hot_accounts[entry.account_id]), entry.amount
+                )
+                for debit_account_id, debit in debits:
+                    balances[debit_account_id] -= debit
+                    legs.append({'account_id': debit_account_id, 'entry_type': 'debit', 'amount': debit})
+        
+        return LedgerService.build_journal_entries(transaction_id, legs)
+    
+    @staticmethod
+    def execute_journal(
+        db: Session,
+        legs: List[Dict[str, Any]],
+        currency: str = 'USD',
+        description: Optional[str] = None
+    ) -> Transaction:
+        """Post any number of balanced debit and credit legs as one transaction.
+        
+        Every account is locked in id order and must be active and in the
+        journal currency. An account whose legs net to a debit must hold
+        enough funds to cover it. Legs on hot accounts are posted to their
+        buckets; legs naming a bucket directly are rejected.
+        """
+        require_primary(db)
+        
+        try:
+            legs = [dict(leg, account_id=uuid.UUID(str(leg['account_id']))) for leg in legs]
             
+            transaction_obj = TransactionService.build_transaction(
+                transaction_type='journal',
+                amount=sum(Decimal(str(leg['amount'])) for leg in legs if leg['entry_type'] == 'debit'),
+                currency=currency,
+                description=description,
+                metadata={'legs': len(legs)},
+                status='completed'
+            )
+            transaction_obj.completed_at = datetime.utcnow()
+            
+            # Validates the legs and checks that they balance before anything is locked
+            entries = LedgerService.build_journal_entries(transaction_obj.id, legs)
+            
+            accounts = AccountService.get_accounts(db, [entry.account_id for entry in entries], for_update=True)
+            
+            net_amounts: Dict[Any, Decimal] = {}
+            for entry in entries:
+                account = accounts.get(entry.account_id)
+                if not account:
+                    raise ValueError(f"Account {entry.account_id} does not exist")
+                
+                if account.status != 'active':
+                    raise ValueError(f"Account {entry.account_id} is not active")
+                
+                if account.parent_account_id:
+                    raise ValueError(f"Account {entry.account_id} is a bucket of a hot account; post to its parent account")
+                
+                if account.currency != currency.upper():
+                    raise ValueError(f"Account {entry.account_id} currency ({account.currency}) does not match journal currency ({currency.upper()})")
+                
+                signed = entry.amount if entry.entry_type == 'credit' else -entry.amount
+                net_amounts[entry.account_id] = net_amounts.get(entry.account_id, Decimal(0)) + signed
+            
+            # Legs on hot accounts move to their buckets, which checks the hot accounts' funds
+            hot_accounts = {account_id: account for account_id, account in accounts.items() if account.bucket_count}
+            if hot_accounts:
+                entries = TransactionService.spread_journal_entries(db, transaction_obj.id, entries, hot_accounts)
+            
+            # In materialized mode post_journal checks funds with conditional updates
+            if settings.BALANCE_MODE != "materialized":
+                debited = [account_id for account_id, net in net_amounts.items() if net < 0 and account_id not in hot_accounts]
+                balances = LedgerService.calculate_balances(db, debited)
+                for account_id in debited:
+                    available = balances.get(account_id, Decimal(0))
+                    if available < -net_amounts[account_id]:
+                        raise ValueError(f"Insufficient funds in account {account_id}. Available: {available}, Required: {-net_amounts[account_id]}")
+            
+            db.add(transaction_obj)
+            LedgerService.post_journal(db, entries)
+            
+            logger.info("Journal completed successfully", extra={"transaction_id": transaction_obj.id, "legs": len(entries)})
+            
+            return transaction_obj
+        
         except Exception as e:
-            logger.error(f"Transfer failed: {str(e)}")
+            logger.error("Journal failed: %s", e)
             raise
     
     @staticmethod
@@ -141,12 +544,17 @@ class TransactionService:
         description: Optional[str] = None
     ) -> Transaction:
         """Execute a deposit (credit only)"""
+        require_primary(db)
+        
         if amount <= 0:
             raise ValueError("Deposit amount must be positive")
         
         try:
-            # Check if account exists and is active
-            account = AccountService.get_account(db, account_id)
+            # A hot account is credited through one of its buckets, which shares its status
+            credit_account_id = AccountService.get_credit_account_id(account_id, uuid.uuid4())
+            
+            # Lock the account so a concurrent freeze cannot land between the status check and the credit
+            account = AccountService.get_accounts(db, [credit_account_id], for_update=True).get(credit_account_id)
             
             if not account:
                 raise ValueError("Account does not exist")
@@ -154,6 +562,9 @@ class TransactionService:
             if account.status != 'active':
                 raise ValueError("Account is not active")
             
+            if TransactionService.is_bucket_posting(account, account_id):
+                raise ValueError("Account is a bucket of a hot account; deposit to its parent account")
+            
             if account.currency != currency.upper():
                 raise ValueError(f"Account currency ({account.currency}) does not match deposit currency ({currency.upper()})")
             
@@ -169,7 +580,7 @@ class TransactionService:
             
             # For deposit, we credit the account
             credit_entry = LedgerEntry(
-                account_id=account_id,
+                account_id=account.id,
                 transaction_id=transaction_obj.id,
                 entry_type='credit',
                 amount=amount,
@@ -177,16 +588,19 @@ class TransactionService:
             
             db.add(credit_entry)
             
+            if settings.BALANCE_MODE == "materialized":
+                LedgerService.apply_balance_delta(db, account.id, amount)
+            
             # Update transaction status
             transaction_obj.status = 'completed'
             transaction_obj.completed_at = datetime.utcnow()
             
-            logger.info(f"Deposit completed successfully: {transaction_obj.id}")
+            logger.info("Deposit completed successfully", extra={"transaction_id": transaction_obj.id})
             
             return transaction_obj
-            
+        
         except Exception as e:
-            logger.error(f"Deposit failed: {str(e)}")
+            logger.error("Deposit failed: %s", e)
             raise
     
     @staticmethod
@@ -198,12 +612,14 @@ class TransactionService:
         description: Optional[str] = None
     ) -> Transaction:
         """Execute a withdrawal (debit only)"""
+        require_primary(db)
+        
         if amount <= 0:
             raise ValueError("Withdrawal amount must be positive")
         
         try:
-            # Check if account exists and is active
-            account = AccountService.get_account(db, account_id)
+            # Lock the account so concurrent withdrawals see each other's entries
+            account = AccountService.get_accounts(db, [account_id], for_update=True).get(uuid.UUID(str(account_id)))
             
             if not account:
                 raise ValueError("Account does not exist")
@@ -211,15 +627,32 @@ class TransactionService:
             if account.status != 'active':
                 raise ValueError("Account is not active")
             
+            if account.parent_account_id:
+                raise ValueError("Account is a bucket of a hot account; withdraw from its parent account")
+            
             if account.currency != currency.upper():
                 raise ValueError(f"Account currency ({account.currency}) does not match withdrawal currency ({currency.upper()})")
             
-            # Calculate current balance
-            current_balance = LedgerService.calculate_balance(db, account_id)
-            
-            # Check for sufficient funds
-            if current_balance < amount:
-                raise ValueError(f"Insufficient funds. Available: {current_balance}, Required: {amount}")
+            if account.bucket_count:
+                debits = TransactionService.allocate_bucket_debit(db, account, amount)
+                
+                if settings.BALANCE_MODE == "materialized":
+                    LedgerService.apply_balance_deltas(db, [(bucket_id, 'debit', debit) for bucket_id, debit in debits])
+            elif settings.BALANCE_MODE == "materialized":
+                debits = [(account.id, amount)]
+                
+                # The sufficient-funds check is the conditional debit itself
+                if LedgerService.apply_balance_delta(db, account.id, -amount, require_funds=True) is None:
+                    raise ValueError(f"Insufficient funds. Available: {account.balance}, Required: {amount}")
+            else:
+                debits = [(account.id, amount)]
+                
+                # Calculate current balance
+                current_balance = LedgerService.calculate_balance(db, account.id, bucket_count=0)
+                
+                # Check for sufficient funds
+                if current_balance < amount:
+                    raise ValueError(f"Insufficient funds. Available: {current_balance}, Required: {amount}")
             
             # Create transaction record
             transaction_obj = TransactionService.create_transaction(
@@ -231,26 +664,28 @@ class TransactionService:
                 metadata={'account_id': str(account_id)}
             )
             
-            # For withdrawal, we debit the account
-            debit_entry = LedgerEntry(
-                account_id=account_id,
-                transaction_id=transaction_obj.id,
-                entry_type='debit',
-                amount=amount,
+            # For withdrawal, we debit the account, or each bucket drawn on
+            db.add_all(
+                LedgerEntry(
+                    account_id=debit_account_id,
+                    transaction_id=transaction_obj.id,
+                    entry_type='debit',
+                    amount=debit,
+                    leg_number=leg_number,
+                )
+                for leg_number, (debit_account_id, debit) in enumerate(debits, start=1)
             )
             
-            db.add(debit_entry)
-            
             # Update transaction status
             transaction_obj.status = 'completed'
             transaction_obj.completed_at = datetime.utcnow()
             
-            logger.info(f"Withdrawal completed successfully: {transaction_obj.id}")
+            logger.info("Withdrawal completed successfully", extra={"transaction_id": transaction_obj.id})
             
             return transaction_obj
-            
+        
         except Exception as e:
-            logger.error(f"Withdrawal failed: {str(e)}")
+            logger.error("Withdrawal failed: %s", e)
             raise
     
     @staticmethod
@@ -259,5 +694,5 @@ class TransactionService:
         try:
             return db.query(Transaction).filter(Transaction.id == transaction_id).first()
         except Exception as e:
-            logger.error(f"Error getting transaction {transaction_id}: {e}")
+            logger.error("Error getting transaction %s: %s", transaction_id, e)
             return None
@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 import sys
@@ -9,6 +9,11 @@ import os
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+# Tests create their own schema; the app must not migrate the configured database on startup
+os.environ.setdefault("STARTUP_MIGRATIONS", "off")
+# Nor hold a connection to it listening for account changes
+os.environ.setdefault("ACCOUNT_CACHE_LISTEN_ENABLED", "false")
+
 from main import app
 from database import Base, get_db
 from config import settings
@@ -37,6 +42,20 @@ def db():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def query_counter():
+    """Collect every SQL statement executed on the test engine"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
 @pytest.fixture(scope="function")
 def client(db):
     """Create test client with overridden database dependency"""
@@ -357,3 +357,160 @@ def test_concurrent_api_requests(client, sample_account_data):
     account_response = client.get(f"/api/v1/accounts/{account_id}")
     final_balance = account_response.json()["balance"]
     assert final_balance >= 0
+
+def test_execute_transfers_batch_atomic_failure(client):
+    """Test POST /transfers/batch rejects an atomic batch with failing items"""
+    batch_data = {
+        "transfers": [
+            {
+                "source_account_id": "123e4567-e89b-12d3-a456-426614174000",
+                "destination_account_id": "123e4567-e89b-12d3-a456-426614174001",
+                "amount": 25.00,
+                "currency": "USD"
+            },
+            {
+                "source_account_id": "not-a-uuid",
+                "destination_account_id": "123e4567-e89b-12d3-a456-426614174001",
+                "amount": 10.00,
+                "currency": "USD"
+            }
+        ],
+        "atomic": True
+    }
+    
+    response = client.post("/api/v1/transfers/batch", json=batch_data)
+    
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["completed"] == 0
+    assert detail["failed"] == 2
+    assert detail["results"][0]["error"] == "Source account does not exist"
+    assert detail["results"][1]["error"] == "Invalid account ID format"
+
+def test_export_account_ledger(client, db):
+    """Test GET /accounts/{id}/ledger/export streams the account history"""
+    from decimal import Decimal
+    from services.account_service import AccountService
+    from models.transaction import Transaction
+    from models.ledger_entry import LedgerEntry
+    
+    account = AccountService.create_account(db, "export_user", "checking", "USD")
+    transaction = Transaction(type="deposit", amount=Decimal("10.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    db.add(LedgerEntry(
+        account_id=account.id,
+        transaction_id=transaction.id,
+        entry_type="credit",
+        amount=Decimal("10.00")
+    ))
+    db.commit()
+    
+    response = client.get(f"/api/v1/accounts/{account.id}/ledger/export?format=ndjson")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 1
+    assert records[0]["amount"] == "10.0000"
+    
+    response = client.get(f"/api/v1/accounts/{account.id}/ledger/export?format=xml")
+    assert response.status_code == 422
+
+def test_get_account_balance_invalid_id(client):
+    """Test GET /accounts/{id}/balance rejects malformed IDs and timestamps"""
+    response = client.get("/api/v1/accounts/not-a-uuid/balance?as_of=2024-01-31T23:59:59Z")
+    assert response.status_code == 400
+    
+    response = client.get("/api/v1/accounts/123e4567-e89b-12d3-a456-426614174000/balance?as_of=yesterday")
+    assert response.status_code == 422
+
+def test_metrics_endpoint(client):
+    """Test GET /metrics reports pool gauges and per-route request metrics"""
+    client.get("/api/v1/accounts/not-a-uuid")
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'db_pool_checked_out_connections{pool="sync"}' in body
+    assert 'db_pool_checkout_wait_seconds_bucket' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/accounts/{account_id}",status="400"}' in body
+    assert 'http_request_sql_statements_count{route="/api/v1/accounts/{account_id}"}' in body
+
+
+def test_read_replica_rejects_malformed_lsn_token():
+    """Test that an X-Min-LSN token must look like a pg_lsn"""
+    from fastapi import HTTPException
+    from replicas import validate_lsn_token
+    
+    validate_lsn_token(None)
+    validate_lsn_token("16/B374D848")
+    
+    with pytest.raises(HTTPException) as error:
+        validate_lsn_token("16/B374D848; DROP TABLE accounts")
+    assert error.value.status_code == 400
+
+
+def test_create_journal(client, sample_account_data):
+    """Test POST /journal posts every leg of a payment with fees in one transaction"""
+    account_ids = []
+    for user_id in ("payer", "merchant", "platform"):
+        response = client.post("/api/v1/accounts/", json={**sample_account_data, "user_id": user_id})
+        account_ids.append(response.json()["id"])
+    payer_id, merchant_id, platform_id = account_ids
+    
+    client.post("/api/v1/deposits", json={"account_id": payer_id, "amount": 50.00, "currency": "USD"})
+    
+    response = client.post("/api/v1/journal/", json={
+        "legs": [
+            {"account_id": payer_id, "entry_type": "debit", "amount": 50.00},
+            {"account_id": merchant_id, "entry_type": "credit", "amount": 48.50},
+            {"account_id": platform_id, "entry_type": "credit", "amount": 1.50},
+        ],
+        "description": "Order 1001"
+    })
+    
+    assert response.status_code == 201
+    data = response.json()
+    assert data["type"] == "journal"
+    assert data["amount"] == 50.00
+    assert [leg["leg_number"] for leg in data["legs"]] == [1, 2, 3]
+    
+    unbalanced = client.post("/api/v1/journal/", json={
+        "legs": [
+            {"account_id": merchant_id, "entry_type": "debit", "amount": 10.00},
+            {"account_id": platform_id, "entry_type": "credit", "amount": 9.00},
+        ]
+    })
+    assert unbalanced.status_code == 400
+    assert "do not balance" in unbalanced.json()["detail"]
+
+def test_ledger_rows_encode_like_response_model():
+    """Ledger rows sent straight through ORJSONResponse match LedgerEntryResponse output"""
+    import uuid
+    from datetime import datetime, timezone
+    from decimal import Decimal
+    from types import SimpleNamespace
+    from fastapi.responses import ORJSONResponse
+    from api.accounts import LedgerEntryResponse, ledger_entry_row
+    
+    entry = SimpleNamespace(
+        id=uuid.uuid4(),
+        account_id=uuid.uuid4(),
+        transaction_id=uuid.uuid4(),
+        entry_type="debit",
+        amount=Decimal("12.3400"),
+        created_at=datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    )
+    expected = LedgerEntryResponse(
+        id=str(entry.id),
+        account_id=str(entry.account_id),
+        transaction_id=str(entry.transaction_id),
+        entry_type=entry.entry_type,
+        amount=float(entry.amount),
+        created_at=entry.created_at.isoformat()
+    ).dict(exclude_none=True)
+    
+    assert json.loads(ORJSONResponse(content=[ledger_entry_row(entry)]).body) == [expected]
@@ -0,0 +1,140 @@
+import pytest
+import importlib.util
+import io
+import json
+import os
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+# scripts/ is not a package; load the loader as a module
+spec = importlib.util.spec_from_file_location(
+    "bulk_load", Path(__file__).parent.parent / "scripts" / "bulk_load.py"
+)
+bulk_load = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bulk_load)
+
+def entry(transaction_id, account_id, entry_type, amount, transaction_type="transfer"):
+    return {
+        "transaction_id": str(transaction_id),
+        "type": transaction_type,
+        "currency": "USD",
+        "description": "",
+        "created_at": "2023-03-01T12:00:00",
+        "account_id": str(account_id),
+        "entry_type": entry_type,
+        "amount": amount,
+    }
+
+def test_group_transactions_splits_adjacent_runs():
+    """Test that records are grouped by runs of the same transaction id, in input order"""
+    first, second = uuid.uuid4(), uuid.uuid4()
+    source, destination = uuid.uuid4(), uuid.uuid4()
+    records = [
+        entry(first, source, "debit", "5.00"),
+        entry(first, destination, "credit", "5.00"),
+        entry(second, destination, "credit", "7.00", "deposit"),
+    ]
+    
+    groups = list(bulk_load.group_transactions(iter(records)))
+    
+    assert [transaction_id for transaction_id, _ in groups] == [str(first), str(second)]
+    assert [len(entries) for _, entries in groups] == [2, 1]
+    assert list(bulk_load.group_transactions(iter([]))) == []
+
+def test_validate_transaction_names_transfer_accounts():
+    """Test that transfer rows carry the source and destination transfer_currency_check requires"""
+    transaction_id, source, destination = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    
+    transaction_row, entry_rows = bulk_load.validate_transaction(transaction_id, [
+        entry(transaction_id, source, "debit", "12.50"),
+        entry(transaction_id, destination, "credit", "12.50"),
+    ])
+    
+    metadata = json.loads(transaction_row[6])
+    assert metadata == {
+        "source": "bulk_load",
+        "source_account_id": str(source),
+        "destination_account_id": str(destination),
+    }
+    assert transaction_row[3] == Decimal("12.50")
+    # Timestamps without an offset are read as UTC
+    assert transaction_row[7] == "2023-03-01T12:00:00+00:00"
+    assert [(row[1], row[3], row[5]) for row in entry_rows] == [(source, "debit", 1), (destination, "credit", 2)]
+    
+    deposit_id = uuid.uuid4()
+    transaction_row, _ = bulk_load.validate_transaction(deposit_id, [
+        entry(deposit_id, destination, "credit", "3.00", "deposit"),
+    ])
+    assert json.loads(transaction_row[6]) == {"source": "bulk_load"}
+
+def test_validate_transaction_rejects_malformed_transactions():
+    """Test that unbalanced, mixed-type and single-leg transfers are rejected with the transaction id"""
+    transaction_id, source, destination = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    
+    with pytest.raises(ValueError, match="do not balance"):
+        bulk_load.validate_transaction(transaction_id, [
+            entry(transaction_id, source, "debit", "10.00"),
+            entry(transaction_id, destination, "credit", "9.99"),
+        ])
+    
+    with pytest.raises(ValueError, match="disagree on the transaction type"):
+        bulk_load.validate_transaction(transaction_id, [
+            entry(transaction_id, source, "debit", "10.00"),
+            entry(transaction_id, destination, "credit", "10.00", "journal"),
+        ])
+    
+    with pytest.raises(ValueError, match="must be positive"):
+        bulk_load.validate_transaction(transaction_id, [entry(transaction_id, source, "credit", "0", "deposit")])
+    
+    # A single-leg transfer is not exempt from balancing, so it never reaches the metadata
+    with pytest.raises(ValueError, match=f"Transaction {transaction_id}: entries do not balance"):
+        bulk_load.validate_transaction(transaction_id, [entry(transaction_id, destination, "credit", "4.00")])
+
+@pytest.mark.skipif(
+    not os.environ.get("DATABASE_URL", "").startswith("postgresql"),
+    reason="COPY and session_replication_role need a migrated PostgreSQL database in DATABASE_URL"
+)
+def test_bulk_load_copies_transfers_into_postgresql():
+    """Test a load of a transfer and a deposit end to end, with the triggers off and the checks on"""
+    from database import SessionLocal
+    from models.ledger_entry import LedgerEntry
+    from models.transaction import Transaction
+    from services.account_service import AccountService
+    from services.ledger_service import LedgerService
+    
+    db = SessionLocal()
+    try:
+        source = AccountService.create_account(db, f"bulk_load_{uuid.uuid4()}", "checking", "USD")
+        destination = AccountService.create_account(db, f"bulk_load_{uuid.uuid4()}", "checking", "USD")
+        db.commit()
+        source_id, destination_id = source.id, destination.id
+    finally:
+        db.close()
+    
+    deposit_id, transfer_id = uuid.uuid4(), uuid.uuid4()
+    records = [
+        entry(deposit_id, source_id, "credit", "100.00", "deposit"),
+        entry(transfer_id, source_id, "debit", "40.00"),
+        entry(transfer_id, destination_id, "credit", "40.00"),
+    ]
+    source_file = io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+    
+    result = bulk_load.bulk_load(source_file, input_format="ndjson", from_month="2023-03")
+    
+    assert result["transactions"] == 2
+    assert result["entries"] == 3
+    
+    db = SessionLocal()
+    try:
+        transfer = db.query(Transaction).filter(Transaction.id == transfer_id).one()
+        assert transfer.metadata["source_account_id"] == str(source_id)
+        assert transfer.metadata["destination_account_id"] == str(destination_id)
+        assert LedgerService.verify_double_entry(db, transfer_id)
+        assert LedgerService.calculate_balance(db, source_id) == Decimal("60.00")
+        assert LedgerService.calculate_balance(db, destination_id) == Decimal("40.00")
+    finally:
+        db.query(LedgerEntry).filter(LedgerEntry.transaction_id.in_([deposit_id, transfer_id])).delete(synchronize_session=False)
+        db.query(Transaction).filter(Transaction.id.in_([deposit_id, transfer_id])).delete(synchronize_session=False)
+        db.commit()
+        db.close()
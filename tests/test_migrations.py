@@ -54,3 +54,67 @@ def test_migration_order():
     for i, rev in enumerate(revisions):
         if i < len(revisions) - 1:
             assert rev.down_revision == revisions[i + 1].revision
+
+def test_migration_head_matches_scripts():
+    """The head revision workers check against is the head of the migration scripts"""
+    from database import migration_head
+    from alembic.script import ScriptDirectory
+    
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option("script_location", "alembic")
+    
+    assert migration_head() == ScriptDirectory.from_config(alembic_cfg).get_current_head()
+
+def test_cold_start_with_migration_check(tmp_path):
+    """A worker whose database is at head starts without importing Alembic"""
+    import json
+    import os
+    import subprocess
+    import sys
+    from database import migration_head
+    
+    # What scripts/migrate.py write-head puts in the image
+    head = migration_head()
+    (tmp_path / "migration_head.py").write_text(f"HEAD_REVISION = {head!r}\n")
+    
+    database_path = tmp_path / "ledger.db"
+    engine = create_engine(f"sqlite:///{database_path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": head})
+    
+    cold_start = (
+        "import asyncio, json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import main\n"
+        "asyncio.run(main.startup_event())\n"
+        "print(json.dumps({'seconds': time.perf_counter() - started, 'alembic': 'alembic' in sys.modules}))\n"
+    )
+    # python -c puts the working directory first on sys.path; running from
+    # tmp_path keeps the repo root's main.py from shadowing src/main.py
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(tmp_path), src]),
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "DB_ISOLATION_LEVEL": "SERIALIZABLE",
+        "STARTUP_MIGRATIONS": "check",
+        "BACKGROUND_JOBS_ENABLED": "false",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", cold_start], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    assert not measured["alembic"]
+    assert measured["seconds"] < 30
+    
+    # A database behind the head refuses to start
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE alembic_version SET version_num = '001'"))
+    result = subprocess.run(
+        [sys.executable, "-c", cold_start], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode != 0
+    assert "run migrations first" in result.stderr
@@ -1,5 +1,6 @@
 import pytest
 from decimal import Decimal
+import os
 import uuid
 from unittest.mock import patch
 
@@ -454,3 +455,1201 @@ def test_verify_double_entry_balance(db):
     # Verify double-entry balance
     is_balanced = LedgerService.verify_double_entry_balance(db, transaction.id)
     assert is_balanced == True
+
+def test_calculate_balance_with_snapshot_matches_full_rescan(db, monkeypatch):
+    """Test that snapshot-based balances match a full ledger rescan"""
+    from datetime import datetime, timedelta, timezone
+    from config import settings
+    from models.balance_snapshot import BalanceSnapshot
+    
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_SETTLE_SECONDS", 60)
+    
+    account = AccountService.create_account(
+        db=db,
+        user_id="snapshot_user",
+        account_type="checking",
+        currency="USD"
+    )
+    
+    def post_entry(entry_type, amount, created_at):
+        transaction = Transaction(
+            type="deposit" if entry_type == "credit" else "withdrawal",
+            amount=Decimal(amount),
+            currency="USD",
+            status="completed"
+        )
+        db.add(transaction)
+        db.flush()
+        
+        db.add(LedgerEntry(
+            account_id=account.id,
+            transaction_id=transaction.id,
+            entry_type=entry_type,
+            amount=Decimal(amount),
+            created_at=created_at
+        ))
+        db.flush()
+    
+    def full_rescan():
+        entries = db.query(LedgerEntry).filter(LedgerEntry.account_id == account.id).all()
+        return sum(
+            (entry.amount if entry.entry_type == "credit" else -entry.amount for entry in entries),
+            Decimal(0)
+        )
+    
+    # Settled history crosses the snapshot threshold
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    for i in range(5):
+        post_entry("credit", "100.00", start + timedelta(minutes=i))
+    post_entry("debit", "40.50", start + timedelta(minutes=5))
+    
+    # Reads never write; the background job checkpoints the account
+    assert LedgerService.calculate_balance(db, account.id) == full_rescan()
+    assert db.query(BalanceSnapshot).filter(BalanceSnapshot.account_id == account.id).count() == 0
+    
+    assert LedgerService.create_balance_snapshots(db) == 1
+    assert LedgerService.create_balance_snapshots(db) == 0
+    assert db.query(BalanceSnapshot).filter(BalanceSnapshot.account_id == account.id).count() == 1
+    assert LedgerService.calculate_balance(db, account.id) == full_rescan()
+    
+    # Entries after the checkpoint, including one that has not settled yet
+    post_entry("credit", "25.25", start + timedelta(minutes=10))
+    post_entry("debit", "10.00", datetime.now(timezone.utc))
+    
+    balance = LedgerService.calculate_balance(db, account.id)
+    
+    assert balance == full_rescan()
+    assert balance == Decimal("474.75")
+
+def test_balance_snapshot_stops_before_open_transactions(db, monkeypatch):
+    """Test that an entry committed late with an old created_at still lands after the snapshot"""
+    from datetime import datetime, timedelta, timezone
+    from config import settings
+    
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_SETTLE_SECONDS", 60)
+    
+    account = AccountService.create_account(db, "snapshot_user", "checking", "USD")
+    transaction = Transaction(type="deposit", amount=Decimal("1.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    
+    def add_entry(amount, created_at):
+        db.add(LedgerEntry(
+            account_id=account.id,
+            transaction_id=transaction.id,
+            entry_type="credit",
+            amount=Decimal(amount),
+            created_at=created_at
+        ))
+        db.flush()
+    
+    now = datetime.now(timezone.utc)
+    add_entry("10.00", now - timedelta(hours=3))
+    add_entry("20.00", now - timedelta(hours=1))
+    
+    # A transaction open since two hours ago may still commit entries dated from then
+    in_flight_since = now - timedelta(hours=2)
+    monkeypatch.setattr(LedgerService, "oldest_open_transaction_start", staticmethod(lambda db: in_flight_since))
+    
+    assert LedgerService.get_snapshot_cutoff(db) == in_flight_since
+    assert LedgerService.create_balance_snapshots(db) == 1
+    snapshot = LedgerService.get_latest_snapshot(db, account.id)
+    assert snapshot.balance == Decimal("10.00")
+    
+    # That transaction commits; its entry is behind the later entry but ahead of the snapshot
+    add_entry("5.00", in_flight_since + timedelta(seconds=1))
+    
+    assert LedgerService.calculate_balance(db, account.id) == Decimal("35.00")
+
+def test_get_account_ledger_cursor_pagination(db):
+    """Test that cursor pages cover every entry once, in order, across equal timestamps"""
+    from datetime import datetime, timedelta, timezone
+    
+    account = AccountService.create_account(
+        db=db,
+        user_id="cursor_user",
+        account_type="checking",
+        currency="USD"
+    )
+    transaction = Transaction(type="deposit", amount=Decimal("1.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    
+    # Pairs of entries share a timestamp so the id tiebreaker matters
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    for i in range(11):
+        db.add(LedgerEntry(
+            account_id=account.id,
+            transaction_id=transaction.id,
+            entry_type="credit",
+            amount=Decimal("1.00"),
+            created_at=start + timedelta(seconds=i // 2)
+        ))
+    db.flush()
+    
+    expected = [entry.id for entry in LedgerService.get_account_ledger(db, account.id, limit=100)]
+    
+    pages = []
+    cursor = None
+    while True:
+        entries, cursor = LedgerService.get_account_ledger_page(db, account.id, limit=3, cursor=cursor)
+        pages.append([entry.id for entry in entries])
+        if cursor is None:
+            break
+    
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [entry_id for page in pages for entry_id in page] == expected
+    
+    # Offset pages agree with cursor pages and hand over a cursor
+    entries, cursor = LedgerService.get_account_ledger_page(db, account.id, limit=3, offset=3)
+    assert [entry.id for entry in entries] == pages[1]
+    
+    entries, _ = LedgerService.get_account_ledger_page(db, account.id, limit=3, cursor=cursor)
+    assert [entry.id for entry in entries] == pages[2]
+    
+    # A created_at range keeps the same order within its bounds
+    entries = LedgerService.get_account_ledger(
+        db, account.id, start=start + timedelta(seconds=1), end=start + timedelta(seconds=3)
+    )
+    assert [entry.id for entry in entries] == expected[5:9]
+
+def test_get_account_ledger_invalid_cursor(db):
+    """Test that a malformed cursor is rejected"""
+    with pytest.raises(ValueError, match="Invalid ledger cursor"):
+        LedgerService.get_account_ledger_page(db, uuid.uuid4(), cursor="not-a-cursor")
+
+def test_stream_ledger_export(db):
+    """Test that exports stream every entry in the date range, oldest first, in batches"""
+    import csv
+    import io
+    import json
+    from datetime import datetime, timedelta, timezone
+    
+    account = AccountService.create_account(
+        db=db,
+        user_id="export_user",
+        account_type="checking",
+        currency="USD"
+    )
+    transaction = Transaction(type="deposit", amount=Decimal("1.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for day in range(5):
+        db.add(LedgerEntry(
+            account_id=account.id,
+            transaction_id=transaction.id,
+            entry_type="credit",
+            amount=Decimal(f"{day + 1}.25"),
+            created_at=start + timedelta(days=day)
+        ))
+    db.commit()
+    
+    chunks = list(LedgerService.stream_ledger_export(
+        db.get_bind(),
+        account.id,
+        export_format="csv",
+        start=start + timedelta(days=1),
+        end=start + timedelta(days=4),
+        batch_size=2
+    ))
+    
+    # Header, then one chunk per batch of rows
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [row["amount"] for row in rows] == ["2.2500", "3.2500", "4.2500"]
+    
+    chunks = list(LedgerService.stream_ledger_export(db.get_bind(), account.id, export_format="ndjson"))
+    records = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [record["amount"] for record in records] == ["1.2500", "2.2500", "3.2500", "4.2500", "5.2500"]
+    assert records[0]["transaction_id"] == str(transaction.id)
+
+def test_stream_ledger_export_holds_one_batch_at_a_time(db, monkeypatch):
+    """Test that exports read rows through a streaming cursor and format them one batch per chunk"""
+    from sqlalchemy import event
+    
+    account = AccountService.create_account(db, "export_user", "checking", "USD")
+    transaction = Transaction(type="deposit", amount=Decimal("1.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    db.add_all(
+        LedgerEntry(account_id=account.id, transaction_id=transaction.id, entry_type="credit", amount=Decimal("1.00"))
+        for _ in range(25)
+    )
+    db.commit()
+    
+    execution_options = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "FROM ledger_entries" in statement:
+            execution_options.append(context.execution_options)
+    
+    batches = []
+    format_ledger_export = LedgerService.format_ledger_export
+    
+    def recording_format(rows, export_format):
+        batches.append(len(rows))
+        return format_ledger_export(rows, export_format)
+    
+    monkeypatch.setattr(LedgerService, "format_ledger_export", staticmethod(recording_format))
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        chunks = LedgerService.stream_ledger_export(bind, account.id, export_format="ndjson", batch_size=10)
+        
+        # Each chunk is produced on demand from one batch, so the export never holds more rows than that
+        assert len(next(chunks).splitlines()) == 10
+        assert batches == [10]
+        assert len(next(chunks).splitlines()) == 10
+        assert batches == [10, 10]
+        assert len(list(chunks)) == 1
+        assert batches == [10, 10, 5]
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+    
+    assert len(execution_options) == 1
+    assert execution_options[0]["stream_results"] is True
+    assert execution_options[0]["yield_per"] == 10
+
+@pytest.mark.skipif(
+    not os.environ.get("DATABASE_URL", "").startswith("postgresql"),
+    reason="Seeds a million ledger entries in the migrated PostgreSQL database in DATABASE_URL"
+)
+def test_stream_ledger_export_memory_stays_bounded_over_a_million_rows(tmp_path):
+    """Test that exporting a million entries raises the exporting process's peak RSS by less than 100 MB"""
+    import subprocess
+    import sys
+    from sqlalchemy import text
+    from database import SessionLocal
+    
+    rows = 1_000_000
+    session = SessionLocal()
+    try:
+        account = AccountService.create_account(session, f"export_rss_{uuid.uuid4()}", "checking", "USD")
+        session.commit()
+        account_id = account.id
+        
+        # A thousand deposits of a thousand legs, generated server-side so the
+        # test process never holds the rows
+        session.execute(text("""
+            WITH deposits AS (
+                INSERT INTO transactions (id, type, status, amount, currency, description)
+                SELECT gen_random_uuid(), 'deposit'::transaction_type_enum, 'completed'::transaction_status_enum,
+                       1000, 'USD', 'export_rss'
+                FROM generate_series(1, :transactions)
+                RETURNING id
+            )
+            INSERT INTO ledger_entries (id, account_id, transaction_id, entry_type, amount, leg_number)
+            SELECT gen_random_uuid(), :account_id, deposits.id, 'credit'::entry_type_enum, 1, leg
+            FROM deposits, generate_series(1, 1000) AS leg
+        """), {"transactions": rows // 1000, "account_id": account_id})
+        session.commit()
+    finally:
+        session.close()
+    
+    export = (
+        "import resource, sys\n"
+        "from database import engine\n"
+        "from services.ledger_service import LedgerService\n"
+        "chunks = LedgerService.stream_ledger_export(engine, sys.argv[1], export_format='ndjson')\n"
+        "lines = next(chunks).count('\\n')\n"
+        "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "lines += sum(chunk.count('\\n') for chunk in chunks)\n"
+        "print(lines, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)\n"
+    )
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", export, str(account_id)],
+            cwd=tmp_path, env={**os.environ, "PYTHONPATH": src, "BACKGROUND_JOBS_ENABLED": "false"},
+            capture_output=True, text=True, timeout=600
+        )
+        assert result.returncode == 0, result.stderr
+        
+        # ru_maxrss is in kilobytes on Linux; the first batch is already
+        # counted in the baseline, so this is what the rest of the export added
+        lines, peak_growth_kb = map(int, result.stdout.strip().splitlines()[-1].split())
+        assert lines == rows
+        assert peak_growth_kb < 100 * 1024
+    finally:
+        session = SessionLocal()
+        try:
+            session.execute(text(
+                "DELETE FROM ledger_entries WHERE account_id = :account_id"
+            ), {"account_id": account_id})
+            session.execute(text(
+                "DELETE FROM transactions WHERE description = 'export_rss'"
+            ))
+            session.commit()
+        finally:
+            session.close()
+
+def test_calculate_balances_as_of_uses_daily_rollups(db, monkeypatch):
+    """Test that as-of balances combine daily rollups with intra-day entries"""
+    from datetime import datetime, date, timedelta, timezone
+    from sqlalchemy import insert
+    from config import settings
+    from models.view_refresh import ViewRefresh
+    from models.daily_account_balance import daily_account_balances
+    
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_SETTLE_SECONDS", 3600)
+    
+    # The materialized view is created by migrations; a plain table stands in for it here
+    daily_account_balances.create(bind=db.get_bind())
+    try:
+        accounts = [
+            AccountService.create_account(db, f"as_of_user_{i}", "checking", "USD")
+            for i in range(2)
+        ]
+        transaction = Transaction(type="deposit", amount=Decimal("1.00"), currency="USD", status="completed")
+        db.add(transaction)
+        db.flush()
+        
+        start = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+        for day in range(4):
+            db.add(LedgerEntry(
+                account_id=accounts[0].id,
+                transaction_id=transaction.id,
+                entry_type="credit",
+                amount=Decimal("100.00"),
+                created_at=start + timedelta(days=day)
+            ))
+        db.add(LedgerEntry(
+            account_id=accounts[0].id,
+            transaction_id=transaction.id,
+            entry_type="debit",
+            amount=Decimal("30.00"),
+            created_at=start + timedelta(days=3, hours=6)
+        ))
+        db.flush()
+        
+        def as_of(moment):
+            return LedgerService.calculate_balances_as_of(db, [account.id for account in accounts], moment)
+        
+        # Without a refresh everything comes from the ledger
+        assert as_of(start + timedelta(days=2))[accounts[0].id] == Decimal("300.00")
+        
+        # Rollups cover Jan 1 to Jan 3; the Jan 1 figure is deliberately off to show it is used
+        db.execute(insert(daily_account_balances), [
+            {"balance_date": date(2024, 1, 1), "account_id": accounts[0].id, "daily_balance": Decimal("101.00")},
+            {"balance_date": date(2024, 1, 2), "account_id": accounts[0].id, "daily_balance": Decimal("100.00")},
+            {"balance_date": date(2024, 1, 3), "account_id": accounts[0].id, "daily_balance": Decimal("100.00")},
+        ])
+        db.add(ViewRefresh(view_name="daily_account_balances", refreshed_at=datetime(2024, 1, 4, 2, tzinfo=timezone.utc)))
+        db.flush()
+        
+        balances = as_of(start + timedelta(days=2, hours=1))
+        assert balances[accounts[0].id] == Decimal("301.00")
+        assert balances[accounts[1].id] == Decimal(0)
+        
+        # Jan 4 is uncovered, so its entries come from the ledger up to as_of
+        assert as_of(start + timedelta(days=3, hours=1))[accounts[0].id] == Decimal("401.00")
+        assert as_of(start + timedelta(days=3, hours=7))[accounts[0].id] == Decimal("371.00")
+        
+        # Within the settle window of the refresh, Jan 3 is read from the ledger too
+        monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_SETTLE_SECONDS", 3 * 3600)
+        assert as_of(start + timedelta(days=3, hours=1))[accounts[0].id] == Decimal("401.00")
+        assert LedgerService.calculate_balance_as_of(db, accounts[0].id, start - timedelta(days=1)) == Decimal(0)
+    finally:
+        db.rollback()
+        daily_account_balances.drop(bind=db.get_bind())
+
+@pytest.mark.parametrize("account_count", [1, 10, 50])
+def test_get_user_accounts_query_count_is_constant(db, query_counter, account_count):
+    """Test that listing a user's accounts does not issue a query per account"""
+    user_id = f"corporate_user_{account_count}"
+    
+    for i in range(account_count):
+        account = AccountService.create_account(
+            db=db,
+            user_id=user_id,
+            account_type="business",
+            currency="USD"
+        )
+        TransactionService.execute_deposit(
+            db=db,
+            account_id=account.id,
+            amount=Decimal("10.00") * (i + 1),
+            currency="USD"
+        )
+    db.commit()
+    
+    query_counter.clear()
+    accounts = AccountService.get_user_accounts(db, user_id)
+    
+    assert len(accounts) == account_count
+    assert sum(Decimal(account['balance_decimal']) for account in accounts) == \
+        Decimal("10.00") * account_count * (account_count + 1) / 2
+    
+    # One query for the accounts and one grouped balance query
+    assert len(query_counter) == 2
+
+def _funded_accounts(db, count, amount):
+    """Create active USD accounts that each hold the given balance"""
+    accounts = []
+    for i in range(count):
+        account = AccountService.create_account(
+            db=db,
+            user_id=f"batch_user_{i}",
+            account_type="checking",
+            currency="USD"
+        )
+        if amount:
+            TransactionService.execute_deposit(
+                db=db,
+                account_id=account.id,
+                amount=Decimal(amount),
+                currency="USD"
+            )
+        accounts.append(account)
+    db.commit()
+    return accounts
+
+def test_execute_transfers_batch_best_effort(db):
+    """Test that best-effort batches commit valid transfers and report failures"""
+    source, destination = _funded_accounts(db, 2, "300.00")
+    
+    results = TransactionService.execute_transfers_batch(
+        db=db,
+        transfers=[
+            {"source_account_id": source.id, "destination_account_id": destination.id, "amount": Decimal("200.00")},
+            {"source_account_id": source.id, "destination_account_id": destination.id, "amount": Decimal("150.00")},
+            {"source_account_id": source.id, "destination_account_id": source.id, "amount": Decimal("1.00")},
+            {"source_account_id": destination.id, "destination_account_id": source.id, "amount": Decimal("50.00")},
+        ],
+        atomic=False
+    )
+    db.commit()
+    
+    assert [result["status"] for result in results] == ["completed", "failed", "failed", "completed"]
+    assert "Insufficient funds" in results[1]["error"]
+    assert "cannot be the same" in results[2]["error"]
+    
+    assert LedgerService.calculate_balance(db, source.id) == Decimal("150.00")
+    assert LedgerService.calculate_balance(db, destination.id) == Decimal("450.00")
+    assert db.query(Transaction).filter(Transaction.type == "transfer").count() == 2
+
+def test_execute_transfers_batch_atomic_aborts(db):
+    """Test that an atomic batch writes nothing when any transfer fails"""
+    source, destination = _funded_accounts(db, 2, "100.00")
+    
+    results = TransactionService.execute_transfers_batch(
+        db=db,
+        transfers=[
+            {"source_account_id": source.id, "destination_account_id": destination.id, "amount": Decimal("60.00")},
+            {"source_account_id": source.id, "destination_account_id": destination.id, "amount": Decimal("60.00")},
+        ],
+        atomic=True
+    )
+    db.commit()
+    
+    assert [result["status"] for result in results] == ["aborted", "failed"]
+    assert db.query(Transaction).filter(Transaction.type == "transfer").count() == 0
+    assert LedgerService.calculate_balance(db, source.id) == Decimal("100.00")
+
+@pytest.mark.parametrize("transfer_count", [2, 20, 200])
+def test_execute_transfers_batch_query_count_is_constant(db, query_counter, transfer_count):
+    """Test that batch transfers use set-based statements regardless of batch size"""
+    accounts = _funded_accounts(db, 4, "1000.00")
+    
+    transfers = [
+        {
+            "source_account_id": accounts[i % 4].id,
+            "destination_account_id": accounts[(i + 1) % 4].id,
+            "amount": Decimal("1.00")
+        }
+        for i in range(transfer_count)
+    ]
+    
+    query_counter.clear()
+    results = TransactionService.execute_transfers_batch(db=db, transfers=transfers)
+    
+    assert all(result["status"] == "completed" for result in results)
+    # Account lock, balance query, transaction insert and ledger entry insert
+    assert len(query_counter) == 4
+
+def test_execute_transfer_query_count(db, query_counter):
+    """Test that a transfer locks, checks the balance and writes in a fixed set of statements"""
+    source_id, destination_id = [account.id for account in _funded_accounts(db, 2, "100.00")]
+    
+    query_counter.clear()
+    transaction = TransactionService.execute_transfer(
+        db=db,
+        source_account_id=source_id,
+        destination_account_id=destination_id,
+        amount=Decimal("25.00"),
+        currency="USD"
+    )
+    
+    assert transaction.status == "completed"
+    assert transaction.created_at is not None
+    # Account lock, balance query, transaction insert and ledger entry insert
+    assert len(query_counter) == 4
+    assert LedgerService.verify_double_entry(db, transaction.id)
+    assert LedgerService.calculate_balance(db, source_id) == Decimal("75.00")
+
+def test_entries_balance():
+    """Test the in-memory double-entry check"""
+    transaction_id = uuid.uuid4()
+    debit, credit = LedgerService.build_ledger_entries(transaction_id, uuid.uuid4(), uuid.uuid4(), Decimal("10.00"))
+    
+    assert LedgerService.entries_balance([debit, credit])
+    assert not LedgerService.entries_balance([debit])
+    
+    credit.amount = Decimal("9.99")
+    assert not LedgerService.entries_balance([debit, credit])
+
+def test_run_with_retry_retries_deadlocks(db, monkeypatch):
+    """Test that deadlocks are retried with a fresh attempt"""
+    from sqlalchemy.exc import OperationalError
+    from config import settings
+    from database import run_with_retry
+    
+    monkeypatch.setattr(settings, "DB_RETRY_BASE_DELAY_MS", 0)
+    
+    class DeadlockDetected(Exception):
+        pgcode = "40P01"
+    
+    attempts = []
+    
+    def operation():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OperationalError("SELECT 1", {}, DeadlockDetected())
+        return "done"
+    
+    assert run_with_retry(db, operation) == "done"
+    assert len(attempts) == 3
+
+def test_run_with_retry_raises_other_errors(db):
+    """Test that non-retryable database errors are raised immediately"""
+    from sqlalchemy.exc import IntegrityError
+    from database import run_with_retry
+    
+    class UniqueViolation(Exception):
+        pgcode = "23505"
+    
+    attempts = []
+    
+    def operation():
+        attempts.append(1)
+        raise IntegrityError("INSERT", {}, UniqueViolation())
+    
+    with pytest.raises(IntegrityError):
+        run_with_retry(db, operation)
+    assert len(attempts) == 1
+
+def test_retry_backoff_is_the_policy_for_both_retry_loops(db, monkeypatch):
+    """Test that the shared policy gives up on the last attempt and on errors that are not retried"""
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from config import settings
+    from database import retry_backoff
+    
+    monkeypatch.setattr(settings, "DB_RETRY_MAX_DELAY_MS", 50)
+    
+    class SerializationFailure(Exception):
+        pgcode = "40001"
+    
+    class UniqueViolation(Exception):
+        pgcode = "23505"
+    
+    serialization_failure = OperationalError("SELECT 1", {}, SerializationFailure())
+    assert 0 <= retry_backoff(serialization_failure, 1, 3) <= 0.05
+    assert retry_backoff(serialization_failure, 3, 3) is None
+    assert retry_backoff(IntegrityError("INSERT", {}, UniqueViolation()), 1, 3) is None
+
+@pytest.mark.asyncio
+async def test_async_services_on_sync_session(db):
+    """Test that the async service facades run sync service code off the event loop"""
+    from services.async_services import AsyncAccountService, AsyncTransactionService
+    
+    account = await AsyncAccountService.create_account(
+        db=db,
+        user_id="async_user",
+        account_type="checking",
+        currency="USD"
+    )
+    
+    transaction = await AsyncTransactionService.execute_deposit(
+        db=db,
+        account_id=account.id,
+        amount=Decimal("42.00"),
+        currency="USD"
+    )
+    db.flush()
+    
+    account_data = await AsyncAccountService.get_account_with_balance(db, account.id)
+    
+    assert transaction.status == "completed"
+    assert Decimal(account_data["balance_decimal"]) == Decimal("42.00")
+
+@pytest.mark.asyncio
+async def test_async_run_with_retry_backs_off_on_the_event_loop(db, monkeypatch):
+    """Test that async retries await their backoff instead of sleeping in the operation's thread"""
+    import asyncio
+    import time
+    from sqlalchemy.exc import OperationalError
+    from services.async_services import AsyncTransactionService
+    
+    class SerializationFailure(Exception):
+        pgcode = "40001"
+    
+    def blocking_sleep(seconds):
+        raise AssertionError("time.sleep called during an async retry")
+    
+    delays = []
+    real_sleep = asyncio.sleep
+    
+    async def recording_sleep(seconds):
+        delays.append(seconds)
+        await real_sleep(0)
+    
+    monkeypatch.setattr(time, "sleep", blocking_sleep)
+    monkeypatch.setattr(asyncio, "sleep", recording_sleep)
+    
+    attempts = []
+    
+    def operation(session):
+        attempts.append(session)
+        if len(attempts) < 3:
+            raise OperationalError("SELECT 1", {}, SerializationFailure())
+        return "done"
+    
+    assert await AsyncTransactionService.run_with_retry(db, operation) == "done"
+    assert len(attempts) == 3
+    assert len(delays) == 2
+
+def test_get_async_database_url():
+    """Test that sync PostgreSQL URLs are rewritten for asyncpg"""
+    from database import get_async_database_url
+    
+    assert get_async_database_url("postgresql://u:p@db:5432/ledger") == "postgresql+asyncpg://u:p@db:5432/ledger"
+    assert get_async_database_url("postgresql+psycopg2://u:p@db/ledger") == "postgresql+asyncpg://u:p@db/ledger"
+    assert get_async_database_url("postgresql+asyncpg://u:p@db/ledger") == "postgresql+asyncpg://u:p@db/ledger"
+
+def test_idempotency_key_claim_and_replay(db):
+    """Test that a claimed key replays its stored response for the same request"""
+    from services.idempotency_service import IdempotencyService
+    
+    request_hash = IdempotencyService.request_hash({"account_id": "a", "amount": Decimal("10.00")})
+    
+    assert IdempotencyService.claim(db, "deposits", "key-1", request_hash) is None
+    IdempotencyService.complete(db, "deposits", "key-1", 201, {"id": "txn-1"})
+    
+    stored = IdempotencyService.claim(db, "deposits", "key-1", request_hash)
+    
+    assert stored is not None
+    assert stored.response_status == 201
+    assert stored.response_body == {"id": "txn-1"}
+    
+    # The same key in another scope is independent
+    assert IdempotencyService.claim(db, "withdrawals", "key-1", request_hash) is None
+
+def test_idempotency_key_rejects_different_request(db):
+    """Test that reusing a key with a different request body fails"""
+    from services.idempotency_service import IdempotencyService
+    
+    IdempotencyService.claim(db, "transfers", "key-2", IdempotencyService.request_hash({"amount": 1}))
+    
+    with pytest.raises(ValueError, match="Idempotency-Key has already been used"):
+        IdempotencyService.claim(db, "transfers", "key-2", IdempotencyService.request_hash({"amount": 2}))
+
+def test_idempotency_key_purge_and_reclaim_expired(db):
+    """Test that expired keys are purged and can be claimed again"""
+    from datetime import datetime, timedelta, timezone
+    from services.idempotency_service import IdempotencyService
+    from models.idempotency_key import IdempotencyKey
+    
+    request_hash = IdempotencyService.request_hash({"amount": 1})
+    IdempotencyService.claim(db, "deposits", "expired", request_hash)
+    IdempotencyService.complete(db, "deposits", "expired", 201, {"id": "old"})
+    IdempotencyService.claim(db, "deposits", "live", request_hash)
+    
+    db.query(IdempotencyKey)\
+        .filter(IdempotencyKey.key == "expired")\
+        .update({"expires_at": datetime.now(timezone.utc) - timedelta(hours=1)}, synchronize_session=False)
+    
+    # An expired key is treated as new rather than replayed
+    assert IdempotencyService.claim(db, "deposits", "expired", IdempotencyService.request_hash({"amount": 2})) is None
+    
+    db.query(IdempotencyKey)\
+        .filter(IdempotencyKey.key == "expired")\
+        .update({"expires_at": datetime.now(timezone.utc) - timedelta(hours=1)}, synchronize_session=False)
+    
+    assert IdempotencyService.purge_expired(db) == 1
+    assert [row.key for row in db.query(IdempotencyKey).all()] == ["live"]
+
+def test_instrument_engine_counts_sql_per_request():
+    """Test that cursor events count statements only while a request is being tracked"""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.exc import OperationalError
+    from metrics import SQLStats, instrument_engine, request_sql_stats
+    
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    
+    stats = SQLStats()
+    token = request_sql_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    finally:
+        request_sql_stats.reset(token)
+    
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 3"))
+    
+    assert stats.statements == 2
+    assert stats.duration > 0
+    
+    # A failed statement is not counted and leaves no timing state on the connection
+    stats = SQLStats()
+    token = request_sql_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.rollback()
+            conn.execute(text("SELECT 4"))
+            assert not any("metrics" in str(key) for key in conn.info)
+    finally:
+        request_sql_stats.reset(token)
+    
+    assert stats.statements == 1
+
+
+def test_engine_options_pgbouncer_mode():
+    """Test that PgBouncer mode disables app pooling and prepared statement caches"""
+    from sqlalchemy.pool import NullPool
+    from config import settings
+    from database import get_engine_options
+    
+    with patch.object(settings, 'DB_POOL_MODE', 'pgbouncer'):
+        sync_options = get_engine_options("postgresql://localhost/ledger")
+        async_options = get_engine_options("postgresql+asyncpg://localhost/ledger", async_driver=True)
+    
+    assert sync_options['poolclass'] is NullPool
+    assert 'pool_size' not in sync_options
+    assert async_options['poolclass'] is NullPool
+    assert async_options['connect_args']['statement_cache_size'] == 0
+    assert async_options['connect_args']['prepared_statement_cache_size'] == 0
+    assert async_options['connect_args']['prepared_statement_name_func']() != \
+        async_options['connect_args']['prepared_statement_name_func']()
+
+
+def test_engine_options_queue_mode():
+    """Test that queue mode sizes the pool from settings and relies on keepalives, not pre-ping"""
+    from config import settings
+    from database import get_engine_options
+    
+    with patch.object(settings, 'DB_POOL_SIZE', 4), patch.object(settings, 'DB_MAX_OVERFLOW', 2):
+        options = get_engine_options("postgresql://localhost/ledger")
+    
+    assert options['pool_size'] == 4
+    assert options['max_overflow'] == 2
+    assert options['pool_pre_ping'] is False
+    assert options['connect_args']['keepalives'] == 1
+
+
+def test_read_only_session_skips_snapshots_and_money_movement(db, monkeypatch):
+    """Test that replica sessions read balances without writing snapshots and refuse transfers"""
+    from datetime import datetime, timedelta, timezone
+    from config import settings
+    from models.balance_snapshot import BalanceSnapshot
+    
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "BALANCE_SNAPSHOT_SETTLE_SECONDS", 0)
+    
+    account = AccountService.create_account(db, "replica_user", "checking", "USD")
+    other = AccountService.create_account(db, "replica_other", "checking", "USD")
+    transaction = Transaction(type="deposit", amount=Decimal("25.00"), currency="USD", status="completed")
+    db.add(transaction)
+    db.flush()
+    db.add(LedgerEntry(
+        account_id=account.id,
+        transaction_id=transaction.id,
+        entry_type="credit",
+        amount=Decimal("25.00"),
+        created_at=datetime.now(timezone.utc) - timedelta(minutes=1)
+    ))
+    db.commit()
+    
+    db.info['read_only'] = True
+    try:
+        assert LedgerService.calculate_balance(db, account.id) == Decimal("25.00")
+        assert db.query(BalanceSnapshot).count() == 0
+        
+        with pytest.raises(RuntimeError, match="primary"):
+            TransactionService.execute_transfer(db, str(account.id), str(other.id), Decimal("1.00"))
+    finally:
+        db.info.pop('read_only')
+
+
+def test_only_commits_that_wrote_mark_the_request(db):
+    """Test that read-only commits and rolled back writes do not send a request's reads to the primary"""
+    from replicas import WriteState, request_write_state, track_primary_writes
+    
+    source, destination = _funded_accounts(db, 2, "100.00")
+    track_primary_writes(db)
+    
+    state = WriteState()
+    token = request_write_state.set(state)
+    try:
+        LedgerService.calculate_balance(db, source.id)
+        db.commit()
+        assert not state.committed
+        
+        TransactionService.execute_transfer(db, source.id, destination.id, Decimal("5.00"))
+        db.rollback()
+        db.commit()
+        assert not state.committed
+        
+        # Batches insert with Core statements rather than a flush
+        TransactionService.execute_transfers_batch(db, [
+            {"source_account_id": source.id, "destination_account_id": destination.id, "amount": "5.00"}
+        ])
+        db.commit()
+        assert state.committed
+    finally:
+        request_write_state.reset(token)
+
+
+def test_account_cache_evicts_expires_and_drops_stale_loads(monkeypatch):
+    """Test the LRU bound, the TTL and that a load racing an invalidation is not stored"""
+    import time
+    from services.account_cache import AccountCache, CachedAccount
+    
+    def cached(key):
+        return CachedAccount(id=key, user_id="u", account_type="checking", currency="USD", status="active")
+    
+    cache = AccountCache(max_size=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        cache.put(key, cached(key), cache.generation)
+    cache.get("a")
+    cache.put("c", cached("c"), cache.generation)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.put("a", cached("a"), generation)
+    assert cache.get("a") is None
+    
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get("c") is None
+
+
+def test_get_account_info_is_cached_until_status_changes(db, query_counter):
+    """Test that account lookups hit the cache and update_account_status invalidates it"""
+    account = AccountService.create_account(db, "cache_user", "checking", "USD")
+    db.commit()
+    
+    assert AccountService.get_account_info(db, account.id).status == "active"
+    
+    query_counter.clear()
+    assert AccountService.get_account_info(db, account.id).currency == "USD"
+    assert query_counter == []
+    
+    AccountService.update_account_status(db, account.id, "frozen")
+    assert AccountService.get_account_info(db, account.id).status == "frozen"
+
+
+def test_materialized_balance_mode(db, monkeypatch):
+    """Test that postings keep accounts.balance current and debits are conditional updates"""
+    from config import settings
+    
+    monkeypatch.setattr(settings, "BALANCE_MODE", "materialized")
+    
+    source, destination = _funded_accounts(db, 2, "100.00")
+    
+    TransactionService.execute_transfer(db, source.id, destination.id, Decimal("30.00"))
+    TransactionService.execute_withdrawal(db, destination.id, Decimal("5.00"))
+    results = TransactionService.execute_transfers_batch(
+        db=db,
+        transfers=[{"source_account_id": destination.id, "destination_account_id": source.id, "amount": Decimal("25.00")}]
+    )
+    db.commit()
+    
+    assert results[0]["status"] == "completed"
+    assert LedgerService.calculate_balances(db, [source.id, destination.id]) == {
+        source.id: Decimal("95.00"),
+        destination.id: Decimal("100.00"),
+    }
+    
+    db.refresh(source)
+    assert source.entry_count == 3
+    
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        TransactionService.execute_withdrawal(db, source.id, Decimal("95.01"))
+    db.rollback()
+    
+    db.refresh(source)
+    assert source.balance == Decimal("95.00")
+
+
+def test_execute_journal_posts_all_legs_in_one_insert(db, query_counter):
+    """Test that a payment with fees posts as one transaction with one entries INSERT"""
+    payer, merchant, fees = _funded_accounts(db, 3, None)
+    TransactionService.execute_deposit(db, payer.id, Decimal("100.00"))
+    db.commit()
+    
+    query_counter.clear()
+    transaction = TransactionService.execute_journal(db, [
+        {"account_id": payer.id, "entry_type": "debit", "amount": Decimal("100.00")},
+        {"account_id": merchant.id, "entry_type": "credit", "amount": Decimal("96.50")},
+        {"account_id": fees.id, "entry_type": "credit", "amount": Decimal("2.50")},
+        {"account_id": fees.id, "entry_type": "credit", "amount": Decimal("1.00")},
+    ], description="Card payment")
+    entry_inserts = [s for s in query_counter if s.startswith("INSERT INTO ledger_entries")]
+    db.commit()
+    
+    assert transaction.type == "journal"
+    assert transaction.amount == Decimal("100.00")
+    assert len(entry_inserts) == 1
+    assert LedgerService.verify_double_entry(db, transaction.id)
+    
+    legs = db.query(LedgerEntry).filter(LedgerEntry.transaction_id == transaction.id).order_by(LedgerEntry.leg_number).all()
+    assert [leg.leg_number for leg in legs] == [1, 2, 3, 4]
+    assert LedgerService.calculate_balances(db, [payer.id, merchant.id, fees.id]) == {
+        merchant.id: Decimal("96.50"),
+        fees.id: Decimal("3.50"),
+        payer.id: Decimal("0.00"),
+    }
+
+
+def test_execute_journal_rejects_unbalanced_and_unfunded_legs(db):
+    """Test that journals must balance and debited accounts must cover their net debit"""
+    payer, merchant = _funded_accounts(db, 2, "10.00")
+    
+    with pytest.raises(ValueError, match="do not balance"):
+        TransactionService.execute_journal(db, [
+            {"account_id": payer.id, "entry_type": "debit", "amount": Decimal("5.00")},
+            {"account_id": merchant.id, "entry_type": "credit", "amount": Decimal("4.00")},
+        ])
+    
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        TransactionService.execute_journal(db, [
+            {"account_id": payer.id, "entry_type": "debit", "amount": Decimal("10.01")},
+            {"account_id": merchant.id, "entry_type": "credit", "amount": Decimal("10.01")},
+        ])
+    db.rollback()
+    
+    assert db.query(Transaction).filter(Transaction.type == "journal").count() == 0
+
+
+def test_hot_account_buckets(db):
+    """Test that credits to a split account spread over buckets and debits draw on them"""
+    from models.account import bucket_account_id
+    
+    source, hot = _funded_accounts(db, 2, "100.00")
+    AccountService.split_account(db, hot.id, 4)
+    db.commit()
+    
+    with pytest.raises(ValueError, match="cannot be reduced"):
+        AccountService.split_account(db, hot.id, 2)
+    db.rollback()
+    
+    buckets = [bucket_account_id(hot.id, bucket) for bucket in range(4)]
+    AccountService.get_account_info(db, hot.id)
+    for _ in range(8):
+        TransactionService.execute_transfer(db, source.id, hot.id, Decimal("10.00"))
+    db.commit()
+    
+    credited = {
+        account_id for (account_id,) in db.query(LedgerEntry.account_id)
+        .filter(LedgerEntry.entry_type == "credit", LedgerEntry.account_id.notin_([source.id, hot.id]))
+    }
+    assert credited <= set(buckets)
+    assert LedgerService.calculate_balance(db, hot.id) == Decimal("180.00")
+    assert [Decimal(account["balance_decimal"]) for account in AccountService.get_user_accounts(db, hot.user_id)] == [Decimal("180.00")]
+    
+    # More than the parent or any single bucket holds, so several buckets are drawn on
+    transaction = TransactionService.execute_transfer(db, hot.id, source.id, Decimal("150.00"))
+    db.commit()
+    
+    debits = db.query(LedgerEntry).filter(
+        LedgerEntry.transaction_id == transaction.id,
+        LedgerEntry.entry_type == "debit"
+    ).all()
+    assert len(debits) > 1
+    assert LedgerService.verify_double_entry(db, transaction.id)
+    assert LedgerService.calculate_balance(db, hot.id) == Decimal("30.00")
+    assert LedgerService.calculate_balance(db, source.id) == Decimal("170.00")
+    
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        TransactionService.execute_withdrawal(db, hot.id, Decimal("30.01"))
+    db.rollback()
+
+
+def test_batch_and_journal_post_to_hot_account_buckets(db):
+    """Test that batches and journals credit a split account's buckets and debit funds held in them"""
+    from models.account import bucket_account_id
+    
+    source, hot, other = _funded_accounts(db, 3, "100.00")
+    AccountService.split_account(db, hot.id, 4)
+    db.commit()
+    buckets = {bucket_account_id(hot.id, bucket) for bucket in range(4)}
+    AccountService.get_account_info(db, hot.id)
+    
+    results = TransactionService.execute_transfers_batch(db, [
+        {"source_account_id": source.id, "destination_account_id": hot.id, "amount": "40.00"}
+        for _ in range(2)
+    ])
+    db.commit()
+    assert [result["status"] for result in results] == ["completed", "completed"]
+    
+    credited = {
+        account_id for (account_id,) in db.query(LedgerEntry.account_id)
+        .filter(LedgerEntry.entry_type == "credit", LedgerEntry.account_id.notin_([source.id, hot.id, other.id]))
+    }
+    assert credited and credited <= buckets
+    assert LedgerService.calculate_balance(db, hot.id) == Decimal("180.00")
+    
+    # Only 100.00 is on the parent row itself, so this batch must draw on the buckets
+    results = TransactionService.execute_transfers_batch(db, [
+        {"source_account_id": hot.id, "destination_account_id": other.id, "amount": "90.00"},
+        {"source_account_id": hot.id, "destination_account_id": other.id, "amount": "60.00"},
+    ])
+    db.commit()
+    assert [result["status"] for result in results] == ["completed", "completed"]
+    assert LedgerService.calculate_balance(db, hot.id) == Decimal("30.00")
+    
+    transaction = TransactionService.execute_journal(db, [
+        {"account_id": hot.id, "entry_type": "debit", "amount": Decimal("30.00")},
+        {"account_id": other.id, "entry_type": "credit", "amount": Decimal("20.00")},
+        {"account_id": hot.id, "entry_type": "credit", "amount": Decimal("5.00")},
+        {"account_id": source.id, "entry_type": "credit", "amount": Decimal("5.00")},
+    ])
+    db.commit()
+    
+    hot_credits = {
+        account_id for (account_id,) in db.query(LedgerEntry.account_id)
+        .filter(LedgerEntry.transaction_id == transaction.id, LedgerEntry.entry_type == "credit")
+        .filter(LedgerEntry.account_id.notin_([source.id, other.id]))
+    }
+    assert len(hot_credits) == 1 and hot_credits <= buckets
+    assert LedgerService.verify_double_entry(db, transaction.id)
+    assert LedgerService.calculate_balance(db, hot.id) == Decimal("5.00")
+    assert LedgerService.calculate_balance(db, other.id) == Decimal("270.00")
+    
+    bucket = next(iter(credited))
+    with pytest.raises(ValueError, match="bucket"):
+        TransactionService.execute_journal(db, [
+            {"account_id": bucket, "entry_type": "debit", "amount": Decimal("1.00")},
+            {"account_id": other.id, "entry_type": "credit", "amount": Decimal("1.00")},
+        ])
+    db.rollback()
+    
+    results = TransactionService.execute_transfers_batch(db, [
+        {"source_account_id": other.id, "destination_account_id": bucket, "amount": "1.00"},
+    ])
+    db.rollback()
+    assert results[0]["status"] == "failed" and "bucket" in results[0]["error"]
+    
+    with pytest.raises(ValueError, match="bucket"):
+        TransactionService.execute_deposit(db, bucket, Decimal("1.00"))
+    db.rollback()
+
+
+def test_ledger_page_and_export_include_hot_account_buckets(db):
+    """Test that a split account's ledger pages and exports include the entries posted to its buckets"""
+    import json
+    from models.account import bucket_account_id
+    
+    source, hot = _funded_accounts(db, 2, "100.00")
+    AccountService.split_account(db, hot.id, 4)
+    db.commit()
+    buckets = {bucket_account_id(hot.id, bucket) for bucket in range(4)}
+    AccountService.get_account_info(db, hot.id)
+    for _ in range(4):
+        TransactionService.execute_transfer(db, source.id, hot.id, Decimal("10.00"))
+    TransactionService.execute_transfer(db, hot.id, source.id, Decimal("120.00"))
+    db.commit()
+    
+    # Offset pages; the entries share created_at, which SQLite cursors cannot tell apart
+    pages = []
+    while True:
+        entries, cursor = LedgerService.get_account_ledger_page(db, str(hot.id), limit=3, offset=len(pages))
+        pages.extend(entries)
+        if cursor is None:
+            break
+    
+    assert {entry.account_id for entry in pages} & buckets
+    signed = sum(entry.amount if entry.entry_type == "credit" else -entry.amount for entry in pages)
+    assert signed == LedgerService.calculate_balance(db, hot.id) == Decimal("20.00")
+    
+    # The bucket count the routes pass from the cached account gives the same page
+    entries, _ = LedgerService.get_account_ledger_page(db, hot.id, limit=100, bucket_count=4)
+    assert [entry.id for entry in entries] == [entry.id for entry in pages]
+    
+    chunks = LedgerService.stream_ledger_export(db.get_bind(), hot.id, export_format="ndjson")
+    records = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert sorted(record["id"] for record in records) == sorted(str(entry.id) for entry in pages)
+    assert sum(
+        Decimal(record["amount"]) if record["entry_type"] == "credit" else -Decimal(record["amount"])
+        for record in records
+    ) == Decimal("20.00")
+
+
+def test_queued_logging_formats_structured_records_off_the_caller():
+    """Records are queued unformatted, formatted with their extra fields later, and dropped when the queue is full"""
+    import json
+    import logging
+    import queue
+    from logs import JsonFormatter, NonBlockingQueueHandler, SampleFilter, TextFormatter
+    from metrics import LOG_RECORDS_DROPPED
+    
+    log_queue = queue.Queue(1)
+    handler = NonBlockingQueueHandler(log_queue)
+    logger = logging.getLogger("tests.queued_logging")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        transaction_id = uuid.uuid4()
+        logger.warning("Transfer completed in %s ms", 12, extra={"transaction_id": transaction_id})
+        record = log_queue.get_nowait()
+        assert record.msg == "Transfer completed in %s ms"
+        assert record.args == (12,)
+        
+        document = json.loads(JsonFormatter().format(record))
+        assert document["message"] == "Transfer completed in 12 ms"
+        assert document["transaction_id"] == str(transaction_id)
+        assert TextFormatter().format(record).endswith(f"Transfer completed in 12 ms transaction_id={transaction_id}")
+        
+        dropped = LOG_RECORDS_DROPPED._value.get()
+        logger.warning("first")
+        logger.warning("second")
+        assert log_queue.qsize() == 1
+        assert LOG_RECORDS_DROPPED._value.get() == dropped + 1
+    finally:
+        logger.removeHandler(handler)
+    
+    never = SampleFilter(0.0)
+    assert not never.filter(logging.LogRecord("hot", logging.INFO, "", 0, "sampled", (), None))
+    assert never.filter(logging.LogRecord("hot", logging.ERROR, "", 0, "kept", (), None))
+
+def test_get_account_ledger_page_loads_transactions_only_when_asked(db, query_counter):
+    """Ledger pages are plain column rows unless transactions are included with one batched query"""
+    source, destination = _funded_accounts(db, 2, "100.00")
+    for _ in range(3):
+        TransactionService.execute_transfer(db, source.id, destination.id, Decimal("5.00"))
+    db.commit()
+    source_id = source.id
+    
+    query_counter.clear()
+    entries, _ = LedgerService.get_account_ledger_page(db, source_id, limit=10, bucket_count=0)
+    assert len(entries) == 4
+    assert not any(isinstance(entry, LedgerEntry) for entry in entries)
+    assert len(query_counter) == 1
+    assert "JOIN" not in query_counter[0].upper()
+    
+    query_counter.clear()
+    entries, _ = LedgerService.get_account_ledger_page(db, source_id, limit=10, include_transaction=True, bucket_count=0)
+    assert sorted(entry.transaction.type for entry in entries) == ["deposit", "transfer", "transfer", "transfer"]
+    assert len(query_counter) == 2
+    assert "JOIN" not in query_counter[0].upper()